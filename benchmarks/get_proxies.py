@@ -0,0 +1,42 @@
+"""
+Query benchmark of ProxyCollection.get_proxies: microseconds per query on 200k proxies
+
+Run from repo root: python -m benchmarks.get_proxies
+"""
+from ipaddress import IPv4Address
+from time import time, perf_counter
+from src.proxy import Proxy, ProxyCollection
+
+COUNTRIES = ["US", "RU", "DE", "BR", "CN", "FR", "UNKNOWN"]
+ANONYMITY_LEVELS = ["elite", "anonymous", "transparent", "UNKNOWN"]
+PROTOCOLS_LISTS = [["http"], ["https"], ["socks4"], ["socks5"]]
+
+QUERIES = [
+    dict(valid_only=True, countries=["DE"], order_by="priority", limit=10),
+    dict(valid_only=True, anonymity=["elite"], protocols=["http"]),
+    dict(anonymity=["elite"], countries=["US"], protocols=["socks5"]),
+    dict(valid_only=True, protocols=["http"], limit=10),
+]
+
+
+def measure(count: int = 200000, repeat: int = 100) -> None:
+    """
+    :param count: Count of proxies in collection (2% of them are valid)
+    :param repeat: Count of runs of each query
+    """
+    proxy_collection = ProxyCollection(
+        Proxy(IPv4Address(0x0A000000 + i), 1024 + i % 60000, COUNTRIES[i % len(COUNTRIES)],
+              list(PROTOCOLS_LISTS[i % len(PROTOCOLS_LISTS)]), ANONYMITY_LEVELS[i % len(ANONYMITY_LEVELS)],
+              valid=(i % 50 == 0), validation_time=time(), total_checks=5, success_checks=i % 6)
+        for i in range(count))
+    # First query builds indexes
+    proxy_collection.get_proxies(countries=["US"])
+    for query in QUERIES:
+        start = perf_counter()
+        for _ in range(repeat):
+            result = proxy_collection.get_proxies(**query)
+        print(f"{query}: {len(result)} proxies, {(perf_counter() - start) / repeat * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    measure()
@@ -0,0 +1,70 @@
+"""
+Lease benchmark of src.mongo_lease.MongoLeases: several processes lease proxies from one MongoDB collection at once,
+each proxy must be leased by only one process. Prints leases per second
+
+Run from repo root against local mongod: python -m benchmarks.mongo_leases --uri mongodb://localhost:27017 -p 4
+"""
+import argparse
+import multiprocessing
+from collections import Counter
+from ipaddress import IPv4Address
+from time import time
+from pymongo import MongoClient
+from src.mongo_lease import MongoLeases
+from src.proxy import Proxy
+
+DB_NAME = "proxy_checker_lease_benchmark"
+
+
+def lease_all(uri: str, batch_size: int, results: multiprocessing.Queue) -> None:
+    """
+    Lease batches until nothing left, leases are held (not released) to check that no proxy is leased twice
+    """
+    leases = MongoLeases(collection=MongoClient(uri)[DB_NAME].proxy)
+    leased = []
+    while proxies := leases.claim(batch_size):
+        leased.extend(proxy.key for proxy in proxies)
+    results.put(leased)
+
+
+def measure(uri: str, processes: int, count: int, batch_size: int) -> None:
+    """
+    :param uri: MongoDB uri
+    :param processes: Count of processes, which lease at once
+    :param count: Count of proxies in collection
+    :param batch_size: Count of proxies leased by one claim
+    """
+    client = MongoClient(uri)
+    client.drop_database(DB_NAME)
+    collection = client[DB_NAME].proxy
+    collection.insert_many([Proxy(IPv4Address(0x0A000000 + i), 80, "RU", ["http"], "UNKNOWN",
+                                  validation_time=i).to_mongo_dict() for i in range(count)])
+    collection.create_index("lease_until")
+    collection.create_index("validation_date")
+
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=lease_all, args=(uri, batch_size, results)) for _ in range(processes)]
+    start = time()
+    for worker in workers:
+        worker.start()
+    leased = [results.get() for _ in workers]
+    duration = time() - start
+    for worker in workers:
+        worker.join()
+
+    counts = Counter(key for keys in leased for key in keys)
+    duplicates = sum(1 for times in counts.values() if times > 1)
+    print(f"{processes} processes leased {sum(counts.values())} of {count} proxies in {duration:.2f}s "
+          f"({sum(counts.values()) / duration:.0f} leases/s), per process {[len(keys) for keys in leased]}, "
+          f"{duplicates} leased twice")
+    client.drop_database(DB_NAME)
+
+
+if __name__ == "__main__":
+    args_parser = argparse.ArgumentParser()
+    args_parser.add_argument('--uri', default='mongodb://localhost:27017')
+    args_parser.add_argument('-p', '--processes', type=int, default=4)
+    args_parser.add_argument('-n', '--count', type=int, default=20000)
+    args_parser.add_argument('-b', '--batch-size', type=int, default=500)
+    args = args_parser.parse_args()
+    measure(args.uri, args.processes, args.count, args.batch_size)
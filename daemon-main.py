@@ -1,12 +1,21 @@
+import os
 import sys
 from time import sleep
 
 from proxy_wrappers.thespeedx import get_proxies_thespeedx
-from src.proxy import ProxyCollection
+from src.proxy import ProxyCollection, CHECK_URL, JUDGE_URL
 from src.logger import setup_logger
 from proxy_wrappers.free_proxy import get_proxies_free_proxy
 from proxy_wrappers.geonode import get_proxies_geonode
 from proxy_wrappers.best_proxies import get_proxies_best_proxies
+from proxy_wrappers.collector import collect
+from proxy_wrappers.fetcher import set_cache_path
+from proxy_wrappers.source_diff import SourceDiff
+from proxy_wrappers.thespeedx import get_proxies_thespeedx_diff
+from src.scheduler import RevalidationScheduler
+from src.journal import ProxyJournal
+from src.mongo_lease import MongoLeases
+from src.session import close_shared_session_pool
 import argparse
 
 
@@ -31,12 +40,31 @@ thespeedx = args_parser.add_mutually_exclusive_group()
 thespeedx.add_argument('--thespeedx', action='store_true', help='Use Thespeedx wrapper')
 thespeedx.add_argument('--ignore-thespeedx', action='store_true', help='Do not use Thespeedx wrapper')
 
+args_parser.add_argument('-tsd', '--thespeedx-diff', action='store_true',
+                         help='Get from Thespeedx only proxies added since previous cycle (or previous run)')
+
 args_parser.add_argument('-ml', '--mongo-load', action='store_true',
                          help='Load and validate proxies from mongo, save new proxies to mongo')
 
+args_parser.add_argument('-mst', '--mongo-stale', type=float,
+                         help='Load from mongo only proxies validated more than MONGO_STALE seconds ago')
+
+args_parser.add_argument('-mv', '--mongo-valid-only', action='store_true',
+                         help='Load from mongo only proxies, which were valid on last validation')
+
+args_parser.add_argument('-mpt', '--mongo-protocols', nargs='+', choices=['socks4', 'socks5', 'http', 'https'],
+                         help='Load from mongo only proxies with any of this protocols')
+
 args_parser.add_argument('-ms', '--mongo-save', action='store_true',
                          help='Save new proxies to mongo, or rewrite if currently have')
 
+args_parser.add_argument('-le', '--lease', type=int,
+                         help='Each cycle lease this count of mongo proxies (most stale first, with -mst, -mv, -mpt '
+                              'filters) and validate them, so several daemons share one mongo collection')
+
+args_parser.add_argument('-lt', '--lease-ttl', type=float, default=300,
+                         help='Seconds, after which lease of crashed daemon expires')
+
 args_parser.add_argument('-md', '--mongo-drop', action='store_true',
                          help='Drop mongo base before validate')
 
@@ -49,55 +77,200 @@ args_parser.add_argument('-j', '--judge', action='store_true',
 args_parser.add_argument('-wd', '--web-driver', action='store_true',
                          help='Use webdriver instead request library')
 
+args_parser.add_argument('-dmu', '--driver-max-uses', type=int, default=50,
+                         help='Count of checks, after which web driver of worker will be recreated')
+
 args_parser.add_argument('-mp', '--multi-process', action='store_true',
                          help='Use multithreading to validate',
                          required=('--max-workers' in sys.argv) or ('-mw' in sys.argv))
 
 args_parser.add_argument('-mw', '--max-workers',  help='Max workers count to multithreading', type=int)
 
-args_parser.add_argument('-sl', '--sleep',  help='Sleep time between cycles', type=float, default=0.1)
+args_parser.add_argument('-pc', '--processes', type=int, default=1,
+                         help='Shard proxies across this count of processes, each validates its shard with own '
+                              'threads (-mp) or event loop (-e async)')
 
-args_parser.add_argument('-ln', '--logger-name',  help='Name of logger file', default='proxy_checker')
+args_parser.add_argument('-ac', '--adaptive-concurrency', action='store_true',
+                         help='Adjust count of parallel checks by load (429/5xx answers and latency of check and judge '
+                              'urls), -mw or -c is maximum')
 
+args_parser.add_argument('-rl', '--rate-limit', type=float,
+                         help='Maximum requests per second to each of check url and judge url')
 
+args_parser.add_argument('-p', '--priority', action='store_true',
+                         help='Validate proxies with better history first')
 
+args_parser.add_argument('-pp', '--pre-probe', action='store_true',
+                         help='Validate only proxies, which accept TCP connections')
 
-args = args_parser.parse_args()
+args_parser.add_argument('-pt', '--probe-timeout', help='Timeout of TCP probe in seconds', type=float, default=1.5)
 
+args_parser.add_argument('-ph', '--probe-handshake', action='store_true',
+                         help='TCP probe also check answer to handshake of each proxy protocol')
 
-setup_logger(logger_file=args.logger_name)
-last_commit = "nothing"
+args_parser.add_argument('-pr', '--probe-protocols', action='store_true',
+                         help='TCP probe handshake all protocols at once to detect protocols of each proxy')
 
+args_parser.add_argument('-e', '--engine', help='Validation engine: thread (requests) or async (aiohttp)',
+                         choices=['thread', 'async'], default='thread')
 
-while True:
-    try:
-        proxy_collection = ProxyCollection()
+args_parser.add_argument('-c', '--concurrency', help='Max parallel checks for async engine', type=int,
+                         default=2000)
 
-        if (args.all or args.free_proxy) and (not args.ignore_free_proxy):
-            for proxy in get_proxies_free_proxy():
-                proxy_collection.add_proxy(proxy)
+args_parser.add_argument('-cu', '--check-url', default=CHECK_URL,
+                         help='Url to validate proxies, must return json with origin ip (httpbin or python -m src.judge)')
 
-        if (args.all or args.geonode) and (not args.ignore_geonode):
-            for proxy in get_proxies_geonode():
-                proxy_collection.add_proxy(proxy)
+args_parser.add_argument('-ju', '--judge-url', default=JUDGE_URL,
+                         help='Url to judge proxies anonymity (proxyjudge or python -m src.judge)')
 
-        if (args.all or args.best_proxies) and (not args.ignore_best_proxies):
-            for proxy in get_proxies_best_proxies():
-                proxy_collection.add_proxy(proxy)
+args_parser.add_argument('-su', '--self-ip-url', default=CHECK_URL,
+                         help='Public url, which returns json with origin ip, to get ip of this machine (httpbin)')
 
-        if (args.all or args.thespeedx) and (not args.ignore_thespeedx):
-            thespeedx_proxies, last_commit = get_proxies_thespeedx(last_commit)
-            for proxy in thespeedx_proxies:
-                proxy_collection.add_proxy(proxy)
+args_parser.add_argument('-os', '--one-shot', action='store_true',
+                         help='Validate and judge each proxy with one request to judge url (check url is not used)')
 
-        if args.mongo_load:
-            proxy_collection.load_from_mongo()
+args_parser.add_argument('-st', '--source-timeout', help='Seconds to wait each proxy source', type=float,
+                         default=120)
 
+args_parser.add_argument('-ad', '--adaptive', action='store_true',
+                         help='Validate only due proxies: stable proxies are checked often enough to stay valid, '
+                              'dead proxies are checked with exponential backoff (--force is ignored)')
+
+args_parser.add_argument('-pd', '--persistent', action='store_true',
+                         help='Keep one collection for whole process: new proxies merged into it, mongo loaded only '
+                              'once (with -ml) and used only to save results (with -ms)')
+
+args_parser.add_argument('-ev', '--evict-fail-streak', type=int, default=10,
+                         help='In persistent mode remove proxies, which failed this count of checks in a row')
+
+args_parser.add_argument('-sn', '--snapshot', action='store_true',
+                         help='In persistent mode load collection from <logger_name>.snapshot on start, and save it '
+                              'there after each cycle')
+
+args_parser.add_argument('-jn', '--journal', action='store_true',
+                         help='Load and save proxies in file store <logger_name>_store (journal with snapshot), '
+                              'with -ms results are saved to mongo too')
+
+args_parser.add_argument('-sl', '--sleep',  help='Sleep time between cycles', type=float, default=0.1)
+
+args_parser.add_argument('-ln', '--logger-name',  help='Name of logger file', default='proxy_checker')
 
-        proxy_collection.validate_all(args.force, args.mongo_save, args.web_driver, args.multi_process,
-                                      args.max_workers, args.mongo_drop, args.judge)
 
-        proxy_collection.cleanup()
-        sleep(args.sleep)
-    except KeyboardInterrupt:
-        sys.exit(0)
+if __name__ == "__main__":
+    args = args_parser.parse_args()
+    if args.adaptive_concurrency and (args.engine == "thread") and (not args.multi_process):
+        args_parser.error("-ac needs parallel checks: -mp or -e async")
+
+    setup_logger(logger_file=args.logger_name)
+    set_cache_path(f"./{args.logger_name}_source_cache")
+    last_commit = "nothing"
+    source_diff = SourceDiff(f"./{args.logger_name}_source_diff.json")
+    thespeedx_removed = []
+    diff_commits = []
+    scheduler = RevalidationScheduler()
+    proxy_collection = ProxyCollection()
+    mongo_loaded = False
+    journal = ProxyJournal(f"./{args.logger_name}_store") if args.journal else None
+    journal_loaded = False
+    leases = MongoLeases(ttl=args.lease_ttl) if args.lease else None
+    snapshot_path = f"./{args.logger_name}.snapshot"
+    if args.persistent and args.snapshot and os.path.exists(snapshot_path):
+        proxy_collection.load_snapshot(snapshot_path)
+
+    def get_thespeedx():
+        # Runs in collector thread: shared state is changed only by returned commit, if collector accepts result
+        if args.thespeedx_diff:
+            added, removed, commit_lists = get_proxies_thespeedx_diff(source_diff)
+
+            def commit_diff():
+                # New lists are saved after validation of added proxies, so they are returned again after crash
+                diff_commits.append(commit_lists)
+                thespeedx_removed.extend(removed)
+            return added, commit_diff
+        thespeedx_proxies, new_commit = get_proxies_thespeedx(last_commit)
+
+        def commit():
+            global last_commit
+            last_commit = new_commit
+        return thespeedx_proxies, commit
+
+    while True:
+        try:
+            if not args.persistent:
+                proxy_collection = ProxyCollection()
+
+            sources = {}
+            if (args.all or args.free_proxy) and (not args.ignore_free_proxy):
+                sources["free_proxy"] = get_proxies_free_proxy
+
+            if (args.all or args.geonode) and (not args.ignore_geonode):
+                sources["geonode"] = get_proxies_geonode
+
+            if (args.all or args.best_proxies) and (not args.ignore_best_proxies):
+                sources["best_proxies"] = get_proxies_best_proxies
+
+            if (args.all or args.thespeedx) and (not args.ignore_thespeedx):
+                sources["thespeedx"] = get_thespeedx
+
+            provided_keys = set()
+            collect(sources, proxy_collection, args.source_timeout, provided_keys)
+            # Proxies removed from thespeedx lists are expired, if they are still valid - they stay in mongo.
+            # Proxy is kept, while any other source still provides it
+            expired = [proxy for proxy in thespeedx_removed if proxy.key not in provided_keys]
+            proxy_collection.remove_proxies(expired)
+            for proxy in expired:
+                scheduler.remove(proxy)
+            thespeedx_removed.clear()
+
+            if args.mongo_load and not (args.persistent and mongo_loaded):
+                proxy_collection.load_from_mongo(args.mongo_stale, args.mongo_valid_only, args.mongo_protocols)
+                mongo_loaded = True
+
+            if args.journal and not (args.persistent and journal_loaded):
+                journal.load(proxy_collection)
+                journal_loaded = True
+
+            validate_kwargs = dict(sync_mongo=args.mongo_save, with_web_driver=args.web_driver,
+                                   multiprocess=args.multi_process, max_workers=args.max_workers,
+                                   processes=args.processes, adaptive=args.adaptive_concurrency,
+                                   rate_limit=args.rate_limit,
+                                   drop_mongo=args.mongo_drop, judge=args.judge, engine=args.engine,
+                                   concurrency=args.concurrency, priority=args.priority, pre_probe=args.pre_probe,
+                                   probe_timeout=args.probe_timeout, probe_handshake=args.probe_handshake,
+                                   probe_protocols=args.probe_protocols,
+                                   driver_max_uses=args.driver_max_uses, store=journal, check_url=args.check_url,
+                                   judge_url=args.judge_url, one_shot=args.one_shot,
+                                   self_ip_url=args.self_ip_url)
+            if args.adaptive:
+                # Without -pd collection has new objects each cycle, they take history of scheduled ones
+                scheduler.sync(proxy_collection.proxies)
+                due_proxies = scheduler.due()
+                proxy_collection.validate_all(force=True, proxies=due_proxies, **validate_kwargs)
+                scheduler.reschedule(due_proxies)
+            else:
+                proxy_collection.validate_all(force=args.force, **validate_kwargs)
+            # Added thespeedx proxies are validated, so their lists can be saved as previous ones
+            for commit_lists in diff_commits:
+                commit_lists()
+            diff_commits.clear()
+            source_diff.save()
+
+            if args.lease:
+                leased_collection = ProxyCollection(leases.claim(args.lease, args.mongo_stale, args.mongo_valid_only,
+                                                                 args.mongo_protocols))
+                with leases.renewing():
+                    leased_collection.validate_all(**dict(validate_kwargs, force=True, sync_mongo=False,
+                                                          drop_mongo=False, store=leases))
+                leases.release()
+
+            if args.persistent:
+                for proxy in proxy_collection.evict(args.evict_fail_streak):
+                    scheduler.remove(proxy)
+                if args.snapshot:
+                    proxy_collection.save_snapshot(snapshot_path)
+            else:
+                proxy_collection.cleanup()
+            sleep(args.sleep)
+        except KeyboardInterrupt:
+            close_shared_session_pool()
+            sys.exit(0)
@@ -11,18 +11,14 @@ if __name__ == "__main__":
     proxy_collection = ProxyCollection()
 
     """--- GET NEW PROXIES ---"""
-    for proxy in get_proxies_free_proxy():
-        proxy_collection.add_proxy(proxy)
+    proxy_collection.add_proxies(get_proxies_free_proxy())
 
-    for proxy in get_proxies_geonode():
-        proxy_collection.add_proxy(proxy)
+    proxy_collection.add_proxies(get_proxies_geonode())
 
-    for proxy in get_proxies_best_proxies():
-        proxy_collection.add_proxy(proxy)
+    proxy_collection.add_proxies(get_proxies_best_proxies())
 
     """THIS REPO TOOK TOO MUCH TIME (~3-10k proxies)"""
-    for proxy in get_proxies_thespeedx():
-        proxy_collection.add_proxy(proxy)
+    proxy_collection.add_proxies(get_proxies_thespeedx())
 
     """--- UPDATE SAVED PROXIES ---"""
     proxy_collection.load_from_mongo()
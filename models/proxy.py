@@ -5,7 +5,14 @@ connection()
 
 
 class ProxyModel(Document):
-    meta = {"collection": "proxy"}
+    meta = {
+        "collection": "proxy",
+        "indexes": [
+            {"fields": ["ip", "port"], "unique": True},
+            "validation_date",
+            "lease_until"
+        ]
+    }
     ip = StringField()
     port = IntField()
     protocols = ListField()
@@ -19,3 +26,12 @@ class ProxyModel(Document):
     judge_invalid_count = IntField(default=0)
     judge_valid_count = IntField(default=0)
     judged = BooleanField(default=False)
+    flaps = IntField(default=0)
+    fail_streak = IntField(default=0)
+    latency = FloatField()
+    connect_latency = FloatField()
+    tcp_latency = FloatField()
+    latency_sketch = ListField(IntField())
+    protocol_verdicts = DictField()
+    lease_owner = StringField()
+    lease_until = DateTimeField()
@@ -0,0 +1,82 @@
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from time import time
+from typing import Callable, Dict, List, Set, Tuple, Union
+from src.proxy import Proxy, ProxyCollection
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+# Abandoned (timed out) run of each source, which is still working in background
+_abandoned: Dict[str, Future] = {}
+
+
+def collect(sources: Dict[str, Callable[[], Union[List[Proxy], Tuple[List[Proxy], Callable[[], None]]]]],
+            proxy_collection: ProxyCollection, timeout: Union[float, Dict[str, float]] = 120,
+            provided: Set[int] = None) -> Dict[str, dict]:
+    """
+    Run proxy wrappers concurrently and add their proxies to collection as soon as each wrapper done
+    :param sources: Dict of source name and wrapper function, like {"geonode": get_proxies_geonode}.
+    Wrapper returns list of proxies, or list of proxies and function, which commits new state of source
+    (like last parsed commit) - it is called only if result is accepted, after proxies added to collection.
+    So wrappers don't change any shared state themselves, and abandoned wrapper can't change it later
+    :param proxy_collection: Collection to add proxies
+    :param timeout: Seconds to wait each source (one for all, or dict with timeout of each source name).
+    Hanging source is abandoned, its proxies are skipped. Source is not started again, while its abandoned run is
+    still working (so hanging requests and web drivers don't pile up from cycle to cycle)
+    :param provided: If set - Proxy.key of each proxy of accepted results is added to it
+    :return: Dict of source name and its stats: {"status": "ok" | "error" | "timeout" | "busy", "time": secs,
+    "count": n}
+    """
+    if not sources:
+        return {}
+    stats = {}
+    start = time()
+    for name in list(sources.keys()):
+        if name in _abandoned:
+            if not _abandoned[name].done():
+                stats[name] = {"status": "busy", "time": 0.0, "count": 0}
+                logger.error(f"Source {name} skipped, its abandoned run is still working")
+                continue
+            del _abandoned[name]
+    started = {name: source for name, source in sources.items() if name not in stats}
+    if not started:
+        return stats
+    executor = ThreadPoolExecutor(max_workers=len(started), thread_name_prefix="collector")
+    futures: Dict[Future, str] = {executor.submit(source): name for name, source in started.items()}
+    deadlines = {name: start + (timeout.get(name, 120) if isinstance(timeout, dict) else timeout)
+                 for name in started.keys()}
+    pending = set(futures.keys())
+    try:
+        while pending:
+            next_deadline = min(deadlines[futures[future]] for future in pending)
+            done, pending = wait(pending, timeout=max(0.0, next_deadline - time()), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                try:
+                    result = future.result()
+                    proxies, commit = result if isinstance(result, tuple) else (result, None)
+                    proxy_collection.add_proxies(proxies)
+                    if provided is not None:
+                        provided.update(proxy.key for proxy in proxies)
+                    if commit is not None:
+                        commit()
+                    stats[name] = {"status": "ok", "time": time() - start, "count": len(proxies)}
+                    logger.info(f"Source {name} done in {stats[name]['time']:.1f}s, got {len(proxies)} proxies")
+                except Exception as e:
+                    stats[name] = {"status": "error", "time": time() - start, "count": 0}
+                    logger.error(f"Source {name} failed {traceback.format_exc()}")
+            for future in list(pending):
+                name = futures[future]
+                if time() >= deadlines[name]:
+                    pending.discard(future)
+                    if not future.cancel():
+                        _abandoned[name] = future
+                    stats[name] = {"status": "timeout", "time": time() - start, "count": 0}
+                    logger.error(f"Source {name} timed out after {stats[name]['time']:.1f}s")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    logger.info(f"Collected {sum(stat['count'] for stat in stats.values())} proxies from {len(sources)} sources "
+                f"in {time() - start:.1f}s")
+    return stats
@@ -0,0 +1,76 @@
+import threading
+from typing import Final, Union, Callable, List
+from proxy_wrappers.source_cache import SourceCache
+from src.proxy import Proxy
+from src.session import SessionPool
+
+# Same user agent as web driver use
+USER_AGENT: Final = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                     'Chrome/89.0.4389.82 Safari/537.36')
+
+# Default directory of sources cache, saved between runs
+CACHE_PATH: Final = "./source_cache"
+
+# Pooled sessions (one per thread) for all wrappers, to download pages without web driver
+_session_pool = SessionPool()
+
+# Cache of sources, shared by all wrappers (created on first download)
+_source_cache: Union[SourceCache, None] = None
+_source_cache_lock = threading.Lock()
+
+
+def set_cache_path(path: Union[str, None]) -> None:
+    """
+    Set directory of sources cache, like one per logger name of daemon (call it before first download)
+    :param path: Directory to save cache between runs, if None - cache stored only in memory
+    """
+    global _source_cache
+    with _source_cache_lock:
+        _source_cache = SourceCache(path, _session_pool)
+
+
+def get_source_cache() -> SourceCache:
+    """
+    :return: Cache of sources, shared by all wrappers (in CACHE_PATH, if set_cache_path() was not called)
+    """
+    global _source_cache
+    with _source_cache_lock:
+        if _source_cache is None:
+            _source_cache = SourceCache(CACHE_PATH, _session_pool)
+        return _source_cache
+
+
+def fetch(url: str, timeout: float = 10) -> str:
+    """
+    Download page via plain HTTP (for sources, which don't need JavaScript)
+    :param url: Url to download
+    :param timeout: Timeout in seconds
+    :return: Text of page
+    """
+    response = _session_pool.session.get(url, headers={"User-Agent": USER_AGENT}, timeout=timeout)
+    response.raise_for_status()
+    return response.text
+
+
+def fetch_json(url: str, timeout: float = 10) -> Union[dict, list]:
+    """
+    Download and parse json via plain HTTP
+    :param url: Url to download
+    :param timeout: Timeout in seconds
+    :return: Parsed json
+    """
+    response = _session_pool.session.get(url, headers={"User-Agent": USER_AGENT}, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_proxies(url: str, parse: Callable[[str], List[Proxy]], timeout: float = 10) -> List[Proxy]:
+    """
+    Download page via plain HTTP with conditional request (cached page is parsed, if page not changed since
+    last download)
+    :param url: Url to download
+    :param parse: Function, which parse text of page to list of proxies
+    :param timeout: Timeout in seconds
+    :return: List of proxies from page
+    """
+    return get_source_cache().fetch_proxies(url, parse, headers={"User-Agent": USER_AGENT}, timeout=timeout)
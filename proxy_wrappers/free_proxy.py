@@ -1,6 +1,6 @@
 from ipaddress import IPv4Address
 from typing import List, Final
-from src.wire_web_driver import DriverWrapper
+from proxy_wrappers.fetcher import fetch_proxies
 from bs4 import BeautifulSoup
 from src.proxy import Proxy
 import logging
@@ -18,28 +18,36 @@ URLS_TO_WRAP: Final = [
 ]
 
 
+def parse_free_proxy(page: str) -> List[Proxy]:
+    """
+    :param page: Html page with table of proxies
+    :return: List of proxies, checked last 10 minutes
+    """
+    proxies = []
+    soup = BeautifulSoup(page, 'html.parser')
+    ips = soup.find('table', {'class': 'table table-striped table-bordered'})
+    for row in ips.find_all("tr")[1:]:
+        col = row.find_all("td")
+        last_checked = {"cnt": col[7].contents[0].split(" ")[0], "unit": col[7].contents[0].split(" ")[1]}
+        if (last_checked['unit'] in ['min', 'secs', 'sec']) \
+                or (int(last_checked['cnt']) <= 10 and last_checked['unit'] == 'mins'):
+            proxy = Proxy(ip=IPv4Address(col[0].contents[0]), port=int(col[1].contents[0]),
+                          country=col[2].contents[0] if len(col[2].contents) > 0 else "UNKNOWN",
+                          protocols=["https" if col[6].contents[0] == "yes" else "http"],
+                          anonymity="elite" if col[4].contents[0] == "elite proxy" else col[4].contents[0])
+            proxies.append(proxy)
+    return proxies
+
+
 def get_proxies_free_proxy() -> List[Proxy]:
-    # Initialise wrapper and get proxies
-    with DriverWrapper() as driver_wrapper:
-        proxies = []
-        for url in URLS_TO_WRAP:
-            logger.info(f"Connect to {url}")
-            try:
-                driver_wrapper.driver.get(url)
-            except Exception as e:
-                logger.fatal(f"{url} is unavailable")
-                continue
-            soup = BeautifulSoup(driver_wrapper.driver.page_source, 'html.parser')
-            ips = soup.find('table', {'class': 'table table-striped table-bordered'})
-            for row in ips.find_all("tr")[1:]:
-                col = row.find_all("td")
-                last_checked = {"cnt": col[7].contents[0].split(" ")[0], "unit": col[7].contents[0].split(" ")[1]}
-                if (last_checked['unit'] in ['min', 'secs', 'sec']) \
-                        or (int(last_checked['cnt']) <= 10 and last_checked['unit'] == 'mins'):
-                    proxy = Proxy(ip=IPv4Address(col[0].contents[0]), port=int(col[1].contents[0]),
-                                  country=col[2].contents[0] if len(col[2].contents) > 0 else "UNKNOWN",
-                                  protocols=["https" if col[6].contents[0] == "yes" else "http"],
-                                  anonymity="elite" if col[4].contents[0] == "elite proxy" else col[4].contents[0])
-                    proxies.append(proxy)
-            logger.info(f"After {url} totally get {len(proxies)}")
+    # Pages are static, so download them without web driver
+    proxies = []
+    for url in URLS_TO_WRAP:
+        logger.info(f"Connect to {url}")
+        try:
+            proxies.extend(fetch_proxies(url, parse_free_proxy))
+        except Exception as e:
+            logger.fatal(f"{url} is unavailable")
+            continue
+        logger.info(f"After {url} totally get {len(proxies)}")
     return proxies
@@ -2,8 +2,7 @@ import json
 import time
 from ipaddress import IPv4Address
 from typing import List, Final
-from src.wire_web_driver import DriverWrapper
-from bs4 import BeautifulSoup
+from proxy_wrappers.fetcher import fetch_proxies
 from src.proxy import Proxy
 import logging
 from src.logger import logger_name
@@ -17,24 +16,30 @@ URLS_TO_WRAP: Final = [
 ]
 
 
+def parse_geonode(text: str) -> List[Proxy]:
+    """
+    :param text: Json answer of geonode API
+    :return: List of proxies, checked by geonode last 2 minutes
+    """
+    proxies = []
+    for proxy_dict in json.loads(text)['data']:
+        if (time.time() - proxy_dict["lastChecked"]) <= 2*60:
+            proxy = Proxy(ip=IPv4Address(proxy_dict['ip']), port=int(proxy_dict['port']),
+                          country=proxy_dict['country'] if 'country' in proxy_dict.keys() else "UNKNOWN",
+                          protocols=proxy_dict['protocols'],
+                          anonymity=proxy_dict['anonymityLevel'])
+            proxies.append(proxy)
+    return proxies
+
+
 def get_proxies_geonode() -> List[Proxy]:
-    with DriverWrapper() as driver_wrapper:
-        proxies = []
-        for url in URLS_TO_WRAP:
-            logger.info(f"Connect to {url}")
-            try:
-                driver_wrapper.driver.get(url)
-            except Exception as e:
-                logger.fatal(f"{url} is unavailable")
-                continue
-            soup = BeautifulSoup(driver_wrapper.driver.page_source, 'html.parser')
-            data = json.loads(soup.text)['data']
-            for proxy_dict in data:
-                if (time.time() - proxy_dict["lastChecked"]) <= 2*60:
-                    proxy = Proxy(ip=IPv4Address(proxy_dict['ip']), port=int(proxy_dict['port']),
-                                  country=proxy_dict['country'] if 'country' in proxy_dict.keys() else "UNKNOWN",
-                                  protocols=proxy_dict['protocols'],
-                                  anonymity=proxy_dict['anonymityLevel'])
-                    proxies.append(proxy)
-            logger.info(f"After {url} totally get {len(proxies)}")
-        return proxies
+    proxies = []
+    for url in URLS_TO_WRAP:
+        logger.info(f"Connect to {url}")
+        try:
+            proxies.extend(fetch_proxies(url, parse_geonode))
+        except Exception as e:
+            logger.fatal(f"{url} is unavailable")
+            continue
+        logger.info(f"After {url} totally get {len(proxies)}")
+    return proxies
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, List
+from src.proxy import Proxy
+from src.session import SessionPool
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+
+class SourceCache(object):
+    def __init__(self, path: str = None, session_pool: SessionPool = None):
+        """
+        Cache of proxy sources: for each url store ETag, Last-Modified and raw page. Unchanged pages are not
+        downloaded again, but always parsed again, so freshness filters of parsers (like "checked last 10 minutes")
+        are applied to cached page too
+        :param path: Directory to save cache between runs (one file per url, read on first request of url),
+        if None - cache stored only in memory
+        :param session_pool: Pool of sessions to download pages
+        """
+        self.path = path
+        self.session_pool = session_pool or SessionPool()
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def fetch_proxies(self, url: str, parse: Callable[[str], List[Proxy]], headers: dict = None,
+                      timeout: float = 10) -> List[Proxy]:
+        """
+        Download page with conditional request (cached page is used, if it is not modified) and parse it
+        :param url: Url to download
+        :param parse: Function, which parse text of page to list of proxies
+        :param headers: Additional headers of request
+        :param timeout: Timeout in seconds
+        :return: List of proxies from page
+        """
+        entry = self._get(url)
+        request_headers = dict(headers or {})
+        if entry:
+            if entry.get("etag"):
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+        response = self.session_pool.session.get(url, headers=request_headers, timeout=timeout)
+        if (response.status_code == 304) and entry:
+            logger.info(f"{url} not modified, parse cached page")
+            return parse(entry["body"])
+        response.raise_for_status()
+
+        new_entry = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified"),
+                     "body": response.text}
+        # Page is saved only if it changed, and if server supports conditional requests (else cache is useless)
+        if (new_entry["etag"] or new_entry["last_modified"]) and (new_entry != entry):
+            self._set(url, new_entry)
+        return parse(new_entry["body"])
+
+    def _entry_path(self, url: str) -> str:
+        return os.path.join(self.path, f"{hashlib.sha256(url.encode()).hexdigest()[:32]}.json")
+
+    def _get(self, url: str) -> dict:
+        with self._lock:
+            if (url not in self._entries) and self.path:
+                entry_path = self._entry_path(url)
+                if os.path.exists(entry_path):
+                    try:
+                        with open(entry_path, "r") as f:
+                            entry = json.loads(f.read())
+                        entry.pop("url", None)
+                        self._entries[url] = entry
+                    except (OSError, ValueError) as e:
+                        logger.error(f"Can't load source cache {entry_path}, download {url} again")
+            return self._entries.get(url)
+
+    def _set(self, url: str, entry: dict) -> None:
+        """
+        Save entry of url (via temporary file, so cache is not broken if process killed while saving)
+        """
+        with self._lock:
+            self._entries[url] = entry
+            if self.path:
+                os.makedirs(self.path, exist_ok=True)
+                entry_path = self._entry_path(url)
+                tmp_path = f"{entry_path}.tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(json.dumps(dict(entry, url=url)))
+                os.replace(tmp_path, entry_path)
@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Set, Tuple
+from src.proxy import Proxy
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+
+def _key(proxy: Proxy) -> str:
+    return f"{'+'.join(proxy.protocols)}://{proxy.ip.__str__()}:{proxy.port}"
+
+
+class SourceDiff(object):
+    def __init__(self, path: str = None):
+        """
+        Store last parsed proxies of each source, to get only added and removed proxies on source update
+        :param path: Path and file name to save last parsed proxies between runs, if None - store only in memory
+        """
+        self.path = path
+        self._sources: Dict[str, Dict[str, dict]] = {}
+        # True if committed lists are not saved to file yet
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self._sources = json.loads(f.read())
+            except (OSError, ValueError) as e:
+                logger.error(f"Can't load source diff {path}, start with empty one")
+
+    def diff(self, source: str, proxies: List[Proxy]) -> Tuple[List[Proxy], List[Proxy]]:
+        """
+        Compare new parsed proxies of source with previous ones (new proxies are not saved, call self.commit()
+        after they are ingested, so proxies of failed ingestion are returned as added again next time)
+        :param source: Name of source
+        :param proxies: All proxies, currently parsed from source
+        :return: Proxies added to source, and proxies removed from source since previous commit
+        """
+        current = {_key(proxy): proxy for proxy in proxies}
+        with self._lock:
+            previous = self._sources.get(source, {})
+            added = [proxy for key, proxy in current.items() if key not in previous]
+            removed = [Proxy.from_dict(proxy_dict) for key, proxy_dict in previous.items() if key not in current]
+        logger.info(f"Source {source} diff: {len(added)} added, {len(removed)} removed, {len(current)} total")
+        return added, removed
+
+    def commit(self, source: str, proxies: List[Proxy]) -> None:
+        """
+        Remember new parsed proxies of source as previous ones (written to file by self.save(), once for all
+        committed sources)
+        :param source: Name of source
+        :param proxies: All proxies, currently parsed from source (same as passed to self.diff())
+        """
+        with self._lock:
+            self._sources[source] = {_key(proxy): proxy.to_dict() for proxy in proxies}
+            self._dirty = True
+
+    def keys(self, sources: List[str]) -> Set[int]:
+        """
+        :param sources: Names of sources
+        :return: Proxy.key of previous proxies of this sources
+        """
+        with self._lock:
+            return {Proxy.from_dict(proxy_dict).key for source in sources
+                    for proxy_dict in self._sources.get(source, {}).values()}
+
+    def save(self) -> None:
+        """
+        Write committed lists to file, if they changed since last save (call it at the end of collection)
+        """
+        with self._lock:
+            if (not self.path) or (not self._dirty):
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(json.dumps(self._sources))
+            os.replace(tmp_path, self.path)
+            self._dirty = False
@@ -1,12 +1,10 @@
-import json
 from ipaddress import IPv4Address
-from typing import List, Final, Union, Tuple
-from src.wire_web_driver import DriverWrapper
-from bs4 import BeautifulSoup
+from typing import Callable, List, Final, Union, Tuple
+from proxy_wrappers.fetcher import fetch_json, fetch_proxies
+from proxy_wrappers.source_diff import SourceDiff
 from src.proxy import Proxy
 import logging
 from src.logger import logger_name
-from selenium.webdriver.common.by import By
 
 logger = logging.getLogger(logger_name)
 
@@ -17,35 +15,81 @@ URLS_TO_WRAP: Final = {
     "socks4": "https://raw.githubusercontent.com/TheSpeedX/SOCKS-List/master/socks4.txt",
     "socks5": "https://raw.githubusercontent.com/TheSpeedX/SOCKS-List/master/socks5.txt"
 }
+COMMITS_URL: Final = "https://api.github.com/repos/TheSpeedX/SOCKS-List/commits"
+
+
+def parse_thespeedx(text: str, protocol: str) -> List[Proxy]:
+    """
+    :param text: List of proxies, one "ip:port" per line
+    :param protocol: Protocol of all proxies in list
+    :return: List of proxies
+    """
+    proxies = []
+    for ip in text.split("\n"):
+        ip = ip.strip()
+        if ip != "":
+            proxy = Proxy(ip=IPv4Address(ip.split(":")[0]), port=int(ip.split(":")[1]),
+                          country="UNKNOWN",
+                          protocols=[protocol],
+                          anonymity="UNKNOWN")
+            proxies.append(proxy)
+    return proxies
 
 
 def get_proxies_thespeedx(last_parsed_commit: str = None) -> Union[List[Proxy], Tuple[List[Proxy], str]]:
+    """
+    :param last_parsed_commit: If set - lists are downloaded only if repository has new commit since this one
+    :return: List of proxies, or list of proxies and commit to pass next time, if last_parsed_commit is set
+    (it stays old, if any list is unavailable, so the list is downloaded again next time)
+    """
     proxies = []
-    with DriverWrapper() as driver_wrapper:
-        if last_parsed_commit:
-            driver_wrapper.driver.get("https://api.github.com/repos/TheSpeedX/SOCKS-List/commits")
-            new_commit = json.loads(driver_wrapper.driver.find_element(By.TAG_NAME, "body").text)
-            new_commit = new_commit[0]['sha']
-            if new_commit == last_parsed_commit:
-                return proxies, new_commit
-        for protocol, url in URLS_TO_WRAP.items():
-            logger.info(f"Connect to {url}")
-            try:
-                driver_wrapper.driver.get(url)
-            except Exception as e:
-                logger.fatal(f"{url} is unavailable")
-                continue
-            soup = BeautifulSoup(driver_wrapper.driver.page_source, 'html.parser')
-            for ip in soup.text.split("\n"):
-                if ip != "":
-                    proxy = Proxy(ip=IPv4Address(ip.split(":")[0]), port=int(ip.split(":")[1]),
-                                  country="UNKNOWN",
-                                  protocols=[protocol],
-                                  anonymity="UNKNOWN")
-                    proxies.append(proxy)
-            logger.info(f"After {url} totally get {len(proxies)}")
+    if last_parsed_commit:
+        try:
+            new_commit = fetch_json(COMMITS_URL)[0]['sha']
+        except Exception as e:
+            logger.fatal(f"{COMMITS_URL} is unavailable")
+            new_commit = "unknown"
+        if new_commit == last_parsed_commit:
+            return proxies, new_commit
+    for protocol, url in URLS_TO_WRAP.items():
+        logger.info(f"Connect to {url}")
+        try:
+            proxies.extend(fetch_proxies(url, lambda text: parse_thespeedx(text, protocol)))
+        except Exception as e:
+            logger.fatal(f"{url} is unavailable")
+            new_commit = last_parsed_commit
+            continue
+        logger.info(f"After {url} totally get {len(proxies)}")
     if last_parsed_commit:
         return proxies, new_commit
     else:
         return proxies
 
+
+def get_proxies_thespeedx_diff(source_diff: SourceDiff) -> Tuple[List[Proxy], List[Proxy], Callable[[], None]]:
+    """
+    Get only changes of lists since previous call (unavailable list is skipped, not counted as removed)
+    :param source_diff: Storage of previously parsed lists
+    :return: Added proxies, removed proxies (only if they are not in any other list) and function, which commits
+    new lists to source_diff - call it after added proxies are ingested, and then source_diff.save()
+    """
+    current = {}
+    for protocol, url in URLS_TO_WRAP.items():
+        logger.info(f"Connect to {url}")
+        try:
+            current[url] = fetch_proxies(url, lambda text: parse_thespeedx(text, protocol))
+        except Exception as e:
+            logger.fatal(f"{url} is unavailable")
+    # Proxy removed from one list stays, while it is in another list (unavailable list keeps previous proxies)
+    listed = {proxy.key for proxies in current.values() for proxy in proxies}
+    listed.update(source_diff.keys([url for url in URLS_TO_WRAP.values() if url not in current]))
+    added, removed = [], []
+    for url, proxies in current.items():
+        url_added, url_removed = source_diff.diff(url, proxies)
+        added.extend(url_added)
+        removed.extend(proxy for proxy in url_removed if proxy.key not in listed)
+
+    def commit():
+        for url, proxies in current.items():
+            source_diff.commit(url, proxies)
+    return added, removed, commit
@@ -0,0 +1,226 @@
+import asyncio
+import ssl
+import logging
+from time import time
+from typing import List, Iterator, Optional, Tuple, TYPE_CHECKING
+import aiohttp
+from aiohttp_socks import ProxyConnector, ProxyType, ProxyError, ProxyConnectionError, ProxyTimeoutError
+from src.proxy import Proxy, CHECK_URL, JUDGE_URL
+from src.throttle import AdaptiveConcurrency, RateLimits, is_throttled
+from src.logger import logger_name
+
+if TYPE_CHECKING:
+    from src.mongo_sync import MongoSync
+
+logger = logging.getLogger(logger_name)
+
+# Map of proxy protocols to python-socks proxy types ("https" - http proxy with TLS connection to it)
+PROXY_TYPES = {
+    "socks4": ProxyType.SOCKS4,
+    "socks5": ProxyType.SOCKS5,
+    "http": ProxyType.HTTP,
+    "https": ProxyType.HTTP
+}
+
+# Errors, which means that proxy is dead or broken
+EXPECTED_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ProxyError, ProxyConnectionError, ProxyTimeoutError,
+                   ConnectionResetError, ValueError, OSError)
+
+
+def _no_verify_context() -> ssl.SSLContext:
+    """
+    :return: SSL context without certificates validation (same as verify=False in requests)
+    """
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+async def _on_connection_create_start(session: aiohttp.ClientSession, context, params) -> None:
+    context.connect_start = time()
+
+
+async def _on_connection_create_end(session: aiohttp.ClientSession, context, params) -> None:
+    if context.trace_request_ctx is not None:
+        context.trace_request_ctx["connect_time"] = time() - context.connect_start
+
+
+def _timing_trace_config() -> aiohttp.TraceConfig:
+    """
+    :return: Trace config, which saves time to connect through proxy into trace_request_ctx dict of request
+    """
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_start.append(_on_connection_create_start)
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    return trace_config
+
+
+class AsyncChecker(object):
+    def __init__(self, self_ip: str, concurrency: int = 2000, timeout: float = 10, judge: bool = True,
+                 force: bool = False, store: "MongoSync" = None, check_url: str = CHECK_URL,
+                 judge_url: str = JUDGE_URL, one_shot: bool = False, adaptive: AdaptiveConcurrency = None,
+                 rate_limits: RateLimits = None):
+        """
+        Validate and judge proxies in one event loop via aiohttp
+        :param self_ip: Ip of current machine
+        :param concurrency: Maximum of parallel checks
+        :param timeout: Timeout of each request in seconds
+        :param judge: If True - judge valid proxies
+        :param force: If True - judge valid proxies even if judge=False
+        :param store: Store to save final state of each checked proxy
+        :param check_url: Url to validate proxy, must return json with origin ip
+        :param judge_url: Url to judge proxy anonymity
+        :param one_shot: If True - validate and judge each proxy with one request to judge_url
+        :param adaptive: If set - controller of parallel checks (concurrency is maximum)
+        :param rate_limits: If set - rate limits of requests to each url
+        """
+        self.self_ip = self_ip
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.judge = judge
+        self.force = force
+        self.store = store
+        self.check_url = check_url
+        self.judge_url = judge_url
+        self.one_shot = one_shot
+        self.adaptive = adaptive
+        self.rate_limits = rate_limits
+        self._active = 0
+        self._ssl = _no_verify_context()
+        self._trace_config = _timing_trace_config()
+
+    def validate(self, proxies: List[Proxy]) -> None:
+        """
+        Validate proxies, blocks until all of them checked
+        :param proxies: List of proxies to check
+        """
+        asyncio.run(self.run(proxies))
+
+    async def run(self, proxies: List[Proxy]) -> None:
+        """
+        Validate proxies with no more than self.concurrency checks at once
+        :param proxies: List of proxies to check
+        """
+        workers_count = min(self.concurrency, len(proxies))
+        logger.info(f"Start ASYNC work with {workers_count} workers, total count of proxies: {len(proxies)}")
+        proxies_iter = iter(proxies)
+        slots = asyncio.Condition() if self.adaptive is not None else None
+        await asyncio.gather(*[self._worker(proxies_iter, slots) for _ in range(workers_count)])
+        logger.info(f"ASYNC work done, checked {len(proxies)} proxies")
+
+    async def _worker(self, proxies_iter: Iterator[Proxy], slots: asyncio.Condition = None) -> None:
+        for pr in proxies_iter:
+            if self.adaptive is None:
+                await self.check_proxy(pr)
+                continue
+            async with slots:
+                await slots.wait_for(lambda: self._active < self.adaptive.limit)
+                self._active += 1
+            answer = (None, False)
+            try:
+                answer = await self.check_proxy(pr)
+            finally:
+                self.adaptive.record(*answer)
+                async with slots:
+                    self._active -= 1
+                    slots.notify(max(0, self.adaptive.limit - self._active))
+
+    async def _wait_turn(self, url: str) -> None:
+        if self.rate_limits is not None:
+            delay = self.rate_limits.reserve(url)
+            if delay:
+                await asyncio.sleep(delay)
+
+    def _connector(self, pr: Proxy) -> ProxyConnector:
+        """
+        :param pr: Proxy to connect through
+        :return: Connector, which pass all connections through proxy
+        """
+        protocol = pr.protocol
+        return ProxyConnector(proxy_type=PROXY_TYPES[protocol], host=pr.ip.__str__(), port=pr.port, rdns=True,
+                              proxy_ssl=self._ssl if protocol == "https" else None, ssl=self._ssl)
+
+    async def check_proxy(self, pr: Proxy) -> Tuple[Optional[float], bool]:
+        """
+        Validate and (if needed) judge one proxy, with same rules as requests-based check
+        :param pr: Proxy to check
+        :return: Latency of first answer of check or judge url (None if no answer), and True if any answer was
+        throttled - load signals of adaptive concurrency
+        """
+        logger.info(f"Check {pr.proxy_str}")
+        async with aiohttp.ClientSession(connector=self._connector(pr), timeout=self.timeout,
+                                         trace_configs=[self._trace_config]) as session:
+            if self.one_shot:
+                answer = await self.check_proxy_one_shot(pr, session)
+            else:
+                answer = await self.validate_and_judge(pr, session)
+        if self.store is not None:
+            self.store.add(pr)
+        return answer
+
+    async def check_proxy_one_shot(self, pr: Proxy, session: aiohttp.ClientSession) -> Tuple[Optional[float], bool]:
+        """
+        Validate and judge proxy with one request to self.judge_url
+        :param pr: Proxy to check
+        :param session: Session, which pass all connections through proxy
+        :return: Load signals of check, see self.check_proxy()
+        """
+        answer = (None, False)
+        try:
+            timings = {}
+            await self._wait_turn(self.judge_url)
+            start = time()
+            async with session.get(self.judge_url, trace_request_ctx=timings) as response:
+                total_time = time() - start
+                answer = (total_time, is_throttled(response.status))
+                info = await response.text(errors="replace")
+            pr.apply_check(info, self.self_ip, total_time=total_time, connect_time=timings.get("connect_time"))
+        except EXPECTED_ERRORS:
+            pr.valid = False
+            logger.info(f"NOT VALID {pr.proxy_str} expected error")
+        except Exception as e:
+            pr.valid = False
+            logger.info(f"NOT VALID {pr.proxy_str} unexpected error")
+        return answer
+
+    async def validate_and_judge(self, pr: Proxy, session: aiohttp.ClientSession) -> Tuple[Optional[float], bool]:
+        """
+        Validate proxy with request to self.check_url, then judge it with request to self.judge_url
+        :param pr: Proxy to check
+        :param session: Session, which pass all connections through proxy
+        :return: Load signals of check, see self.check_proxy()
+        """
+        answer = (None, False)
+        try:
+            timings = {}
+            await self._wait_turn(self.check_url)
+            start = time()
+            async with session.get(self.check_url, trace_request_ctx=timings) as response:
+                total_time = time() - start
+                answer = (total_time, is_throttled(response.status))
+                ip_parsed = await response.json(content_type=None)
+            pr.apply_validation(ip_parsed['origin'], self.self_ip, total_time=total_time,
+                                connect_time=timings.get("connect_time"))
+        except EXPECTED_ERRORS:
+            pr.valid = False
+            logger.info(f"NOT VALID {pr.proxy_str} expected error")
+        except Exception as e:
+            pr.valid = False
+            logger.info(f"NOT VALID {pr.proxy_str} unexpected error")
+
+        if pr.valid and (self.judge or self.force):
+            logger.info(f"Proxy {pr.proxy_str} is VALID, judge now")
+            try:
+                await self._wait_turn(self.judge_url)
+                async with session.get(self.judge_url) as response:
+                    answer = (answer[0], answer[1] or is_throttled(response.status))
+                    info = await response.text(errors="replace")
+                pr.apply_judge(info, self.self_ip)
+            except EXPECTED_ERRORS:
+                pr.judged = False
+                logger.info(f"NOT VALID WHILE JUDGE {pr.proxy_str} expected error")
+            except Exception as e:
+                pr.judged = False
+                logger.info(f"NOT VALID WHILE JUDGE  {pr.proxy_str} unexpected error")
+        return answer
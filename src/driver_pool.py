@@ -0,0 +1,78 @@
+import logging
+import threading
+import traceback
+from typing import Dict
+from src.wire_web_driver import DriverWrapper
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+
+class DriverPool(object):
+    def __init__(self, max_uses: int = 50):
+        """
+        Long-lived web drivers, one per thread. Driver reused for many proxies via DriverWrapper.set_proxy,
+        and recreated after max_uses checks or if it crashed
+        :param max_uses: Count of checks, after which driver will be recreated
+        """
+        self.max_uses = max_uses
+        self._wrappers: Dict[int, DriverWrapper] = {}
+        self._uses: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "DriverPool":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def get(self, proxy: dict) -> DriverWrapper:
+        """
+        :param proxy: Dict with "http" and "https" keys, like Proxy.proxy_dict
+        :return: Driver wrapper of current thread, which connects through proxy
+        """
+        thread_id = threading.get_ident()
+        driver_wrapper = self._wrappers.get(thread_id)
+        if driver_wrapper is None:
+            driver_wrapper = DriverWrapper()
+            driver_wrapper.driver = driver_wrapper._get_driver()
+            with self._lock:
+                self._wrappers[thread_id] = driver_wrapper
+                self._uses[thread_id] = 0
+        driver_wrapper.set_proxy(proxy)
+        return driver_wrapper
+
+    def release(self) -> None:
+        """
+        Call after check: clear captured requests, recreate driver if it used too many times or not healthy
+        """
+        thread_id = threading.get_ident()
+        driver_wrapper = self._wrappers.get(thread_id)
+        if driver_wrapper is None:
+            return
+        self._uses[thread_id] += 1
+        try:
+            del driver_wrapper.driver.requests
+            healthy = driver_wrapper.driver.current_url is not None
+        except Exception as e:
+            healthy = False
+        if (not healthy) or (self._uses[thread_id] >= self.max_uses):
+            logger.info(f"Recycle web driver after {self._uses[thread_id]} uses, healthy: {healthy}")
+            self._close(thread_id)
+
+    def _close(self, thread_id: int) -> None:
+        with self._lock:
+            driver_wrapper = self._wrappers.pop(thread_id, None)
+            self._uses.pop(thread_id, None)
+        if driver_wrapper is not None:
+            try:
+                driver_wrapper.close_driver()
+            except Exception as e:
+                logger.error(f"ERROR WHEN CLOSE DRIVER {traceback.format_exc()}")
+
+    def close(self) -> None:
+        """
+        Close drivers of all threads
+        """
+        for thread_id in list(self._wrappers.keys()):
+            self._close(thread_id)
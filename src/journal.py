@@ -0,0 +1,189 @@
+import gc
+import json
+import logging
+import os
+import threading
+import traceback
+from time import time
+from typing import Dict, List, Self, TextIO
+from src.proxy import Proxy, ProxyCollection
+from src.snapshot import read_snapshot_items, write_snapshot
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+
+class ProxyJournal(object):
+    def __init__(self, path: str = "./proxies", compact_every: int = 100000, fsync_interval: float = 10):
+        """
+        File store of proxies without database: each validation result is appended to journal (<path>.jsonl),
+        journal is periodically compacted into binary snapshot (<path>.snapshot) in background thread: full journal
+        is renamed to <path>.jsonl.compacting, and new records are appended to new journal meanwhile.
+        State is snapshot plus journals replayed over it. Like MongoSync, store keeps only still valid proxies
+        :param path: Path and file name (without extension) of snapshot and journal
+        :param compact_every: Compact journal when it contains this count of records
+        :param fsync_interval: Sync journal to disk if last sync was more than this count of seconds ago
+        """
+        self.snapshot_path = f"{path}.snapshot"
+        self.journal_path = f"{path}.jsonl"
+        self.compacting_path = f"{path}.jsonl.compacting"
+        self.compact_every = compact_every
+        self.fsync_interval = fsync_interval
+        self._file: TextIO = None
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._compactor: threading.Thread = None
+        self._last_sync = time()
+        self._records = 0
+        # Stored state kept in memory after first load (so next loads don't replay files), updated by add()
+        self._state: Dict[int, Proxy] = None
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                self._records = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        """
+        :return: Count of records in journal (not compacted yet, and not compacting now)
+        """
+        return self._records
+
+    def add(self, proxy: Proxy) -> None:
+        """
+        Append current state of proxy to journal, start compaction in background if journal is full
+        :param proxy: Proxy to save
+        """
+        line = json.dumps(proxy.to_dict()) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.journal_path, "a")
+            self._file.write(line)
+            self._records += 1
+            if self._state is not None:
+                if proxy.still_valid:
+                    self._state[proxy.key] = proxy
+                else:
+                    self._state.pop(proxy.key, None)
+            if (time() - self._last_sync) >= self.fsync_interval:
+                self._sync()
+            need_compact = (self._records >= self.compact_every) and \
+                ((self._compactor is None) or (not self._compactor.is_alive()))
+            if need_compact:
+                self._compactor = threading.Thread(target=self._compact_in_background, daemon=True)
+                self._compactor.start()
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f"ERROR WHEN COMPACT JOURNAL {traceback.format_exc()}")
+
+    def wait_compaction(self) -> None:
+        """
+        Wait until background compaction is done
+        """
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def flush(self) -> None:
+        """
+        Write appended records to disk
+        """
+        with self._lock:
+            self._sync()
+
+    def _sync(self) -> None:
+        self._last_sync = time()
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """
+        Write appended records to disk and close journal file
+        """
+        self.wait_compaction()
+        with self._lock:
+            self._sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def replay(self) -> Dict[int, Proxy]:
+        """
+        Rebuild state from snapshot and journals. Journal records contain full state of proxy, so replay of records
+        already compacted into snapshot doesn't change state (store stays consistent if process killed while compacting)
+        :return: Dict of Proxy.key and last state of proxy
+        """
+        with self._compact_lock:
+            with self._lock:
+                self._sync()
+            return self._replay([self.compacting_path, self.journal_path])
+
+    def _replay(self, journal_paths: List[str]) -> Dict[int, Proxy]:
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            state = dict(read_snapshot_items(self.snapshot_path)) if os.path.exists(self.snapshot_path) else {}
+            for journal_path in journal_paths:
+                if not os.path.exists(journal_path):
+                    continue
+                with open(journal_path, "r") as f:
+                    for line in f:
+                        try:
+                            proxy = Proxy.from_dict(json.loads(line))
+                        except (ValueError, KeyError) as e:
+                            # Last line may be written partially, if process was killed
+                            logger.warning(f"Skip broken journal record {line.strip()}")
+                            continue
+                        state[proxy.key] = proxy
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return {key: proxy for key, proxy in state.items() if proxy.still_valid}
+
+    def compact(self) -> None:
+        """
+        Write current state to snapshot and clear journal. Lock of self.add() is held only to rename journal,
+        replay and writing of snapshot don't stop appending of new records
+        """
+        with self._compact_lock:
+            with self._lock:
+                self._sync()
+                # Journal of compaction, interrupted by killed process, is compacted first
+                if not os.path.exists(self.compacting_path):
+                    if self._file is not None:
+                        self._file.close()
+                        self._file = None
+                    if os.path.exists(self.journal_path):
+                        os.replace(self.journal_path, self.compacting_path)
+                    self._records = 0
+            state = self._replay([self.compacting_path])
+            write_snapshot(self.snapshot_path, state.values())
+            if os.path.exists(self.compacting_path):
+                os.remove(self.compacting_path)
+        logger.info(f"Compacted journal {self.journal_path}, {len(state)} proxies in snapshot {self.snapshot_path}")
+
+    def load(self, proxy_collection: ProxyCollection) -> None:
+        """
+        Add stored proxies to collection, proxy already in collection takes stored state only if it is newer
+        (like loaded from snapshot or MongoDB, see ProxyCollection.add_newest). Snapshot and journals are replayed
+        only by first load, stored state is kept in memory after it (so collection rebuilt each cycle is loaded
+        without reading files again)
+        :param proxy_collection: Collection to add proxies
+        """
+        count = len(proxy_collection)
+        with self._compact_lock:
+            with self._lock:
+                if self._state is None:
+                    self._sync()
+                    self._state = self._replay([self.compacting_path, self.journal_path])
+                stored = list(self._state.values())
+        proxy_collection.add_newest(stored)
+        logger.info(f"Loaded proxies from journal {self.journal_path}, {len(proxy_collection) - count} new")
@@ -0,0 +1,163 @@
+"""
+Judge server: answers to each request with apparent ip of client and all received headers, so it can replace
+CHECK_URL and JUDGE_URL of src.proxy
+
+Run: python -m src.judge --host 0.0.0.0 --port 8899
+Then validate with check_url="http://<your_node>:8899/" and judge_url="http://<your_node>:8899/"
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+import ssl
+from typing import Dict, Final, Optional, Tuple
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+# Marker in judge answer, which shows that page is received from judge without changes (like "PHP Proxy Judge")
+JUDGE_MARKER: Final = "proxy-checker-judge"
+
+# Line with client ip on azenv.php judges pages
+REMOTE_ADDR_PATTERN: Final = re.compile(r"REMOTE_ADDR\s*=\s*([0-9.]+)")
+
+# Maximum size of request line with headers
+MAX_HEAD_SIZE: Final = 16384
+
+
+def judge_answer(origin: str, headers: Dict[str, str]) -> bytes:
+    """
+    :param origin: Apparent ip of client
+    :param headers: Received headers
+    :return: Body of answer: json with origin (as httpbin.io/ip), upper case headers (as proxy judges) and marker
+    """
+    return json.dumps({"origin": origin, "headers": {name.upper(): value for name, value in headers.items()},
+                       "judge": JUDGE_MARKER}).encode()
+
+
+def parse_origin(info: str) -> Optional[str]:
+    """
+    :param info: Text of judge page: json with origin (judge_answer() or httpbin.io/ip), or azenv.php page
+    :return: Origin ip, as judge see it (None if page doesn't contain it)
+    """
+    try:
+        origin = json.loads(info).get("origin")
+    except (ValueError, AttributeError) as e:
+        found = REMOTE_ADDR_PATTERN.search(info)
+        origin = found.group(1) if found else None
+    return origin.split(",")[0].strip().split(":")[0] if isinstance(origin, str) and origin else None
+
+
+def parse_head(head: bytes) -> Tuple[str, Dict[str, str]]:
+    """
+    :param head: Request line and headers of HTTP request
+    :return: Request line and dict of headers
+    """
+    lines = head.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip()] = value.strip()
+    return lines[0], headers
+
+
+class JudgeServer(object):
+    def __init__(self, host: str = "0.0.0.0", port: int = 8899, ssl_context: ssl.SSLContext = None,
+                 timeout: float = 30):
+        """
+        HTTP server (HTTP/1.1 with keep-alive) in one event loop
+        :param host: Host to listen
+        :param port: Port to listen (0 - any free port)
+        :param ssl_context: If set - serve HTTPS
+        :param timeout: Close connection, if next request is not received in this count of seconds
+        """
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+        self.requests_count = 0
+        self._server: Optional[asyncio.Server] = None
+
+    async def start(self) -> None:
+        """
+        Start listening, self.port is set to real port
+        """
+        self._server = await asyncio.start_server(self.handle, self.host, self.port, ssl=self.ssl_context,
+                                                  limit=MAX_HEAD_SIZE)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Judge server listen on {self.host}:{self.port}")
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "JudgeServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Answer to all requests of one connection
+        """
+        origin = writer.get_extra_info("peername")[0]
+        try:
+            while True:
+                async with asyncio.timeout(self.timeout):
+                    head = await reader.readuntil(b"\r\n\r\n")
+                request_line, headers = parse_head(head)
+                lower_headers = {name.lower(): value for name, value in headers.items()}
+                length = int(lower_headers.get("content-length") or 0)
+                if length:
+                    await reader.readexactly(length)
+                body = judge_answer(origin, headers)
+                self.requests_count += 1
+                keep_alive = (lower_headers.get("connection", "").lower() != "close") and \
+                    (not request_line.endswith("HTTP/1.0"))
+                writer.write(b"HTTP/1.1 200 OK\r\n"
+                             b"Content-Type: application/json\r\n"
+                             b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                             b"Connection: " + (b"keep-alive" if keep_alive else b"close") + b"\r\n\r\n" + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError,
+                ValueError) as e:
+            pass
+        finally:
+            writer.close()
+
+
+def main() -> None:
+    args_parser = argparse.ArgumentParser(description="Judge server for proxy checker")
+    args_parser.add_argument('--host', help='Host to listen', default='0.0.0.0')
+    args_parser.add_argument('--port', help='Port to listen', type=int, default=8899)
+    args_parser.add_argument('--certfile', help='Certificate to serve HTTPS')
+    args_parser.add_argument('--keyfile', help='Private key of certificate')
+    args = args_parser.parse_args()
+
+    ssl_context = None
+    if args.certfile:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(args.certfile, args.keyfile)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        asyncio.run(JudgeServer(args.host, args.port, ssl_context).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import logging
+import os
+import socket
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Final, Iterator, List, Self, Union
+from uuid import uuid4
+from pymongo import DeleteOne, UpdateOne
+from pymongo.collection import Collection
+from src.mongo_sync import PROXY_PROJECTION, mongo_filter, proxy_collection, unleased_filter
+from src.proxy import Proxy
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+# Fields of lease in models.proxy.ProxyModel document (to $unset them)
+LEASE_FIELDS: Final = {"lease_owner": "", "lease_until": ""}
+
+
+class MongoLeases(object):
+    def __init__(self, ttl: float = 300, owner: str = None, batch_size: int = 1000, collection: Collection = None):
+        """
+        Distribute proxies of MongoDB between several checker daemons: each daemon leases due proxies in batches
+        (update_many sets owner and expiry of lease only on documents, which are still not leased), renews leases
+        while validating and releases them with results. Leases of crashed daemons expire, so their proxies are
+        leased by others. Lease expiry is stored in UTC.
+        Used as store of validate_all: results are written only while lease is still owned
+        :param ttl: Seconds, while lease is valid without renewal
+        :param owner: Unique name of this daemon (host, pid and random suffix by default)
+        :param batch_size: Count of proxies leased by one update, and count of results written to MongoDB at once
+        :param collection: pymongo collection of proxies, collection of models.proxy.ProxyModel by default
+        """
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.batch_size = batch_size
+        self._collection = collection
+        # Document id of each leased proxy (by Proxy.key)
+        self._leased: Dict[int, object] = {}
+        self._buffer: List[Union[UpdateOne, DeleteOne]] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.flush()
+
+    def __len__(self) -> int:
+        """
+        :return: Count of currently leased proxies
+        """
+        return len(self._leased)
+
+    @property
+    def collection(self) -> Collection:
+        if self._collection is None:
+            self._collection = proxy_collection()
+        return self._collection
+
+    def claim(self, count: int, stale_after: float = None, valid_only: bool = False,
+              protocols: List[str] = None) -> List[Proxy]:
+        """
+        Lease proxies, which are not leased by anyone (or their lease expired), most stale first
+        :param count: Maximum count of proxies to lease
+        :param stale_after: If set - only proxies validated more than this count of seconds ago
+        :param valid_only: If True - only proxies, which were valid on last validation
+        :param protocols: If set - only proxies with any of this protocols
+        :return: Leased proxies
+        """
+        query = mongo_filter(stale_after, valid_only, protocols)
+        projection = dict(PROXY_PROJECTION, _id=True)
+        proxies = []
+        claimed_ids = set()
+        broken_ids = []
+        while len(proxies) < count:
+            candidate_ids = [document["_id"] for document in self.collection.find(
+                dict(query, **unleased_filter()), {"_id": True}).sort("validation_date", 1).limit(
+                min(count - len(proxies), self.batch_size))]
+            if (not candidate_ids) or claimed_ids.issuperset(candidate_ids):
+                # Nothing left, or own leases expired before this claim finished
+                break
+            # Candidates leased by others meanwhile are not matched, so each document is leased only once
+            self.collection.update_many(
+                dict(unleased_filter(), _id={"$in": candidate_ids}),
+                {"$set": {"lease_owner": self.owner, "lease_until": self._lease_until()}})
+            for document in self.collection.find({"_id": {"$in": candidate_ids}, "lease_owner": self.owner},
+                                                 projection).sort("validation_date", 1):
+                document_id = document.pop("_id")
+                if document_id in claimed_ids:
+                    continue
+                claimed_ids.add(document_id)
+                try:
+                    proxy = Proxy.from_mongo_dict(document)
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Skip broken proxy document from MONGO {document}")
+                    broken_ids.append(document_id)
+                    continue
+                with self._lock:
+                    self._leased[proxy.key] = document_id
+                proxies.append(proxy)
+        if broken_ids:
+            # Broken documents are not validated, so their leases are released at once (kept until end of claim,
+            # so they are not leased again by this claim)
+            self.collection.update_many({"_id": {"$in": broken_ids}, "lease_owner": self.owner},
+                                        {"$unset": LEASE_FIELDS})
+        logger.info(f"Leased {len(proxies)} proxies from MONGO by {self.owner}")
+        return proxies
+
+    def renew(self) -> int:
+        """
+        Extend all leases of this owner
+        :return: Count of renewed leases (less than leased, if some leases expired and were taken by others)
+        """
+        with self._lock:
+            document_ids = list(self._leased.values())
+        if not document_ids:
+            return 0
+        result = self.collection.update_many(
+            {"_id": {"$in": document_ids}, "lease_owner": self.owner},
+            {"$set": {"lease_until": self._lease_until()}})
+        if result.matched_count < len(document_ids):
+            logger.warning(f"Lost {len(document_ids) - result.matched_count} leases of {self.owner}")
+        return result.matched_count
+
+    def _lease_until(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+
+    @contextmanager
+    def renewing(self, interval: float = None) -> Iterator[Self]:
+        """
+        Renew leases in background thread while working with leased proxies
+        :param interval: Seconds between renewals (third of ttl by default)
+        """
+        stop = threading.Event()
+
+        def renew_loop():
+            while not stop.wait(interval or self.ttl / 3):
+                try:
+                    self.renew()
+                except Exception as e:
+                    logger.error(f"ERROR WHEN RENEW LEASES {traceback.format_exc()}")
+
+        thread = threading.Thread(target=renew_loop, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stop.set()
+            thread.join()
+
+    def add(self, proxy: Proxy) -> None:
+        """
+        Release lease of proxy with its validation result: upsert if proxy still valid, else - delete.
+        Result is skipped, if lease was lost (proxy is already leased by another daemon)
+        :param proxy: Checked proxy
+        """
+        with self._lock:
+            document_id = self._leased.pop(proxy.key, None)
+            if document_id is None:
+                return
+            query = {"_id": document_id, "lease_owner": self.owner}
+            if proxy.still_valid:
+                self._buffer.append(UpdateOne(query, {"$set": proxy.to_mongo_dict(), "$unset": LEASE_FIELDS}))
+            else:
+                self._buffer.append(DeleteOne(query))
+            need_flush = len(self._buffer) >= self.batch_size
+        if need_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write buffered results to MongoDB in one bulk_write
+        """
+        with self._lock:
+            operations = self._buffer
+            self._buffer = []
+        if not operations:
+            return
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            lost = len(operations) - result.matched_count - result.deleted_count
+            logger.info(f"Released {len(operations)} leases to MONGO: {result.modified_count} updated, "
+                        f"{result.deleted_count} deleted, {lost} lost")
+        except Exception as e:
+            logger.error(f"ERROR WHEN RELEASE LEASES {traceback.format_exc()}")
+
+    def release(self) -> None:
+        """
+        Release leases of proxies, which were not checked, without results (they can be leased again at once)
+        """
+        with self._lock:
+            document_ids = list(self._leased.values())
+            self._leased.clear()
+        self.flush()
+        if document_ids:
+            self.collection.update_many({"_id": {"$in": document_ids}, "lease_owner": self.owner},
+                                        {"$unset": LEASE_FIELDS})
@@ -0,0 +1,192 @@
+import logging
+import threading
+import traceback
+from datetime import datetime, timezone
+from time import time
+from typing import Dict, Tuple, Union, Self, List, Iterator
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+from pymongo.collection import Collection
+from src.proxy import Proxy
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+# Fields of models.proxy.ProxyModel, needed to create Proxy
+PROXY_PROJECTION = {field: True for field in ["ip", "port", "country", "protocols", "anonymity", "total_checks",
+                                              "success_checks", "judge_invalid_count", "judge_valid_count", "valid",
+                                              "judged", "validation_date", "redirects", "flaps", "fail_streak",
+                                              "latency", "connect_latency", "tcp_latency", "latency_sketch",
+                                              "protocol_verdicts"]}
+PROXY_PROJECTION["_id"] = False
+
+
+def proxy_collection() -> Collection:
+    """
+    :return: pymongo collection of models.proxy.ProxyModel
+    """
+    from models.proxy import ProxyModel
+    if ProxyModel._collection is None:
+        # Indexes are created on first access of model, so duplicates must be merged before unique index
+        dedupe_proxies(ProxyModel._get_db()[ProxyModel._get_collection_name()])
+    return ProxyModel._get_collection()
+
+
+def dedupe_proxies(collection: Collection) -> int:
+    """
+    Migrate collection of older versions, which stored same (ip, port) with different protocols in several documents:
+    documents of each (ip, port) are merged into one (counters summed, protocols joined, see Proxy.merge), so unique
+    (ip, port) index can be created. Skipped, if collection already has this index
+    :param collection: pymongo collection of proxies
+    :return: Count of deleted duplicates
+    """
+    for index in collection.index_information().values():
+        if index.get("unique") and [field for field, _ in index["key"]] == ["ip", "port"]:
+            return 0
+    groups = collection.aggregate([
+        {"$group": {"_id": {"ip": "$ip", "port": "$port"}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True)
+    deleted = 0
+    for group in groups:
+        merged, merged_id = None, None
+        for document in collection.find({"_id": {"$in": group["ids"]}}):
+            document_id = document.pop("_id")
+            try:
+                proxy = Proxy.from_mongo_dict(document)
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Drop broken duplicate proxy document from MONGO {document}")
+                continue
+            if merged is None:
+                merged, merged_id = proxy, document_id
+            else:
+                merged.merge(proxy)
+        if merged is not None:
+            collection.update_one({"_id": merged_id}, {"$set": merged.to_mongo_dict()})
+        duplicate_ids = [document_id for document_id in group["ids"] if document_id != merged_id]
+        deleted += collection.delete_many({"_id": {"$in": duplicate_ids}}).deleted_count
+    if deleted:
+        logger.info(f"Merged duplicates of (ip, port) in MONGO, {deleted} documents deleted")
+    return deleted
+
+
+def mongo_filter(stale_after: float = None, valid_only: bool = False, protocols: List[str] = None) -> dict:
+    """
+    :param stale_after: If set - only proxies validated more than this count of seconds ago
+    :param valid_only: If True - only proxies, which were valid on last validation
+    :param protocols: If set - only proxies with any of this protocols
+    :return: MongoDB query
+    """
+    query = {}
+    if stale_after is not None:
+        query["validation_date"] = {"$lt": datetime.fromtimestamp(time() - stale_after)}
+    if valid_only:
+        query["valid"] = True
+    if protocols:
+        query["protocols"] = {"$in": protocols}
+    return query
+
+
+def unleased_filter() -> dict:
+    """
+    :return: MongoDB query of proxies, which are not leased by any daemon (or their lease expired), see MongoLeases
+    """
+    return {"$or": [{"lease_until": None}, {"lease_until": {"$lt": datetime.now(timezone.utc)}}]}
+
+
+def iter_mongo_proxies(stale_after: float = None, valid_only: bool = False, protocols: List[str] = None,
+                       batch_size: int = 5000, collection: Collection = None) -> Iterator[Proxy]:
+    """
+    Stream proxies from MongoDB as raw documents, without creating mongoengine objects
+    :param stale_after: If set - only proxies validated more than this count of seconds ago
+    :param valid_only: If True - only proxies, which were valid on last validation
+    :param protocols: If set - only proxies with any of this protocols
+    :param batch_size: Count of documents received from MongoDB at once
+    :param collection: pymongo collection to read, collection of models.proxy.ProxyModel by default
+    :return: Iterator of Proxy
+    """
+    if collection is None:
+        collection = proxy_collection()
+    cursor = collection.find(mongo_filter(stale_after, valid_only, protocols), PROXY_PROJECTION,
+                             batch_size=batch_size)
+    try:
+        for document in cursor:
+            try:
+                yield Proxy.from_mongo_dict(document)
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Skip broken proxy document from MONGO {document}")
+    finally:
+        cursor.close()
+
+
+class MongoSync(object):
+    def __init__(self, batch_size: int = 1000, flush_interval: float = 10, collection: Collection = None):
+        """
+        Write-behind sync of proxies to MongoDB: buffer last state of each proxy and write them via bulk_write.
+        Proxies leased by checker daemons (see MongoLeases) are skipped, their results are written by lease owner
+        :param batch_size: Flush buffer when it contains this count of proxies
+        :param flush_interval: Flush buffer if last flush was more than this count of seconds ago
+        :param collection: pymongo collection to write in, collection of models.proxy.ProxyModel by default
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._collection = collection
+        self._buffer: Dict[Tuple[str, int], Union[UpdateOne, DeleteOne]] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.flush()
+
+    @property
+    def collection(self) -> Collection:
+        if self._collection is None:
+            self._collection = proxy_collection()
+        return self._collection
+
+    def add(self, proxy: Proxy) -> None:
+        """
+        Buffer current state of proxy: upsert if proxy still valid, else - delete.
+        Only last state of each (ip, port) will be written
+        :param proxy: Proxy to save
+        """
+        key = (proxy.ip.__str__(), proxy.port)
+        query = dict(unleased_filter(), ip=key[0], port=key[1])
+        if proxy.still_valid:
+            operation = UpdateOne(query, {"$set": proxy.to_mongo_dict()}, upsert=True)
+        else:
+            operation = DeleteOne(query)
+        with self._lock:
+            self._buffer[key] = operation
+            need_flush = (len(self._buffer) >= self.batch_size) or ((time() - self._last_flush) >= self.flush_interval)
+        if need_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write all buffered proxies to MongoDB in one bulk_write
+        """
+        with self._lock:
+            operations = list(self._buffer.values())
+            self._buffer = {}
+            self._last_flush = time()
+        if not operations:
+            return
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            logger.info(f"Sync {len(operations)} proxies to MONGO: {result.upserted_count} added, "
+                        f"{result.modified_count} updated, {result.deleted_count} deleted")
+        except BulkWriteError as e:
+            # Upsert of leased proxy doesn't match its document and fails on unique (ip, port) index
+            errors = e.details.get("writeErrors", [])
+            leased = sum(1 for error in errors if error.get("code") == 11000)
+            logger.info(f"Sync {len(operations)} proxies to MONGO: {e.details.get('nUpserted', 0)} added, "
+                        f"{e.details.get('nModified', 0)} updated, {e.details.get('nRemoved', 0)} deleted, "
+                        f"{leased} skipped as leased")
+            if len(errors) > leased:
+                logger.error(f"ERROR WHEN SYNC MONGO {[error for error in errors if error.get('code') != 11000]}")
+        except Exception as e:
+            logger.error(f"ERROR WHEN SYNC MONGO {traceback.format_exc()}")
@@ -0,0 +1,132 @@
+import asyncio
+import ssl
+import logging
+import socket
+import struct
+from time import time
+from typing import List, Final, Optional
+from src.proxy import PROTOCOLS, Proxy
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+# Address, which proxy asked to connect in handshake (proxy answer is enough, connection is not used)
+PROBE_TARGET: Final = ("1.1.1.1", 80)
+
+
+def handshake_request(protocol: str) -> bytes:
+    """
+    :param protocol: Proxy protocol
+    :return: First bytes, which client send to proxy of this protocol
+    """
+    host, port = PROBE_TARGET
+    if protocol == "socks4":
+        return b"\x04\x01" + struct.pack(">H", port) + socket.inet_aton(host) + b"\x00"
+    elif protocol == "socks5":
+        return b"\x05\x01\x00"
+    else:
+        return f"CONNECT {host}:{port} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n".encode()
+
+
+def handshake_valid(protocol: str, answer: bytes) -> bool:
+    """
+    :param protocol: Proxy protocol
+    :param answer: First bytes, received from proxy after handshake_request
+    :return: True if proxy answer like a proxy of this protocol (even if it refused to connect)
+    """
+    if protocol == "socks4":
+        return len(answer) >= 2 and answer[0] == 0 and 0x5A <= answer[1] <= 0x5D
+    elif protocol == "socks5":
+        return len(answer) >= 2 and answer[0] == 5
+    else:
+        return answer.startswith(b"HTTP/")
+
+
+class TcpProbe(object):
+    def __init__(self, timeout: float = 1.5, concurrency: int = 5000, handshake: bool = False,
+                 detect: bool = False):
+        """
+        Cheap first stage of validation: check that proxy accept TCP connections (and answer to handshake)
+        :param timeout: Timeout of connect (and handshake) in seconds
+        :param concurrency: Maximum of parallel connections
+        :param handshake: If True - send first bytes of each protocol of proxy at once (one connection per protocol),
+        record verdict of each protocol, proxy is alive if any protocol answered
+        :param detect: If True - handshake all PROTOCOLS, not only listed protocols of proxy, answered protocols are
+        added to proxy (implies handshake)
+        """
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.handshake = handshake or detect
+        self.detect = detect
+        self._ssl = ssl.create_default_context()
+        self._ssl.check_hostname = False
+        self._ssl.verify_mode = ssl.CERT_NONE
+
+    def filter(self, proxies: List[Proxy]) -> List[Proxy]:
+        """
+        Probe proxies, mark dead proxies as not valid
+        :param proxies: List of proxies to probe
+        :return: List of alive proxies
+        """
+        return asyncio.run(self.run(proxies))
+
+    async def run(self, proxies: List[Proxy]) -> List[Proxy]:
+        """
+        Probe proxies with no more than self.concurrency connections at once, mark dead proxies as not valid
+        :param proxies: List of proxies to probe
+        :return: List of alive proxies
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def probe(pr: Proxy, protocol: str = None) -> Optional[float]:
+            async with semaphore:
+                return await self.probe(pr, protocol)
+
+        async def probe_protocols(pr: Proxy) -> Optional[float]:
+            protocols = PROTOCOLS if self.detect else pr.protocols
+            connect_times = await asyncio.gather(*[probe(pr, protocol) for protocol in protocols])
+            pr.set_protocol_verdicts({protocol: connect_time is not None
+                                      for protocol, connect_time in zip(protocols, connect_times)})
+            return min((connect_time for connect_time in connect_times if connect_time is not None), default=None)
+
+        logger.info(f"Start TCP PROBE of {len(proxies)} proxies")
+        results = await asyncio.gather(*[probe_protocols(pr) if self.handshake else probe(pr) for pr in proxies])
+        alive = []
+        for pr, connect_time in zip(proxies, results):
+            if connect_time is not None:
+                # One sample per proxy, even if it was probed via several connections
+                pr.record_tcp_time(connect_time)
+                alive.append(pr)
+            else:
+                pr.valid = False
+        logger.info(f"TCP PROBE done, {len(alive)} of {len(proxies)} proxies alive")
+        return alive
+
+    async def probe(self, pr: Proxy, protocol: str = None) -> Optional[float]:
+        """
+        :param pr: Proxy to probe
+        :param protocol: Protocol to probe, protocol of proxy by default
+        :return: Seconds to open connection, if proxy accept connection (and answer to handshake), else None
+        """
+        protocol = protocol or pr.protocol
+        writer = None
+        try:
+            async with asyncio.timeout(self.timeout):
+                start = time()
+                reader, writer = await asyncio.open_connection(
+                    pr.ip.__str__(), pr.port, ssl=self._ssl if protocol == "https" else None)
+                connect_time = time() - start
+                if self.handshake:
+                    writer.write(handshake_request(protocol))
+                    await writer.drain()
+                    answer = await reader.read(16)
+                    if not handshake_valid(protocol, answer):
+                        logger.info(f"NOT {protocol} {pr.ip.__str__()}:{pr.port} wrong handshake")
+                        return None
+            return connect_time
+        except (OSError, asyncio.TimeoutError, ssl.SSLError) as e:
+            logger.info(f"NOT VALID {protocol}://{pr.ip.__str__()}:{pr.port} TCP probe failed")
+            return None
+        finally:
+            if writer is not None:
+                writer.close()
@@ -1,16 +1,25 @@
+import gc
+import heapq
 import json
-import math
+import os
+import threading
 import traceback
+from bisect import bisect_left
 from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from datetime import datetime
 from ipaddress import IPv4Address
-from time import time
-from typing import Final, List, Union
+from queue import Queue
+from time import sleep, time
+from typing import Final, List, Union, Dict, Iterable, Optional, Tuple
 import requests
 from selenium.webdriver.common.by import By
 from seleniumwire.thirdparty.mitmproxy.exceptions import TcpDisconnect, MitmproxyException, HttpReadDisconnect
 from urllib3.exceptions import ReadTimeoutError
-from src.wire_web_driver import DriverWrapper
+from src.driver_pool import DriverPool
+from src.proxy_index import ProxyIndex
+from src.judge import JUDGE_MARKER, parse_origin
+from src.session import shared_session_pool
 from requests.exceptions import ConnectionError, SSLError, ProxyError, ReadTimeout, JSONDecodeError
 import logging
 from src.logger import logger_name
@@ -19,12 +28,133 @@ logger = logging.getLogger(logger_name)
 
 PROTOCOLS: Final = ["socks4", "socks5", "http", "https"]
 ANONYMITY: Final = Union["elite", "anonymous", "transparent", "UNKNOWN"]
+ENGINES: Final = ["thread", "async"]
+ORDERS: Final = ["priority", "success_ratio", "latency"]
+
+# Urls to validate proxy and to judge its anonymity
+CHECK_URL: Final = "https://httpbin.io/ip"
+JUDGE_URL: Final = "http://proxyjudge.us/azenv.php"
+
+# Headers, which shows that proxy is not elite
+PRIVACY_HEADERS: Final = [
+    'VIA',
+    'X-FORWARDED-FOR',
+    'X-FORWARDED',
+    'FORWARDED-FOR',
+    'FORWARDED-FOR-IP',
+    'FORWARDED',
+    'CLIENT-IP',
+    'PROXY-CONNECTION'
+]
+
+
+# Cached ip of current machine, url and time when it was received
+_self_ip_cache = {"ip": None, "url": None, "time": 0}
+
+
+def get_self_ip(ttl: float = 300, url: str = CHECK_URL) -> str:
+    """
+    :param ttl: Seconds to use cached ip before request it again
+    :param url: Public url, which returns json with origin ip (like CHECK_URL), it must be reached via internet,
+    so it sees the same ip as public check and judge servers
+    :return: Public ip of current machine
+    """
+    if (_self_ip_cache["ip"] is None) or (_self_ip_cache["url"] != url) or \
+            ((time() - _self_ip_cache["time"]) >= ttl):
+        with requests.Session() as session:
+            _self_ip_cache["ip"] = session.get(url, timeout=10).json()['origin'].split(":")[0]
+        _self_ip_cache["url"] = url
+        _self_ip_cache["time"] = time()
+    return _self_ip_cache["ip"]
+
+
+class _EnumTable(object):
+    __slots__ = ("_values", "_indexes", "_lock")
+
+    def __init__(self, values: Iterable[str]):
+        """
+        Table of interned string values, so each proxy stores only small int index of its value.
+        New values are added on first use
+        :param values: Initial values
+        """
+        self._values: List[str] = []
+        self._indexes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        for value in values:
+            self.index(value)
+
+    def index(self, value: str) -> int:
+        """
+        :param value: String value
+        :return: Index of value in table
+        """
+        index = self._indexes.get(value)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(value)
+                if index is None:
+                    index = len(self._values)
+                    self._values.append(value)
+                    self._indexes[value] = index
+        return index
+
+    def find(self, value: str) -> Optional[int]:
+        """
+        :param value: String value
+        :return: Index of value in table, None if value never used
+        """
+        return self._indexes.get(value)
+
+    def value(self, index: int) -> str:
+        """
+        :param index: Index of value in table
+        :return: String value
+        """
+        return self._values[index]
+
+
+# Interned anonymity levels and countries of all proxies
+_anonymity_table = _EnumTable(["elite", "anonymous", "transparent", "UNKNOWN"])
+_country_table = _EnumTable(["UNKNOWN"])
+
+# Bit of each protocol in Proxy protocols mask
+_PROTOCOL_BITS: Final = {protocol: 1 << i for i, protocol in enumerate(PROTOCOLS)}
+_ALL_PROTOCOLS: Final = (1 << len(PROTOCOLS)) - 1
+
+
+def _protocols_mask(protocols: Iterable[str]) -> int:
+    """
+    :param protocols: Protocols names
+    :return: Bitmask of protocols
+    """
+    mask = 0
+    for protocol in protocols:
+        if protocol not in PROTOCOLS:
+            raise ValueError(f"protocols must be only {PROTOCOLS}, not {protocol}")
+        mask |= _PROTOCOL_BITS[protocol]
+    return mask
+
+# Weight of new latency sample in exponentially weighted moving average
+LATENCY_ALPHA: Final = 0.3
+
+# Upper bounds (in seconds) of latency sketch buckets, one more bucket for all slower responses
+LATENCY_BUCKETS: Final = [round(0.1 * 1.6 ** i, 3) for i in range(11)]
 
 
 class Proxy(object):
+    # Proxy is stored compactly: ip and port packed in one int, protocols and their probe verdicts as bitmasks,
+    # anonymity and country as indexes of interned tables
+    __slots__ = ("_address", "_protocols", "_preferred", "_protocol_verdicts", "_anonymity", "_country", "total_checks",
+                 "success_checks", "judge_invalid_count", "judge_valid_count", "validation_time", "redirects", "flaps",
+                 "fail_streak", "_valid", "_judged", "latency", "connect_latency", "tcp_latency", "_latency_sketch",
+                 "_collection")
+
     def __init__(self, ip: IPv4Address, port: int, country: str, protocols: List[str], anonymity: ANONYMITY,
                  total_checks: int = 0, success_checks: int = 0, judge_invalid_count: int = 0, valid: bool = None,
-                 judged: bool = None, validation_time: int = 0, redirects: bool = False, judge_valid_count: int = 0):
+                 judged: bool = None, validation_time: int = 0, redirects: bool = False, judge_valid_count: int = 0,
+                 flaps: int = 0, fail_streak: int = 0, latency: float = None, connect_latency: float = None,
+                 latency_sketch: List[int] = None, protocol_verdicts: Dict[str, bool] = None,
+                 tcp_latency: float = None):
         """
         :param ip: Ip address for proxy
         :param port: Port to connect
@@ -38,23 +168,142 @@ class Proxy(object):
         :param valid: If proxy already valid
         :param judged: If proxy already judged
         :param validation_time: Last validation or judge time
+        :param flaps: Count of changes between valid and not valid
+        :param fail_streak: Count of unsuccessful checks in a row
+        :param latency: Moving average of response time through proxy in seconds
+        :param connect_latency: Moving average of time to connect through proxy in seconds
+        :param latency_sketch: Count of responses in each of LATENCY_BUCKETS (and one for slower responses)
+        :param protocol_verdicts: Result of last handshake probe of each probed protocol, like {"http": True}
+        :param tcp_latency: Moving average of time to open TCP connection to proxy in seconds (by TCP probe)
         """
-        for protocol in protocols:
-            if protocol not in PROTOCOLS:
-                raise ValueError(f"protocols must be only {PROTOCOLS}, not {protocol}")
-        self.ip: IPv4Address = ip
-        self.port: int = port
-        self.country: str = country
-        self.protocols: PROTOCOLS = protocols
-        self.anonymity: ANONYMITY = anonymity
+        # Collection, which indexes this proxy (its indexes are updated, when proxy state changed)
+        self._collection: "ProxyCollection" = None
+        self._address: int = int(ip) << 16
+        self.port = port
+        self.protocols = protocols
+        self.country = country
+        self.anonymity = anonymity
         self.total_checks: int = total_checks
         self.success_checks: int = success_checks
         self.judge_invalid_count: int = judge_invalid_count
         self.judge_valid_count: int = judge_valid_count
         self.validation_time: int = validation_time
         self.redirects: bool = redirects
+        self.flaps: int = flaps
+        self.fail_streak: int = fail_streak
         self._valid: bool = valid
         self._judged: bool = judged
+        self.latency: float = latency
+        self.connect_latency: float = connect_latency
+        self.tcp_latency: float = tcp_latency
+        self._latency_sketch: bytearray = bytearray(latency_sketch) if latency_sketch else None
+        self._protocol_verdicts: int = 0
+        if protocol_verdicts:
+            self.set_protocol_verdicts(protocol_verdicts)
+
+    @property
+    def ip(self) -> IPv4Address:
+        """
+        :return: Ip address for proxy
+        """
+        return IPv4Address(self._address >> 16)
+
+    @ip.setter
+    def ip(self, value: IPv4Address):
+        self._address = (int(value) << 16) | (self._address & 0xFFFF)
+
+    @property
+    def port(self) -> int:
+        """
+        :return: Port to connect
+        """
+        return self._address & 0xFFFF
+
+    @port.setter
+    def port(self, value: int):
+        if not (0 <= int(value) <= 0xFFFF):
+            raise ValueError(f"port must be in 0..65535, not {value}")
+        self._address = (self._address & ~0xFFFF) | int(value)
+
+    @property
+    def protocols(self) -> List[str]:
+        """
+        :return: Available protocols: preferred one (first listed by source) first, others in order of PROTOCOLS
+        """
+        preferred = self._preferred & self._protocols
+        return ([PROTOCOLS[preferred.bit_length() - 1]] if preferred else []) + \
+            [protocol for protocol in PROTOCOLS if self._protocols & ~preferred & _PROTOCOL_BITS[protocol]]
+
+    @protocols.setter
+    def protocols(self, value: List[str]):
+        self._set_protocols(_protocols_mask(value))
+        self._preferred: int = _PROTOCOL_BITS[value[0]] if value else 0
+
+    def _set_protocols(self, mask: int) -> None:
+        if self._collection is not None:
+            for bit in _PROTOCOL_BITS.values():
+                self._collection._reindex(self, "protocol", self._protocols & bit, mask & bit)
+        self._protocols: int = mask
+
+    @property
+    def protocol_verdicts(self) -> Dict[str, bool]:
+        """
+        :return: Result of last handshake probe of each probed protocol, like {"http": True, "https": False}
+        """
+        probed, working = self._protocol_verdicts & _ALL_PROTOCOLS, self._protocol_verdicts >> len(PROTOCOLS)
+        return {protocol: bool(working & bit) for protocol, bit in _PROTOCOL_BITS.items() if probed & bit}
+
+    def set_protocol_verdicts(self, verdicts: Dict[str, bool]) -> None:
+        """
+        Replace verdicts of probed protocols, protocols which answered to handshake are added to proxy protocols
+        :param verdicts: Result of handshake probe of each probed protocol, like {"http": True, "socks5": False}
+        """
+        probed = _protocols_mask(verdicts)
+        working = _protocols_mask(protocol for protocol, verdict in verdicts.items() if verdict)
+        self._protocol_verdicts = (self._protocol_verdicts & ~probed & ~(probed << len(PROTOCOLS))) \
+            | probed | (working << len(PROTOCOLS))
+        if working & ~self._protocols:
+            self._set_protocols(self._protocols | working)
+
+    @property
+    def protocol(self) -> str:
+        """
+        :return: Protocol to connect: preferred or first of protocols, which answered to last probe, else preferred
+        or first of protocols
+        """
+        working = self._protocols & (self._protocol_verdicts >> len(PROTOCOLS))
+        mask = working or self._protocols
+        if self._preferred & mask:
+            return PROTOCOLS[self._preferred.bit_length() - 1]
+        return PROTOCOLS[(mask & -mask).bit_length() - 1]
+
+    @property
+    def anonymity(self) -> ANONYMITY:
+        """
+        :return: Anonymity level
+        """
+        return _anonymity_table.value(self._anonymity)
+
+    @anonymity.setter
+    def anonymity(self, value: ANONYMITY):
+        index = _anonymity_table.index(value)
+        if self._collection is not None:
+            self._collection._reindex(self, "anonymity", self._anonymity, index)
+        self._anonymity: int = index
+
+    @property
+    def country(self) -> str:
+        """
+        :return: Country of proxy server
+        """
+        return _country_table.value(self._country)
+
+    @country.setter
+    def country(self, value: str):
+        index = _country_table.index(value)
+        if self._collection is not None:
+            self._collection._reindex(self, "country", self._country, index)
+        self._country: int = index
 
     @property
     def valid(self) -> bool:
@@ -68,11 +317,30 @@ class Proxy(object):
 
     @valid.setter
     def valid(self, value: bool):
-        self._valid = value
+        if (self._valid is not None) and (bool(value) != bool(self._valid)):
+            self.flaps += 1
+        self._set_valid_state(value)
         self.validation_time = time()
         self.total_checks += 1
         if value:
             self.success_checks += 1
+            self.fail_streak = 0
+        else:
+            self.fail_streak += 1
+
+    def _set_valid_state(self, value: Optional[bool]) -> None:
+        if self._collection is not None:
+            self._collection._reindex(self, "valid", bool(self._valid), bool(value))
+        self._valid = value
+
+    def _index_values(self) -> Dict[str, List]:
+        """
+        :return: Values of indexed fields for src.proxy_index.ProxyIndex
+        """
+        return {"protocol": [bit for bit in _PROTOCOL_BITS.values() if self._protocols & bit],
+                "anonymity": [self._anonymity],
+                "country": [self._country],
+                "valid": [True] if self._valid else []}
 
     @property
     def judged(self) -> bool:
@@ -93,12 +361,157 @@ class Proxy(object):
         else:
             self.judge_valid_count += 1
 
+    @property
+    def key(self) -> int:
+        """
+        :return: Key to identify proxy in collection - ip and port packed in one int (same socket endpoint with
+        different protocols is one proxy)
+        """
+        return self._address
+
+    def merge(self, other: "Proxy") -> None:
+        """
+        Merge counters of same proxy from another source, state is taken from the last validated one,
+        protocols of both are joined
+        :param other: Same proxy (with same key)
+        """
+        self.total_checks += other.total_checks
+        self.success_checks += other.success_checks
+        self.judge_invalid_count += other.judge_invalid_count
+        self.judge_valid_count += other.judge_valid_count
+        self.flaps += other.flaps
+        if self.country == "UNKNOWN":
+            self.country = other.country
+        other_newer = other.validation_time > self.validation_time
+        if other_newer:
+            self.validation_time = other.validation_time
+            self.redirects = other.redirects
+            self._set_valid_state(other._valid)
+            self._judged = other._judged
+            self.fail_streak = other.fail_streak
+            if other.anonymity != "UNKNOWN":
+                self.anonymity = other.anonymity
+        elif self.anonymity == "UNKNOWN":
+            self.anonymity = other.anonymity
+        if other._protocols & ~self._protocols:
+            self._set_protocols(self._protocols | other._protocols)
+        if not self._preferred:
+            self._preferred = other._preferred
+        # Verdicts of protocols, probed by the last validated one or probed only by other
+        other_probed = other._protocol_verdicts & _ALL_PROTOCOLS
+        if other_probed:
+            taken = other_probed if other_newer else other_probed & ~self._protocol_verdicts
+            self.set_protocol_verdicts({protocol: verdict for protocol, verdict in other.protocol_verdicts.items()
+                                        if taken & _PROTOCOL_BITS[protocol]})
+        # Latency of the last validated one, or any known
+        if (other.latency is not None) and (other_newer or (self.latency is None)):
+            self.latency = other.latency
+        if (other.connect_latency is not None) and (other_newer or (self.connect_latency is None)):
+            self.connect_latency = other.connect_latency
+        if (other.tcp_latency is not None) and (other_newer or (self.tcp_latency is None)):
+            self.tcp_latency = other.tcp_latency
+        # Sketches of both may contain same samples (copies of one history), so they are not summed
+        if (other._latency_sketch is not None) and (other_newer or (self._latency_sketch is None)):
+            self._latency_sketch = bytearray(other._latency_sketch)
+
+    def take_state(self, other: "Proxy") -> None:
+        """
+        Replace state and counters by state of same proxy, checked in another process (counters are not summed,
+        unlike merge)
+        :param other: Same proxy (with same key)
+        """
+        self.total_checks = other.total_checks
+        self.success_checks = other.success_checks
+        self.judge_invalid_count = other.judge_invalid_count
+        self.judge_valid_count = other.judge_valid_count
+        self.validation_time = other.validation_time
+        self.redirects = other.redirects
+        self.flaps = other.flaps
+        self.fail_streak = other.fail_streak
+        self._set_valid_state(other._valid)
+        self._judged = other._judged
+        self.anonymity = other.anonymity
+        self.country = other.country
+        self._set_protocols(other._protocols)
+        self._preferred = other._preferred
+        self._protocol_verdicts = other._protocol_verdicts
+        self.latency = other.latency
+        self.connect_latency = other.connect_latency
+        self.tcp_latency = other.tcp_latency
+        self._latency_sketch = bytearray(other._latency_sketch) if other._latency_sketch is not None else None
+
+    def take_newer(self, other: "Proxy") -> None:
+        """
+        Take state and counters of another copy of same history (snapshot, journal, MongoDB), if it was validated
+        later, else keep own (counters are not summed, unlike merge, so loading same history twice doesn't count
+        checks twice). Protocols of both are joined
+        :param other: Same proxy (with same key)
+        """
+        protocols = self._protocols | other._protocols
+        if other.validation_time > self.validation_time:
+            self.take_state(other)
+        if protocols != self._protocols:
+            self._set_protocols(protocols)
+
+    def record_latency(self, total_time: float, connect_time: float = None) -> None:
+        """
+        Add response time of successful request through proxy to moving averages and sketch
+        :param total_time: Time from start of request to received response in seconds
+        :param connect_time: Time to connect through proxy in seconds, if known
+        """
+        self.latency = total_time if self.latency is None \
+            else LATENCY_ALPHA * total_time + (1 - LATENCY_ALPHA) * self.latency
+        if connect_time is not None:
+            self.record_connect_time(connect_time)
+        sample = bytearray(len(LATENCY_BUCKETS) + 1)
+        sample[bisect_left(LATENCY_BUCKETS, total_time)] = 1
+        self._add_to_sketch(sample)
+
+    def record_connect_time(self, connect_time: float) -> None:
+        """
+        :param connect_time: Time to connect through proxy in seconds
+        """
+        self.connect_latency = connect_time if self.connect_latency is None \
+            else LATENCY_ALPHA * connect_time + (1 - LATENCY_ALPHA) * self.connect_latency
+
+    def record_tcp_time(self, tcp_time: float) -> None:
+        """
+        :param tcp_time: Time to open TCP connection to proxy in seconds (not a request through proxy)
+        """
+        self.tcp_latency = tcp_time if self.tcp_latency is None \
+            else LATENCY_ALPHA * tcp_time + (1 - LATENCY_ALPHA) * self.tcp_latency
+
+    def _add_to_sketch(self, counts: bytearray) -> None:
+        if self._latency_sketch is None:
+            self._latency_sketch = bytearray(len(LATENCY_BUCKETS) + 1)
+        sketch = [count + other for count, other in zip(self._latency_sketch, counts)]
+        # Counts are stored in bytes, so old samples are halved, when some count overflows
+        while max(sketch) > 255:
+            sketch = [count // 2 for count in sketch]
+        self._latency_sketch[:] = bytes(sketch)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """
+        :param percentile: Percentile from 0 to 100, like 95
+        :return: Upper bound of response time of percentile of requests in seconds (inf if slower than all
+        LATENCY_BUCKETS), None if latency never measured
+        """
+        if (self._latency_sketch is None) or (not any(self._latency_sketch)):
+            return None
+        threshold = sum(self._latency_sketch) * percentile / 100
+        cumulative = 0
+        for bucket, count in enumerate(self._latency_sketch):
+            cumulative += count
+            if (cumulative >= threshold) and count:
+                return LATENCY_BUCKETS[bucket] if bucket < len(LATENCY_BUCKETS) else float("inf")
+        return float("inf")
+
     @property
     def proxy_str(self):
         """
         :return: Return proxy string to connect, like "http://127.0.0.1:1234"
         """
-        return f"{self.protocols[0]}://{self.ip.__str__()}:{self.port}"
+        return f"{self.protocol}://{self.ip.__str__()}:{self.port}"
 
     @property
     def proxy_dict(self) -> dict:
@@ -107,6 +520,179 @@ class Proxy(object):
         """
         return {"http": self.proxy_str, "https": self.proxy_str}
 
+    def apply_validation(self, origin: str, self_ip: str, total_time: float = None,
+                         connect_time: float = None) -> None:
+        """
+        Set validation result from origin ip, returned by CHECK_URL through this proxy
+        :param origin: Origin ip (may contain port, like "127.0.0.1:1234")
+        :param self_ip: Ip of current machine
+        :param total_time: Response time of CHECK_URL in seconds, recorded if proxy is valid
+        :param connect_time: Time to connect through proxy in seconds, recorded if proxy is valid
+        """
+        origin = origin.split(":")[0]
+        if origin == self.ip.__str__():
+            self.valid = True
+            logger.info(f"VALID {self.proxy_str} IP IS RIGHT")
+        elif origin != self_ip:
+            self.valid = True
+            self.redirects = True
+            logger.info(f"VALID {self.proxy_str} BUT REDIRECTS")
+        else:
+            self.valid = False
+            logger.info(f"NOT VALID {self.proxy_str} IP IS MINE {origin}")
+        if self._valid and (total_time is not None):
+            self.record_latency(total_time, connect_time)
+
+    def apply_judge(self, info: str, self_ip: str) -> None:
+        """
+        Set anonymity level from JUDGE_URL page, received through this proxy (its response time is not recorded,
+        latency is sampled once per check, by validation)
+        :param info: Text of judge page
+        :param self_ip: Ip of current machine
+        """
+        if self_ip in info:
+            self.anonymity = "transparent"
+            self.judged = True
+            logger.info(f"Proxy {self.proxy_str} judged to {self.anonymity}")
+        elif any([header in info for header in PRIVACY_HEADERS]):
+            self.anonymity = "anonymous"
+            self.judged = True
+            logger.info(f"Proxy {self.proxy_str} judged to {self.anonymity}")
+        elif ("PHP Proxy Judge" in info) or (JUDGE_MARKER in info):
+            self.anonymity = "elite"
+            self.judged = True
+            logger.info(f"Proxy {self.proxy_str} judged to {self.anonymity}")
+        else:
+            self.judged = False
+            logger.info(f"NOT VALID WHILE JUDGE {self.proxy_str}")
+
+    def apply_check(self, info: str, self_ip: str, total_time: float = None, connect_time: float = None) -> None:
+        """
+        Set validation result and anonymity level from one judge page, received through this proxy
+        (counted as one check)
+        :param info: Text of judge page, which contain origin ip (src.judge server answer or azenv.php page)
+        :param self_ip: Ip of current machine
+        :param total_time: Response time of judge page in seconds, recorded if proxy is valid
+        :param connect_time: Time to connect through proxy in seconds, recorded if proxy is valid
+        """
+        origin = parse_origin(info)
+        if (origin is None) or (origin == self_ip):
+            self.valid = False
+            logger.info(f"NOT VALID {self.proxy_str} IP IS MINE OR UNKNOWN {origin}")
+            return
+        self.redirects = origin != self.ip.__str__()
+        if self.redirects:
+            logger.info(f"Proxy {self.proxy_str} REDIRECTS")
+        self.apply_judge(info, self_ip)
+        if self._judged and (total_time is not None):
+            self.record_latency(total_time, connect_time)
+
+    @property
+    def success_ratio(self) -> float:
+        """
+        :return: Ratio of success validations, 0 if proxy was never checked
+        """
+        return self.success_checks / self.total_checks if self.total_checks != 0 else 0
+
+    @property
+    def judge_ratio(self) -> float:
+        """
+        :return: Ratio of success judges, 0 if proxy was never judged
+        """
+        return (self.judge_valid_count / (self.judge_valid_count + self.judge_invalid_count)) \
+            if (self.judge_valid_count + self.judge_invalid_count) != 0 else 0
+
+    @property
+    def priority(self) -> float:
+        """
+        :return: Smoothed success ratio: ~1 for stable proxies, 0.5 for new, ~0 for dead
+        """
+        return (self.success_checks + 1) / (self.total_checks + 2)
+
+    @property
+    def still_valid(self) -> bool:
+        """
+        :return: True if proxy history is good enough to store it in MongoDB
+        """
+        success_ratio = self.success_ratio
+        judge_ratio = self.judge_ratio
+
+        return (((success_ratio >= 0.5) and (judge_ratio >= 0.5))
+                or ((success_ratio == 1) and (judge_ratio == 0))) and (self.judge_invalid_count < 10)
+
+    def to_dict(self) -> dict:
+        """
+        :return: Dict with all proxy fields, can be dumped to json
+        """
+        return {
+            "ip": self.ip.__str__(),
+            "port": self.port,
+            "country": self.country,
+            "protocols": self.protocols,
+            "anonymity": self.anonymity,
+            "total_checks": self.total_checks,
+            "success_checks": self.success_checks,
+            "judge_invalid_count": self.judge_invalid_count,
+            "judge_valid_count": self.judge_valid_count,
+            "valid": self.valid,
+            "judged": self.judged,
+            "validation_time": self.validation_time,
+            "redirects": self.redirects,
+            "flaps": self.flaps,
+            "fail_streak": self.fail_streak,
+            "latency": self.latency,
+            "connect_latency": self.connect_latency,
+            "tcp_latency": self.tcp_latency,
+            "latency_sketch": list(self._latency_sketch) if self._latency_sketch is not None else None,
+            "protocol_verdicts": self.protocol_verdicts
+        }
+
+    @classmethod
+    def from_dict(cls, proxy_dict: dict) -> "Proxy":
+        """
+        :param proxy_dict: Dict, generated via self.to_dict()
+        :return: Proxy object
+        """
+        return cls(ip=IPv4Address(proxy_dict['ip']), port=int(proxy_dict['port']),
+                   country=proxy_dict['country'], protocols=proxy_dict['protocols'],
+                   anonymity=proxy_dict['anonymity'], total_checks=proxy_dict['total_checks'],
+                   success_checks=proxy_dict['success_checks'],
+                   judge_invalid_count=proxy_dict['judge_invalid_count'], valid=proxy_dict['valid'],
+                   judged=proxy_dict['judged'], validation_time=proxy_dict['validation_time'],
+                   redirects=proxy_dict['redirects'], judge_valid_count=proxy_dict['judge_valid_count'],
+                   flaps=proxy_dict.get('flaps', 0), fail_streak=proxy_dict.get('fail_streak', 0),
+                   latency=proxy_dict.get('latency'), connect_latency=proxy_dict.get('connect_latency'),
+                   latency_sketch=proxy_dict.get('latency_sketch'),
+                   protocol_verdicts=proxy_dict.get('protocol_verdicts'), tcp_latency=proxy_dict.get('tcp_latency'))
+
+    def to_mongo_dict(self) -> dict:
+        """
+        :return: Dict with fields of models.proxy.ProxyModel document
+        """
+        document = self.to_dict()
+        document["validation_date"] = datetime.fromtimestamp(document.pop("validation_time"))
+        return document
+
+    @classmethod
+    def from_mongo_dict(cls, document: dict) -> "Proxy":
+        """
+        :param document: Raw document of models.proxy.ProxyModel (older documents may miss some fields)
+        :return: Proxy object
+        """
+        validation_date = document.get("validation_date")
+        return cls(ip=IPv4Address(document['ip']), port=int(document['port']),
+                   country=document.get('country') or "UNKNOWN", protocols=document['protocols'],
+                   anonymity=document.get('anonymity') or "UNKNOWN",
+                   total_checks=document.get('total_checks', 0), success_checks=document.get('success_checks', 0),
+                   judge_invalid_count=document.get('judge_invalid_count', 0), valid=document.get('valid'),
+                   judged=document.get('judged'),
+                   validation_time=int(validation_date.timestamp()) if validation_date else 0,
+                   redirects=document.get('redirects', False),
+                   judge_valid_count=document.get('judge_valid_count', 0), flaps=document.get('flaps', 0),
+                   fail_streak=document.get('fail_streak', 0), latency=document.get('latency'),
+                   connect_latency=document.get('connect_latency'), latency_sketch=document.get('latency_sketch'),
+                   protocol_verdicts=document.get('protocol_verdicts'), tcp_latency=document.get('tcp_latency'))
+
     def save_in_mongo(self) -> None:
         """
         Save current proxy to MongoDB
@@ -114,15 +700,7 @@ class Proxy(object):
         from models.proxy import ProxyModel
         proxy_model = ProxyModel.objects.filter(ip=self.ip.__str__(), port=self.port).first()
 
-        success_ratio = self.success_checks / self.total_checks
-        judge_ratio = (self.judge_valid_count / (self.judge_valid_count + self.judge_invalid_count)) \
-            if (self.judge_valid_count + self.judge_invalid_count) != 0 else 0
-
-        if (((success_ratio >= 0.5) and (judge_ratio >= 0.5))
-                or ((success_ratio == 1) and (judge_ratio == 0))) and (self.judge_invalid_count < 10):
-            still_valid = True
-        else:
-            still_valid = False
+        still_valid = self.still_valid
 
         if (proxy_model is None) and still_valid:
             proxy_model = ProxyModel()
@@ -134,19 +712,8 @@ class Proxy(object):
             logger.info(f"Skip saving {self.proxy_str} not still_valid")
             return
         try:
-            proxy_model.ip = self.ip.__str__()
-            proxy_model.port = self.port
-            proxy_model.protocols = self.protocols
-            proxy_model.anonymity = self.anonymity
-            proxy_model.country = self.country
-            proxy_model.validation_date = datetime.fromtimestamp(self.validation_time)
-            proxy_model.redirects = self.redirects
-            proxy_model.total_checks = self.total_checks
-            proxy_model.success_checks = self.success_checks
-            proxy_model.judge_invalid_count = self.judge_invalid_count
-            proxy_model.valid = self.valid
-            proxy_model.judged = self.judged
-            proxy_model.judge_valid_count = self.judge_valid_count
+            for field, value in self.to_mongo_dict().items():
+                setattr(proxy_model, field, value)
             proxy_model.save()
             logger.info(f"Save {self.proxy_str} to MONGO")
         except Exception as e:
@@ -159,71 +726,216 @@ class ProxyCollection(object):
         Represent collection of proxies to work with it
         :param proxies:
         """
-        if proxies is None:
-            proxies = []
-        self._proxies = proxies
-        self.proxies: List[Proxy] = []
-        if len(self._proxies) > 0:
-            self.check_list()
+        self._proxies: Dict[int, Proxy] = {}
+        # Secondary indexes for get_proxies, built by loads and on first query (collections, which are only filled
+        # from sources and never queried, don't spend memory for them) and rebuilt on next query if stale
+        self._index = ProxyIndex()
+        self._index_stale = True
+        if proxies:
+            self.add_proxies(proxies)
+
+    def __len__(self) -> int:
+        return len(self._proxies)
+
+    @property
+    def proxies(self) -> List[Proxy]:
+        """
+        :return: List of collected proxies
+        """
+        return list(self._proxies.values())
 
     def cleanup(self):
-        for proxy in self.proxies:
-            del proxy
+        for proxy in self._proxies.values():
+            self._disown(proxy)
+        self._proxies.clear()
+        self._index.clear()
         del self
 
     def check_list(self) -> None:
         """
-        Delete duplicates from collected proxies list
+        Rebuild index of proxies (if proxies keys changed) and merge duplicates
         """
-        for i in range(len(self._proxies)):
-            cur_pr = self._proxies[i]
-            for proxy in list(*self._proxies[i+1:]):
-                if (proxy.ip == cur_pr.ip) and (proxy.port == cur_pr.port) and (proxy.protocols == cur_pr.protocols):
-                    break
-            else:
-                self.proxies.append(cur_pr)
+        proxies = self.proxies
+        self._proxies = {}
+        self._index_stale = True
+        self.add_proxies(proxies)
+
+    def _own(self, proxy: Proxy) -> None:
+        if (proxy._collection is not None) and (proxy._collection is not self):
+            # Proxy is shared with another collection, which can't track its changes anymore
+            proxy._collection._index_stale = True
+        proxy._collection = self
 
-    def add_proxy(self, new_proxy: Proxy) -> None:
+    def _disown(self, proxy: Proxy) -> None:
+        """
+        Called when proxy leaves collection, so changes of detached proxy don't touch index of collection
+        """
+        if proxy._collection is self:
+            proxy._collection = None
+
+    def _reindex(self, proxy: Proxy, field: str, old, new) -> None:
+        """
+        Called by proxy, when its indexed field changed
+        """
+        if (old != new) and (not self._index_stale):
+            self._index.update(proxy.key, field, old, new)
+
+    def _rebuild_index(self) -> None:
+        self._index.clear()
+        for key, proxy in self._proxies.items():
+            self._own(proxy)
+            self._index.add(key, proxy._index_values())
+        self._index_stale = False
+
+    def add_proxy(self, new_proxy: Proxy, merge: bool = False) -> None:
         """
         :param new_proxy: Proxy to add in proxies list (if not exist)
+        :param merge: If True - merge counters of new proxy into existing one, else - skip duplicate
         """
-        for proxy in self.proxies:
-            if ((proxy.ip == new_proxy.ip) and (proxy.port == new_proxy.port)
-                    and (proxy.protocols == new_proxy.protocols)):
-                del new_proxy
-                break
-        else:
-            self.proxies.append(new_proxy)
+        key = new_proxy.key
+        proxy = self._proxies.get(key)
+        if proxy is None:
+            self._proxies[key] = new_proxy
+            self._own(new_proxy)
+            if not self._index_stale:
+                self._index.add(key, new_proxy._index_values())
+        elif merge and (proxy is not new_proxy):
+            proxy.merge(new_proxy)
+            # Duplicate of merged proxy (like by check_list) is not in list anymore
+            self._disown(new_proxy)
+
+    def add_proxies(self, new_proxies: Iterable[Proxy]) -> None:
+        """
+        :param new_proxies: Proxies to add in proxies list, duplicates merged with existing proxies
+        """
+        for new_proxy in new_proxies:
+            self.add_proxy(new_proxy, merge=True)
 
-    def load_from_mongo(self) -> None:
+    def add_newest(self, new_proxies: Iterable[Proxy]) -> None:
+        """
+        :param new_proxies: Copies of proxies history (snapshot, journal, MongoDB) to add in proxies list. Proxy, which
+        is already in list, takes state of copy only if copy is validated later (see Proxy.take_newer), so same
+        history loaded from several stores is not counted twice
         """
-        Load currently saved proxies from MongoDB
+        for new_proxy in new_proxies:
+            proxy = self._proxies.get(new_proxy.key)
+            if proxy is None:
+                self.add_proxy(new_proxy)
+            elif proxy is not new_proxy:
+                proxy.take_newer(new_proxy)
+                self._disown(new_proxy)
+        # Index is built by load, not by first query
+        if self._index_stale:
+            self._rebuild_index()
+
+    def remove_proxy(self, proxy: Proxy) -> None:
+        """
+        :param proxy: Proxy to remove from proxies list (any proxy with same key)
+        """
+        key = proxy.key
+        proxy = self._proxies.pop(key, None)
+        if proxy is None:
+            return
+        if not self._index_stale:
+            self._index.remove(key, proxy._index_values())
+        self._disown(proxy)
+
+    def remove_proxies(self, proxies: Iterable[Proxy]) -> None:
+        """
+        :param proxies: Proxies to remove from proxies list
+        """
+        for proxy in proxies:
+            self.remove_proxy(proxy)
+
+    def evict(self, max_fail_streak: int) -> List[Proxy]:
+        """
+        Remove dead proxies, to keep memory of long-lived collection bounded
+        :param max_fail_streak: Remove proxies, which failed this count of checks in a row
+        :return: Removed proxies
+        """
+        dead = [proxy for proxy in self._proxies.values() if proxy.fail_streak >= max_fail_streak]
+        self.remove_proxies(dead)
+        if dead:
+            logger.info(f"Evicted {len(dead)} dead proxies")
+        return dead
+
+    def load_from_mongo(self, stale_after: float = None, valid_only: bool = False, protocols: List[str] = None,
+                        batch_size: int = 5000) -> None:
+        """
+        Load currently saved proxies from MongoDB, streaming raw documents (filters are applied by MongoDB).
+        Proxy, which is already in collection (like loaded from snapshot), takes state of MongoDB one only if it is
+        validated later
+        :param stale_after: If set - load only proxies validated more than this count of seconds ago
+        :param valid_only: If True - load only proxies, which were valid on last validation
+        :param protocols: If set - load only proxies with any of this protocols
+        :param batch_size: Count of documents received from MongoDB at once
         """
         logger.info(f"Load proxies from MONGO...")
-        from models.proxy import ProxyModel
-        proxy_models = ProxyModel.objects()
-        for proxy_model in proxy_models:
-            self.add_proxy(Proxy(IPv4Address(proxy_model.ip), proxy_model.port, proxy_model.country,
-                                 proxy_model.protocols, proxy_model.anonymity, proxy_model.total_checks,
-                                 proxy_model.success_checks, proxy_model.judge_invalid_count, proxy_model.valid,
-                                 proxy_model.judged, int(proxy_model.validation_date.timestamp()),
-                                 proxy_model.redirects, proxy_model.judge_valid_count))
-        logger.info(f"Loaded proxies from MONGO")
+        from src.mongo_sync import iter_mongo_proxies
+        count = len(self)
+        self.add_newest(iter_mongo_proxies(stale_after=stale_after, valid_only=valid_only, protocols=protocols,
+                                            batch_size=batch_size))
+        logger.info(f"Loaded proxies from MONGO, {len(self) - count} new")
 
     def validate_all(self, force: bool = False, sync_mongo: bool = False, with_web_driver: bool = False,
                      multiprocess: bool = False, max_workers: int = 10, drop_mongo: bool = False,
-                     judge: bool = True) -> None:
+                     judge: bool = True, engine: str = "thread", concurrency: int = 2000,
+                     priority: bool = False, pre_probe: bool = False, probe_timeout: float = 1.5,
+                     probe_handshake: bool = False, driver_max_uses: int = 50, proxies: List[Proxy] = None,
+                     store=None, check_url: str = CHECK_URL, judge_url: str = JUDGE_URL,
+                     one_shot: bool = False, probe_protocols: bool = False, processes: int = 1,
+                     adaptive: bool = False, rate_limit: float = None, self_ip: str = None,
+                     self_ip_url: str = CHECK_URL) -> None:
         """
         Validate all proxies from collected list
         :param force: If True - validate already valid proxies
-        :param sync_mongo: If True - delete from mongo invalid proxies, and add valid
+        :param sync_mongo: If True - delete from mongo invalid proxies, and add valid (buffered, written in batches)
         :param with_web_driver: If True - use seleniumwire.undetected_chromedriver instead requests
         :param multiprocess: If True - use multithreading to speedup proxy validation
         :param max_workers: Maximum of parallel threads to run, if multiprocess=True
         :param drop_mongo: If True - drop currently collected MongoDB proxies collection
         :param judge: If True - use http://proxyjudge.us/azenv.php to check proxy anonymity if current proxy
         anonymity is unknowns, or allways if force param is True
+        :param engine: "thread" - validate via requests (or web driver), "async" - validate via aiohttp
+        in one event loop
+        :param concurrency: Maximum of parallel checks, if engine="async"
+        :param priority: If True - check proxies with better history first
+        :param pre_probe: If True - before validation check that proxies accept TCP connections, and validate only
+        alive proxies (dead proxies become not valid)
+        :param probe_timeout: Timeout of TCP probe in seconds
+        :param probe_handshake: If True - TCP probe also check answer to handshake of each proxy protocol
+        :param driver_max_uses: Count of checks, after which web driver of worker will be recreated,
+        if with_web_driver=True
+        :param proxies: Proxies to validate instead of collected proxies (for example, due proxies of
+        src.scheduler.RevalidationScheduler)
+        :param store: Store of validation results with add(proxy) and flush() methods (for example,
+        src.journal.ProxyJournal to work without MongoDB), with sync_mongo results are saved to both
+        :param check_url: Url to validate proxy, must return json with origin ip (like CHECK_URL or src.judge server)
+        :param judge_url: Url to judge proxy anonymity (like JUDGE_URL or src.judge server)
+        :param one_shot: If True - validate and judge each proxy with one request to judge_url (its page must contain
+        origin ip, like src.judge server or azenv.php judges), check_url is not used
+        :param probe_protocols: If True - TCP probe handshake all PROTOCOLS at once to detect protocols of each proxy
+        (implies pre_probe and probe_handshake), proxies are validated via protocol which answered
+        :param processes: If more than 1 - shard proxies across this count of worker processes, each validates its
+        shard with engine (concurrency and max_workers are per process), results are applied to proxies and store
+        of this process
+        :param adaptive: If True - adjust count of parallel checks by load (AIMD on 429/5xx answers and latency of
+        check_url and judge_url, see src.throttle.AdaptiveConcurrency), max_workers (with
+        multiprocess=True) or concurrency (with engine="async") is maximum (in each process, if processes > 1).
+        Sequential checks (thread engine without multiprocess) can't be adjusted, so ValueError is raised
+        :param rate_limit: If set - maximum requests per second to each of check_url and judge_url (shared between
+        processes)
+        :param self_ip: Public ip of current machine, requested from self_ip_url if not set
+        :param self_ip_url: Public url, which returns json with origin ip, to get ip of current machine (not check_url,
+        which may be own judge server in local network or on this node, so it sees local ip)
         """
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be only {ENGINES}, not {engine}")
+        if with_web_driver and engine == "async":
+            raise ValueError("with_web_driver can't be used with async engine")
+        if adaptive and (engine == "thread") and (not multiprocess):
+            raise ValueError("adaptive needs parallel checks: multiprocess=True or engine=\"async\"")
+
         if drop_mongo:
             from models.connector import connection, db_name
             connector = connection()
@@ -233,137 +945,219 @@ class ProxyCollection(object):
         import urllib3
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-        proxies_objects: List[Proxy] = []
-        proxies_list = []
-        for proxy in self.proxies:
-            if (not proxy.valid) or force:
-                proxies_objects.append(proxy)
-                proxies_list.append(proxy.proxy_dict)
-        with requests.Session() as session:
-            self_ip = session.get("https://httpbin.io/ip").json()['origin'].split(":")[0]
+        proxies_objects: List[Proxy] = [proxy for proxy in (self.proxies if proxies is None else proxies)
+                                        if (not proxy.valid) or force]
+        if priority:
+            proxies_objects.sort(key=lambda proxy: proxy.priority, reverse=True)
+        if self_ip is None:
+            self_ip = get_self_ip(url=self_ip_url)
 
-        def check_list(proxies_obj: List[Proxy], proxies_l: list = None):
-            for pr in proxies_obj:
-                logger.info(f"Check {pr.proxy_str}")
-                try:
+        if sync_mongo:
+            from src.mongo_sync import MongoSync
+            if store is None:
+                store = MongoSync()
+            else:
+                from src.store import MultiStore
+                store = MultiStore([store, MongoSync()])
+
+        if pre_probe or probe_protocols:
+            from src.probe import TcpProbe
+            alive = TcpProbe(timeout=probe_timeout, concurrency=concurrency, handshake=probe_handshake,
+                             detect=probe_protocols).filter(proxies_objects)
+            if store is not None:
+                alive_ids = set(map(id, alive))
+                for pr in proxies_objects:
+                    if id(pr) not in alive_ids:
+                        store.add(pr)
+            proxies_objects = alive
+
+        if processes > 1:
+            from src.sharded_checker import ShardedChecker
+            try:
+                ShardedChecker(processes, force=force, with_web_driver=with_web_driver, multiprocess=multiprocess,
+                               max_workers=max_workers, judge=judge, engine=engine, concurrency=concurrency,
+                               driver_max_uses=driver_max_uses, check_url=check_url, judge_url=judge_url,
+                               one_shot=one_shot, adaptive=adaptive, self_ip=self_ip,
+                               rate_limit=rate_limit / processes if rate_limit else None
+                               ).validate(proxies_objects, store=store)
+            except Exception as e:
+                logger.error(f"ERROR WHEN UPDATE PROXIES {traceback.format_exc()}")
+            if store is not None:
+                store.flush()
+            return
+
+        from src.throttle import AdaptiveConcurrency, RateLimits, is_throttled
+        rate_limits = RateLimits(rate_limit) if rate_limit else None
+
+        if engine == "async":
+            from src.async_checker import AsyncChecker
+            try:
+                AsyncChecker(self_ip, concurrency=concurrency, judge=judge, force=force, store=store,
+                             check_url=check_url, judge_url=judge_url, one_shot=one_shot,
+                             adaptive=AdaptiveConcurrency(concurrency) if adaptive else None,
+                             rate_limits=rate_limits).validate(proxies_objects)
+            except Exception as e:
+                logger.error(f"ERROR WHEN UPDATE PROXIES {traceback.format_exc()}")
+            if rate_limits is not None:
+                rate_limits.log_summary()
+            if store is not None:
+                store.flush()
+            return
+
+        def wait_turn(url: str):
+            if rate_limits is not None:
+                delay = rate_limits.reserve(url)
+                if delay:
+                    sleep(delay)
+
+        def check_proxy_one_shot(pr: Proxy) -> Tuple[Optional[float], bool]:
+            answer = (None, False)
+            try:
+                if with_web_driver:
+                    driver_wrapper = driver_pool.get(pr.proxy_dict)
+                    wait_turn(judge_url)
+                    start = time()
+                    driver_wrapper.driver.get(judge_url)
+                    total_time = time() - start
+                    answer = (total_time, False)
+                    info = driver_wrapper.driver.find_element(By.TAG_NAME, "body").text
+                else:
+                    wait_turn(judge_url)
+                    start = time()
+                    response = session_pool.session.get(judge_url, proxies=pr.proxy_dict, verify=False, timeout=10)
+                    total_time = time() - start
+                    answer = (total_time, is_throttled(response.status_code))
+                    info = response.text
+                pr.apply_check(info, self_ip, total_time=total_time)
+            except (SSLError, ProxyError, ConnectionError, UnboundLocalError, ConnectionResetError,
+                    TcpDisconnect, MitmproxyException, HttpReadDisconnect, ReadTimeoutError, ReadTimeout,
+                    JSONDecodeError):
+                pr.valid = False
+                logger.info(f"NOT VALID {pr.proxy_str} expected error")
+            except Exception as e:
+                pr.valid = False
+                logger.info(f"NOT VALID {pr.proxy_str} unexpected error")
+            return answer
+
+        def check_proxy(pr: Proxy) -> Tuple[Optional[float], bool]:
+            """
+            :return: Latency of first answer of check or judge url (None if no answer), and True if any answer was
+            throttled - load signals of adaptive concurrency
+            """
+            logger.info(f"Check {pr.proxy_str}")
+            if one_shot:
+                answer = check_proxy_one_shot(pr)
+            else:
+                answer = validate_and_judge(pr)
+            if with_web_driver:
+                driver_pool.release()
+            else:
+                session_pool.release_proxy(pr.proxy_str)
+            if store is not None:
+                store.add(pr)
+            return answer
+
+        def validate_and_judge(pr: Proxy) -> Tuple[Optional[float], bool]:
+            answer = (None, False)
+            try:
+                if with_web_driver:
+                    driver_wrapper = driver_pool.get(pr.proxy_dict)
+                    wait_turn(check_url)
+                    start = time()
+                    driver_wrapper.driver.get(check_url)
+                    total_time = time() - start
+                    answer = (total_time, False)
+                    ip_parsed = json.loads(driver_wrapper.driver.find_element(By.TAG_NAME, "body").text)
+                else:
+                    wait_turn(check_url)
+                    start = time()
+                    response = session_pool.session.get(check_url, proxies=pr.proxy_dict, verify=False, timeout=10)
+                    total_time = time() - start
+                    answer = (total_time, is_throttled(response.status_code))
+                    ip_parsed = response.json()
+                pr.apply_validation(ip_parsed['origin'], self_ip, total_time=total_time)
+
+            except (SSLError, ProxyError, ConnectionError, UnboundLocalError, ConnectionResetError,
+                    TcpDisconnect, MitmproxyException, HttpReadDisconnect, ReadTimeoutError, ReadTimeout,
+                    JSONDecodeError):
+                pr.valid = False
+                logger.info(f"NOT VALID {pr.proxy_str} expected error")
+            except Exception as e:
+                pr.valid = False
+                logger.info(f"NOT VALID {pr.proxy_str} unexpected error")
+
+            try:
+                if pr.valid and (judge or force):
+                    logger.info(f"Proxy {pr.proxy_str} is VALID, judge now")
                     if with_web_driver:
-                        with DriverWrapper(proxies_l) as driver_wrapper:
-                                driver_wrapper.change_proxy(proxies_l.index(pr))
-                                driver_wrapper.driver.get("https://httpbin.io/ip")
-                                ip_parsed = json.loads(driver_wrapper.driver.find_element(By.TAG_NAME, "body").text)
-                    else:
-                        with requests.Session() as s:
-                            s.proxies.update(pr.proxy_dict)
-                            response = s.get("https://httpbin.io/ip", verify=False, timeout=10)
-                            ip_parsed = response.json()
-                    if ip_parsed['origin'].split(":")[0] == pr.ip.__str__():
-                        pr.valid = True
-                        if sync_mongo:
-                            pr.save_in_mongo()
-                        logger.info(f"VALID {pr.proxy_str} IP IS RIGHT")
-                    elif ip_parsed['origin'].split(":")[0] != self_ip:
-                        pr.valid = True
-                        pr.redirects = True
-                        if sync_mongo:
-                            pr.save_in_mongo()
-                        logger.info(f"VALID {pr.proxy_str} BUT REDIRECTS")
+                        driver_wrapper = driver_pool.get(pr.proxy_dict)
+                        wait_turn(judge_url)
+                        driver_wrapper.driver.get(judge_url)
+                        info = driver_wrapper.driver.find_element(By.TAG_NAME, "body").text
                     else:
-                        pr.valid = False
-                        if sync_mongo:
-                            pr.save_in_mongo()
-                        logger.info(f"NOT VALID {pr.proxy_str} IP IS MINE {ip_parsed}")
-
-                except (SSLError, ProxyError, ConnectionError, UnboundLocalError, ConnectionResetError,
-                        TcpDisconnect, MitmproxyException, HttpReadDisconnect, ReadTimeoutError, ReadTimeout,
-                        JSONDecodeError):
-                    pr.valid = False
-                    if sync_mongo:
-                        pr.save_in_mongo()
-                    logger.info(f"NOT VALID {pr.proxy_str} expected error")
-                except Exception as e:
-                    pr.valid = False
-                    if sync_mongo:
-                        pr.save_in_mongo()
-                    logger.info(f"NOT VALID {pr.proxy_str} unexpected error")
+                        wait_turn(judge_url)
+                        response = session_pool.session.get(judge_url, proxies=pr.proxy_dict, verify=False,
+                                                            timeout=10)
+                        answer = (answer[0], answer[1] or is_throttled(response.status_code))
+                        info = response.text
+                    pr.apply_judge(info, self_ip)
+            except (SSLError, ProxyError, ConnectionError, UnboundLocalError, ConnectionResetError,
+                    TcpDisconnect, MitmproxyException, HttpReadDisconnect, ReadTimeoutError, ReadTimeout,
+                    JSONDecodeError):
+                pr.judged = False
+                logger.info(f"NOT VALID WHILE JUDGE {pr.proxy_str} expected error")
+            except Exception as e:
+                pr.judged = False
+                logger.info(f"NOT VALID WHILE JUDGE  {pr.proxy_str} unexpected error")
+            return answer
 
+        def worker(proxies_queue: Queue):
+            while (pr := proxies_queue.get()) is not None:
+                if controller is not None:
+                    controller.acquire()
+                answer = (None, False)
                 try:
-                    if pr.valid and (judge or force):
-                        logger.info(f"Proxy {pr.proxy_str} is VALID, judge now")
-                        if with_web_driver:
-                            with DriverWrapper(proxies_l) as driver_wrapper:
-                                driver_wrapper.change_proxy(proxies_l.index(pr))
-                                driver_wrapper.driver.get("http://proxyjudge.us/azenv.php")
-                                info = driver_wrapper.driver.find_element(By.TAG_NAME, "body").text
-                        else:
-                            with requests.Session() as s:
-                                s.proxies.update(pr.proxy_dict)
-                                response = s.get("http://proxyjudge.us/azenv.php", verify=False, timeout=10)
-                                info = response.text
-
-                        privacy_headers = [
-                            'VIA',
-                            'X-FORWARDED-FOR',
-                            'X-FORWARDED',
-                            'FORWARDED-FOR',
-                            'FORWARDED-FOR-IP',
-                            'FORWARDED',
-                            'CLIENT-IP',
-                            'PROXY-CONNECTION'
-                        ]
-                        if self_ip in info:
-                            pr.anonymity = "transparent"
-                            pr.judged = True
-                            if sync_mongo:
-                                pr.save_in_mongo()
-                            logger.info(f"Proxy {pr.proxy_str} judged to {pr.anonymity}")
-                        elif any([header in info for header in privacy_headers]):
-                            pr.anonymity = "anonymous"
-                            pr.judged = True
-                            if sync_mongo:
-                                pr.save_in_mongo()
-                            logger.info(f"Proxy {pr.proxy_str} judged to {pr.anonymity}")
-                        elif "PHP Proxy Judge" in info:
-                            pr.anonymity = "elite"
-                            pr.judged = True
-                            if sync_mongo:
-                                pr.save_in_mongo()
-                            logger.info(f"Proxy {pr.proxy_str} judged to {pr.anonymity}")
-                        else:
-                            pr.judged = False
-                            if sync_mongo:
-                                pr.save_in_mongo()
-                            logger.info(f"NOT VALID WHILE JUDGE {pr.proxy_str}")
-                except (SSLError, ProxyError, ConnectionError, UnboundLocalError, ConnectionResetError,
-                        TcpDisconnect, MitmproxyException, HttpReadDisconnect, ReadTimeoutError, ReadTimeout,
-                        JSONDecodeError):
-                    pr.judged = False
-                    if sync_mongo:
-                        pr.save_in_mongo()
-                    logger.info(f"NOT VALID WHILE JUDGE {pr.proxy_str} expected error")
+                    answer = check_proxy(pr)
                 except Exception as e:
-                    pr.judged = False
-                    if sync_mongo:
-                        pr.save_in_mongo()
-                    logger.info(f"NOT VALID WHILE JUDGE  {pr.proxy_str} unexpected error")
+                    logger.error(f"ERROR WHEN CHECK {pr.proxy_str} {traceback.format_exc()}")
+                finally:
+                    if controller is not None:
+                        controller.release(*answer)
+            session_pool.release_session()
 
+        session_pool = shared_session_pool()
+        driver_pool = DriverPool(max_uses=driver_max_uses)
         try:
             if multiprocess:
+                max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+                controller = AdaptiveConcurrency(max_workers) if adaptive else None
+                proxies_queue = Queue(maxsize=max_workers * 2)
+                logger.info(f"Start MULTITHREAD work with {max_workers} workers, "
+                            f"total count of proxies: {len(proxies_objects)}")
                 with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                    num_of_batch = math.ceil(len(proxies_objects) / max_workers)
-                    logger.info(f"Start MULTITHREAD work with {max_workers} workers and {num_of_batch} batches, total count of proxies: {len(proxies_objects)}")
+                    for _ in range(max_workers):
+                        executor.submit(worker, proxies_queue)
                     try:
-                        for proxy_collection in [
-                            (proxies_objects[i*max_workers:(i+1)*max_workers],
-                             proxies_list[i*max_workers:(i+1)*max_workers]) for i in range(num_of_batch)]:
-                            executor.submit(check_list, *proxy_collection)
+                        for pr in proxies_objects:
+                            proxies_queue.put(pr)
                     except KeyboardInterrupt:
                         print("KI")
                     except Exception as e:
                         logger.error(f"ERROR WHEN MULTITHREAD {traceback.format_exc()}")
+                    finally:
+                        for _ in range(max_workers):
+                            proxies_queue.put(None)
             else:
-                check_list(proxies_objects, proxies_list)
+                for pr in proxies_objects:
+                    check_proxy(pr)
         except Exception as e:
             logger.error(f"ERROR WHEN UPDATE PROXIES {traceback.format_exc()}")
+        session_pool.release_session()
+        driver_pool.close()
+        if rate_limits is not None:
+            rate_limits.log_summary()
+        if store is not None:
+            store.flush()
 
 
     def save(self, path: str = "./proxies.json") -> None:
@@ -375,56 +1169,125 @@ class ProxyCollection(object):
             generated_file = []
             for proxy in self.proxies:
                 if proxy.valid:
-                    generated_file.append(
-                        {
-                            "ip": proxy.ip.__str__(),
-                            "port": proxy.port,
-                            "country": proxy.country,
-                            "protocols": proxy.protocols,
-                            "anonymity": proxy.anonymity,
-                            "total_checks": proxy.total_checks,
-                            "success_checks": proxy.success_checks,
-                            "judge_invalid_count": proxy.judge_invalid_count,
-                            "judge_valid_count": proxy.judge_valid_count,
-                            "valid": proxy.valid,
-                            "judged": proxy.judged,
-                            "validation_time": proxy.validation_time,
-                            "redirects": proxy.redirects
-                        }
-                    )
+                    generated_file.append(proxy.to_dict())
             f.write(json.dumps(generated_file))
 
     def load(self, path: str = "./proxies.json") -> None:
         """
-        Load proxies from file generated via self.save()
+        Load proxies from file generated via self.save() or self.save_snapshot()
         :param path: Path and file name to load proxies
         """
+        from src.snapshot import is_snapshot
+        if is_snapshot(path):
+            self.load_snapshot(path)
+            return
         with open(path, "r") as f:
             proxies_list = json.loads(f.read())
             for proxy_dict in proxies_list:
-                proxy = Proxy(ip=IPv4Address(proxy_dict['ip']), port=int(proxy_dict['port']),
-                              country=proxy_dict['country'], protocols=proxy_dict['protocols'],
-                              anonymity=proxy_dict['anonymity'], total_checks=proxy_dict['total_checks'],
-                              success_checks=proxy_dict['success_checks'],
-                              judge_invalid_count=proxy_dict['judge_invalid_count'], valid=proxy_dict['valid'],
-                              judged=proxy_dict['judged'], validation_time=proxy_dict['validation_time'],
-                              redirects=proxy_dict['redirects'], judge_valid_count=proxy_dict['judge_valid_count'])
-                self.add_proxy(proxy)
-
-    def get_proxies(self, anonymity: List[ANONYMITY] = None, protocols: list = None) -> List[Proxy]:
-        """
-        Filter and return currently collected proxies
-        :param anonymity: Anonymity level
-        :param protocols: Protocols needed
+                self.add_proxy(Proxy.from_dict(proxy_dict))
+        if self._index_stale:
+            self._rebuild_index()
+
+    def save_snapshot(self, path: str = "./proxies.snapshot") -> None:
+        """
+        Save all proxies with their counters to compact binary snapshot
+        :param path: Path and file name to save proxies
+        """
+        from src.snapshot import write_snapshot
+        write_snapshot(path, self._proxies.values())
+
+    def load_snapshot(self, path: str = "./proxies.snapshot") -> None:
+        """
+        Load proxies from binary snapshot generated via self.save_snapshot(). Proxy, which is already in collection,
+        takes state of snapshot only if snapshot one is validated later (see Proxy.take_newer)
+        :param path: Path and file name to load proxies
+        """
+        from src.snapshot import read_snapshot, read_snapshot_items
+        count = len(self)
+        start = time()
+        # Garbage collector is useless while creating many proxies without cycles, but it rescans them again and again
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            if self._proxies:
+                self.add_newest(read_snapshot(path))
+            else:
+                self._proxies.update(read_snapshot_items(path))
+                self._rebuild_index()
+        finally:
+            if gc_enabled:
+                gc.enable()
+        logger.info(f"Loaded {len(self) - count} new proxies from snapshot {path} in {time() - start:.2f}s")
+
+    def get_proxies(self, anonymity: List[ANONYMITY] = None, protocols: list = None, countries: List[str] = None,
+                    valid_only: bool = False, min_success_ratio: float = None, max_latency: float = None,
+                    no_redirects: bool = False, order_by: str = None, limit: int = None) -> List[Proxy]:
+        """
+        Filter and return currently collected proxies. Anonymity, protocols, countries and validity are filtered
+        via indexes, so only matched proxies are touched
+        :param anonymity: Anonymity levels (any of them)
+        :param protocols: Protocols needed (any of them)
+        :param countries: Countries of proxy servers (any of them)
+        :param valid_only: If True - only currently valid proxies
+        :param min_success_ratio: Minimal ratio of success validations
+        :param max_latency: Maximal latency in seconds (proxies with unknown latency are skipped)
+        :param no_redirects: If True - skip proxies, which redirect to another ip
+        :param order_by: Sort result by one of ORDERS ("priority" and "success_ratio" - best first,
+        "latency" - fastest first), else - result is not ordered
+        :param limit: Maximum count of proxies to return (top-k if order_by is set)
         :return: List of Proxy
         """
         if protocols:
             for protocol in protocols:
                 if protocol not in PROTOCOLS:
                     raise ValueError(f"protocols must be only {PROTOCOLS}")
-        filtered_proxies = []
-        for proxy in self.proxies:
-            if ((anonymity and (any(anonim in proxy.anonymity for anonim in anonymity))) or not anonymity) and \
-                ((protocols and (any(protocol in proxy.protocols for protocol in protocols))) or not protocols):
-                filtered_proxies.append(proxy)
-        return filtered_proxies
+        if (order_by is not None) and (order_by not in ORDERS):
+            raise ValueError(f"order_by must be only {ORDERS}, not {order_by}")
+
+        if self._index_stale:
+            self._rebuild_index()
+
+        def accepted(proxy: Proxy) -> bool:
+            return ((not valid_only) or proxy.valid) \
+                and ((min_success_ratio is None) or (proxy.success_ratio >= min_success_ratio)) \
+                and ((max_latency is None) or ((proxy.latency is not None) and (proxy.latency <= max_latency))) \
+                and ((not no_redirects) or (not proxy.redirects))
+
+        proxies = self._proxies
+        # Without order first matched proxies are enough, so index stops after limit of them
+        first_only = (order_by is None) and (limit is not None)
+        keys = self._index.query(
+            match=(lambda key: (key in proxies) and accepted(proxies[key])) if first_only else None,
+            limit=limit if first_only else None,
+            protocol=[_PROTOCOL_BITS[protocol] for protocol in protocols] if protocols else None,
+            anonymity=[_anonymity_table.find(level) for level in anonymity] if anonymity else None,
+            country=[_country_table.find(country) for country in countries] if countries else None,
+            valid=[True] if valid_only else None)
+        if first_only:
+            return [proxies[key] for key in keys if key in proxies] if keys is not None \
+                else list(islice(filter(accepted, proxies.values()), limit))
+        candidates = proxies.values() if keys is None else [proxies[key] for key in keys if key in proxies]
+        filtered_proxies = [proxy for proxy in candidates if accepted(proxy)]
+
+        if order_by == "priority":
+            sort_key = lambda proxy: -proxy.priority
+        elif order_by == "success_ratio":
+            sort_key = lambda proxy: -proxy.success_ratio
+        elif order_by == "latency":
+            sort_key = lambda proxy: proxy.latency if proxy.latency is not None else float("inf")
+        else:
+            return filtered_proxies
+        if limit is not None:
+            return heapq.nsmallest(limit, filtered_proxies, key=sort_key)
+        return sorted(filtered_proxies, key=sort_key)
+
+    def get_fastest(self, count: int, max_latency: float = None, **filters) -> List[Proxy]:
+        """
+        Select currently valid proxies with the lowest latency (only proxies with measured latency)
+        :param count: Maximum count of proxies to return
+        :param max_latency: Maximal latency in seconds
+        :param filters: Other filters of self.get_proxies(), like anonymity=["elite"]
+        :return: List of Proxy, fastest first
+        """
+        return self.get_proxies(valid_only=True, max_latency=float("inf") if max_latency is None else max_latency,
+                                order_by="latency", limit=count, **filters)
@@ -0,0 +1,105 @@
+import threading
+from typing import Callable, Dict, Final, Iterable, List, Optional, Set
+
+# Indexed fields of proxy and their values: protocol bit, anonymity and country indexes of interned tables,
+# True if last validation was successful
+INDEXED_FIELDS: Final = ["protocol", "anonymity", "country", "valid"]
+
+# Fields, for which only true values are indexed (most proxies are not valid, their set is never queried;
+# protocol bit 0 means that proxy lost or didn't have protocol)
+SPARSE_FIELDS: Final = ["protocol", "valid"]
+
+
+class ProxyIndex(object):
+    def __init__(self):
+        """
+        Secondary indexes of proxies collection: for each value of each indexed field store set of proxies keys.
+        Filter by several fields is intersection of their sets
+        """
+        self._sets: Dict[str, Dict[object, Set[int]]] = {field: {} for field in INDEXED_FIELDS}
+        self._lock = threading.Lock()
+
+    def add(self, key: int, values: Dict[str, Iterable]) -> None:
+        """
+        :param key: Key of proxy in collection
+        :param values: Values of indexed fields of proxy, like {"protocol": [1, 8], "valid": [True], ...}
+        """
+        with self._lock:
+            for field, field_values in values.items():
+                for value in field_values:
+                    self._sets[field].setdefault(value, set()).add(key)
+
+    def remove(self, key: int, values: Dict[str, Iterable]) -> None:
+        """
+        :param key: Key of proxy in collection
+        :param values: Values of indexed fields of proxy, same as was added
+        """
+        with self._lock:
+            for field, field_values in values.items():
+                for value in field_values:
+                    self._discard(field, value, key)
+
+    def update(self, key: int, field: str, old, new) -> None:
+        """
+        Move proxy between sets of field, when field of proxy is changed
+        :param key: Key of proxy in collection
+        :param field: One of INDEXED_FIELDS
+        :param old: Old value of field
+        :param new: New value of field
+        """
+        with self._lock:
+            self._discard(field, old, key)
+            if new or (field not in SPARSE_FIELDS):
+                self._sets[field].setdefault(new, set()).add(key)
+
+    def _discard(self, field: str, value, key: int) -> None:
+        keys = self._sets[field].get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._sets[field][value]
+
+    def clear(self) -> None:
+        with self._lock:
+            for field_sets in self._sets.values():
+                field_sets.clear()
+
+    def query(self, match: Callable[[int], bool] = None, limit: int = None,
+              **filters: Optional[Iterable]) -> Optional[List[int]]:
+        """
+        Sets are not copied: keys of the smallest filter are checked by lookups in sets of other filters
+        (set intersection iterates the smaller set), and iteration stops after limit of matched keys
+        :param match: If set - only keys, for which it returns True (called under lock, must not change index)
+        :param limit: Maximum count of keys to return
+        :param filters: Field and allowed values of field, like protocol=[1, 2]; None values are skipped
+        :return: Keys of proxies, which match all filters (None if no filters given)
+        """
+        with self._lock:
+            matched = [[self._sets[field][value] for value in values if value in self._sets[field]]
+                       for field, values in filters.items() if values is not None]
+            if not matched:
+                return None
+            matched.sort(key=lambda field_sets: sum(map(len, field_sets)))
+            smallest, others = matched[0], matched[1:]
+            # Filter with one allowed value is checked by one set, filter with several values - by any of its sets
+            single = [field_sets[0] for field_sets in others if len(field_sets) == 1]
+            multiple = [field_sets for field_sets in others if len(field_sets) != 1]
+            keys = []
+            if limit == 0:
+                return keys
+            for i, field_keys in enumerate(smallest):
+                candidates = field_keys
+                for keys_set in single:
+                    candidates = candidates & keys_set
+                if (len(smallest) == 1) and (not multiple) and (match is None) and (limit is None):
+                    return list(candidates)
+                for key in candidates:
+                    # Key in several sets of the smallest filter is taken from the first of them
+                    if i and any(key in keys_set for keys_set in smallest[:i]):
+                        continue
+                    if all(any(key in keys_set for keys_set in field_sets) for field_sets in multiple) and \
+                            ((match is None) or match(key)):
+                        keys.append(key)
+                        if len(keys) == limit:
+                            return keys
+            return keys
@@ -0,0 +1,156 @@
+import heapq
+import logging
+from itertools import count
+from time import time
+from typing import Dict, List, Iterable, Tuple
+from src.proxy import Proxy
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+
+class RevalidationScheduler(object):
+    def __init__(self, fresh_interval: float = 100, retry_interval: float = 300, max_interval: float = 86400):
+        """
+        Decide when each proxy should be checked again, from its history. Due proxies are kept in heap,
+        so each cycle touch only proxies, which are really due
+        :param fresh_interval: Interval of valid proxies (less than 120 secs of Proxy.valid, to keep them fresh)
+        :param retry_interval: Interval after first fail, doubled with each next fail in a row
+        :param max_interval: Maximum interval of dead proxies
+        """
+        self.fresh_interval = fresh_interval
+        self.retry_interval = retry_interval
+        self.max_interval = max_interval
+        self._heap: List[Tuple[float, int, int]] = []
+        self._proxies: Dict[int, Proxy] = {}
+        self._due_times: Dict[int, float] = {}
+        self._counter = count()
+
+    def __len__(self) -> int:
+        return len(self._proxies)
+
+    def __contains__(self, proxy: Proxy) -> bool:
+        return proxy.key in self._proxies
+
+    def interval(self, proxy: Proxy) -> float:
+        """
+        :param proxy: Checked proxy
+        :return: Seconds from last check of proxy to next check
+        """
+        flap_rate = proxy.flaps / proxy.total_checks if proxy.total_checks != 0 else 0
+        if proxy._valid:
+            # Proxies, which often fail judge or flap, are checked more often
+            judge_factor = 0.5 + 0.5 * proxy.judge_ratio if (proxy.judge_valid_count + proxy.judge_invalid_count) \
+                else 1
+            return self.fresh_interval * judge_factor * (1 - 0.5 * flap_rate)
+        backoff = self.retry_interval * 2 ** min(max(proxy.fail_streak - 1, 0), 32)
+        # Proxies with good history, or flapping proxies, have a chance to come back soon
+        return min(self.max_interval, backoff) * (1 - 0.5 * proxy.success_ratio) * (1 - 0.5 * flap_rate)
+
+    def due_time(self, proxy: Proxy) -> float:
+        """
+        :param proxy: Proxy to schedule
+        :return: Time of next check (0 if proxy never checked)
+        """
+        if proxy.total_checks == 0:
+            return 0
+        return proxy.validation_time + self.interval(proxy)
+
+    def add(self, proxy: Proxy) -> bool:
+        """
+        :param proxy: Proxy to schedule by its history, if it isn't scheduled yet
+        :return: True if proxy added
+        """
+        if proxy.key in self._proxies:
+            return False
+        self._proxies[proxy.key] = proxy
+        self._push(proxy)
+        return True
+
+    def add_proxies(self, proxies: Iterable[Proxy]) -> int:
+        """
+        :param proxies: Proxies to schedule, already scheduled are skipped
+        :return: Count of added proxies
+        """
+        return sum(self.add(proxy) for proxy in proxies)
+
+    def sync(self, proxies: Iterable[Proxy]) -> int:
+        """
+        Schedule exactly this proxies, like current proxies of collection, which may be new objects each cycle:
+        scheduled proxy is replaced by new object of same key, which continues its history (collection rebuilt
+        from sources has new proxies without history, see Proxy.take_newer), proxies, which are not in proxies
+        anymore, are unscheduled
+        :param proxies: All proxies to schedule
+        :return: Count of added proxies
+        """
+        added = 0
+        current = set()
+        for proxy in proxies:
+            key = proxy.key
+            current.add(key)
+            scheduled = self._proxies.get(key)
+            self._proxies[key] = proxy
+            if scheduled is None:
+                added += 1
+                self._push(proxy)
+            elif scheduled is not proxy:
+                proxy.take_newer(scheduled)
+                if (key in self._due_times) and (self._due_times[key] != self.due_time(proxy)):
+                    self._push(proxy)
+        for key in [key for key in self._proxies if key not in current]:
+            del self._proxies[key]
+            self._due_times.pop(key, None)
+        self._compact_heap()
+        return added
+
+    def _compact_heap(self) -> None:
+        # Entries of removed and rescheduled proxies are skipped lazily, heap is rebuilt when they are majority
+        if len(self._heap) > 2 * len(self._due_times) + 1000:
+            self._heap = [(due_time, next(self._counter), key) for key, due_time in self._due_times.items()]
+            heapq.heapify(self._heap)
+
+    def remove(self, proxy: Proxy) -> None:
+        """
+        :param proxy: Proxy to unschedule (its heap entry is skipped lazily)
+        """
+        self._proxies.pop(proxy.key, None)
+        self._due_times.pop(proxy.key, None)
+
+    def reschedule(self, proxies: Iterable[Proxy]) -> None:
+        """
+        :param proxies: Just checked proxies, to schedule their next check
+        """
+        for proxy in proxies:
+            if proxy.key in self._proxies:
+                self._push(proxy)
+
+    def _push(self, proxy: Proxy) -> None:
+        due_time = self.due_time(proxy)
+        self._due_times[proxy.key] = due_time
+        heapq.heappush(self._heap, (due_time, next(self._counter), proxy.key))
+
+    def due(self, now: float = None, limit: int = None) -> List[Proxy]:
+        """
+        Pop proxies, which should be checked now. They must be rescheduled via self.reschedule after check
+        :param now: Current time
+        :param limit: Maximum count of proxies to return
+        :return: List of due proxies, most overdue first
+        """
+        now = time() if now is None else now
+        due_proxies = []
+        while self._heap and (self._heap[0][0] <= now) and ((limit is None) or (len(due_proxies) < limit)):
+            due_time, _, key = heapq.heappop(self._heap)
+            if self._due_times.get(key) != due_time:
+                continue
+            del self._due_times[key]
+            due_proxies.append(self._proxies[key])
+        logger.info(f"Scheduler: {len(due_proxies)} proxies due of {len(self._proxies)}")
+        return due_proxies
+
+    def next_due_time(self) -> float:
+        """
+        :return: Time, when next proxy will be due (inf if nothing scheduled)
+        """
+        while self._heap and (self._due_times.get(self._heap[0][2]) != self._heap[0][0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else float("inf")
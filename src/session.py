@@ -0,0 +1,107 @@
+import threading
+from typing import List
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionPool(object):
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10):
+        """
+        Long-lived requests sessions, one per thread. Proxy must be passed to each request
+        (session.get(url, proxies=...)), so session and its connection pools reused for all proxies
+        :param pool_connections: Count of connection pools (hosts or proxies) to cache
+        :param pool_maxsize: Maximum of connections to save in each pool
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._local = threading.local()
+        self._sessions: List[requests.Session] = []
+        # Sessions released by finished threads, taken by next threads with their connections
+        self._idle: List[requests.Session] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "SessionPool":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        :return: Session of current thread
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            with self._lock:
+                session = self._idle.pop() if self._idle else None
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                                      max_retries=0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                with self._lock:
+                    self._sessions.append(session)
+            self._local.session = session
+        return session
+
+    def release_session(self) -> None:
+        """
+        Return session of current thread to pool, when thread is done (like worker of validation), so it is reused
+        by next threads with its keep-alive connections
+        """
+        session = getattr(self._local, "session", None)
+        if session is not None:
+            self._local.session = None
+            with self._lock:
+                self._idle.append(session)
+
+    def release_proxy(self, proxy_str: str) -> None:
+        """
+        Close connections through proxy, after it checked (adapter keeps pool for each proxy it used)
+        :param proxy_str: Proxy string, like "http://127.0.0.1:1234"
+        """
+        for adapter in self.session.adapters.values():
+            proxy_manager = adapter.proxy_manager.pop(proxy_str, None)
+            if proxy_manager is not None:
+                proxy_manager.clear()
+
+    def close(self) -> None:
+        """
+        Close sessions of all threads
+        """
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions = []
+            self._idle = []
+        self._local = threading.local()
+
+
+# Session pool shared by validations of process, see shared_session_pool()
+_shared_pool: SessionPool = None
+_shared_lock = threading.Lock()
+
+
+def shared_session_pool() -> SessionPool:
+    """
+    :return: Session pool of process, created on first call. It lives between validations (like daemon cycles),
+    so their sessions and connections are reused; close it via close_shared_session_pool() on shutdown
+    """
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = SessionPool()
+        return _shared_pool
+
+
+def close_shared_session_pool() -> None:
+    """
+    Close sessions of shared session pool, next shared_session_pool() call creates new pool
+    """
+    global _shared_pool
+    with _shared_lock:
+        pool, _shared_pool = _shared_pool, None
+    if pool is not None:
+        pool.close()
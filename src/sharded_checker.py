@@ -0,0 +1,143 @@
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import threading
+import traceback
+from typing import List
+from src.proxy import Proxy, ProxyCollection
+from src.session import close_shared_session_pool
+from src.snapshot import dump_proxies, load_proxies
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+
+class _QueueStore(object):
+    def __init__(self, results: multiprocessing.Queue, batch_size: int):
+        """
+        Store of worker process: checked proxies are packed in batches and sent to parent process
+        :param results: Queue to parent process
+        :param batch_size: Count of proxies in one batch
+        """
+        self.results = results
+        self.batch_size = batch_size
+        self._batch: List[Proxy] = []
+        self._lock = threading.Lock()
+
+    def add(self, proxy: Proxy) -> None:
+        with self._lock:
+            self._batch.append(proxy)
+            if len(self._batch) >= self.batch_size:
+                self._send()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._send()
+
+    def _send(self) -> None:
+        if self._batch:
+            self.results.put(dump_proxies(self._batch))
+            self._batch = []
+
+
+def _validate_shard(shard: bytes, results: multiprocessing.Queue, logs: multiprocessing.Queue, log_level: int,
+                    batch_size: int, validate_kwargs: dict) -> None:
+    """
+    Entry point of worker process
+    :param shard: Proxies to validate, packed via dump_proxies()
+    :param results: Queue to send checked proxies, None is sent when shard is done
+    :param logs: Queue to send log records to handlers of parent process
+    :param log_level: Level of logger of parent process
+    :param batch_size: Count of checked proxies in one batch
+    :param validate_kwargs: Arguments of ProxyCollection.validate_all
+    """
+    shard_logger = logging.getLogger(logger_name)
+    shard_logger.handlers = [logging.handlers.QueueHandler(logs)]
+    shard_logger.setLevel(log_level)
+    try:
+        store = _QueueStore(results, batch_size)
+        ProxyCollection([proxy for _, proxy in load_proxies(shard)]).validate_all(store=store, **validate_kwargs)
+        store.flush()
+    except Exception as e:
+        logger.error(f"ERROR IN SHARD PROCESS {os.getpid()} {traceback.format_exc()}")
+    finally:
+        close_shared_session_pool()
+        results.put(None)
+
+
+class ShardedChecker(object):
+    def __init__(self, processes: int = None, batch_size: int = 500, start_method: str = "spawn", **validate_kwargs):
+        """
+        Validate proxies in several processes, so parsing and classification of answers is not limited by one core.
+        Proxies are sharded between processes, each process validates its shard via ProxyCollection.validate_all
+        (with own threads or event loop) and sends checked proxies back in compact batches (snapshot format).
+        Processes are not forked, so they don't inherit threads, locks and sockets of parent; their logs are sent
+        to handlers of parent process
+        :param processes: Count of worker processes (count of CPU cores by default)
+        :param batch_size: Count of checked proxies in one batch sent to parent process
+        :param start_method: Start method of worker processes, "spawn" or "forkserver"
+        :param validate_kwargs: Arguments of ProxyCollection.validate_all for each process, like engine="async"
+        (self_ip should be passed, so each process doesn't request it again)
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.start_method = start_method
+        self.validate_kwargs = validate_kwargs
+
+    def validate(self, proxies: List[Proxy], store=None) -> int:
+        """
+        Validate proxies and apply results of worker processes to them
+        :param proxies: Proxies to validate
+        :param store: Store to save final state of each checked proxy (used only in this process)
+        :return: Count of checked proxies
+        """
+        processes = min(self.processes, len(proxies))
+        if processes == 0:
+            return 0
+        proxies_by_key = {proxy.key: proxy for proxy in proxies}
+        context = multiprocessing.get_context(self.start_method)
+        results = context.Queue()
+        logs = context.Queue()
+        parent_logger = logging.getLogger(logger_name)
+        log_listener = logging.handlers.QueueListener(logs, *parent_logger.handlers, respect_handler_level=True)
+        log_listener.start()
+        # Shards are interleaved, so proxies sorted by priority are validated first in each process
+        workers = [context.Process(target=_validate_shard,
+                                   args=(dump_proxies(proxies[shard::processes]), results, logs,
+                                         parent_logger.getEffectiveLevel(), self.batch_size, self.validate_kwargs))
+                   for shard in range(processes)]
+        logger.info(f"Start SHARDED work with {processes} processes, total count of proxies: {len(proxies)}")
+        checked = 0
+        running = processes
+        try:
+            for worker in workers:
+                worker.start()
+            while running:
+                try:
+                    batch = results.get(timeout=1)
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        logger.error(f"{running} shard processes exited without results")
+                        break
+                    continue
+                if batch is None:
+                    running -= 1
+                    continue
+                for key, checked_proxy in load_proxies(batch):
+                    proxy = proxies_by_key.get(key)
+                    if proxy is None:
+                        continue
+                    proxy.take_state(checked_proxy)
+                    if store is not None:
+                        store.add(proxy)
+                    checked += 1
+        finally:
+            for worker in workers:
+                if running and worker.is_alive():
+                    worker.terminate()
+                worker.join()
+            log_listener.stop()
+        logger.info(f"SHARDED work done, {checked} of {len(proxies)} proxies checked")
+        return checked
@@ -0,0 +1,198 @@
+import json
+import logging
+import mmap
+import os
+import struct
+from math import nan
+from typing import Final, Iterable, Iterator, List, Tuple
+from src.proxy import LATENCY_BUCKETS, Proxy, _anonymity_table, _country_table
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+SNAPSHOT_MAGIC: Final = b"PXSN"
+SNAPSHOT_VERSION: Final = 5
+
+# magic, version, record size, count of records, size of string table
+HEADER: Final = struct.Struct("<4sHHII")
+
+# address (ip << 16 | port), protocols mask, preferred protocol bit, state flags, anonymity and country (indexes of
+# string table), total_checks, success_checks, judge_invalid_count, judge_valid_count, flaps, fail_streak,
+# validation_time, latency, connect_latency and tcp_latency (NaN if unknown), latency sketch, protocol verdicts
+# (probed and working masks)
+RECORD: Final = struct.Struct(f"<QBBBHHIIIIIIdfff{len(LATENCY_BUCKETS) + 1}sB")
+
+# Latency sketch of proxy without measured latency
+_EMPTY_SKETCH: Final = bytes(len(LATENCY_BUCKETS) + 1)
+
+# Bits of state flags
+_VALID_SET: Final = 1
+_VALID: Final = 2
+_JUDGED_SET: Final = 4
+_JUDGED: Final = 8
+_REDIRECTS: Final = 16
+
+
+# (redirects, valid, judged) of each state flags value
+_STATES: Final = [(bool(flags & _REDIRECTS), bool(flags & _VALID) if flags & _VALID_SET else None,
+                   bool(flags & _JUDGED) if flags & _JUDGED_SET else None) for flags in range(32)]
+
+
+def _flags(proxy: Proxy) -> int:
+    return ((_VALID_SET if proxy._valid is not None else 0) | (_VALID if proxy._valid else 0)
+            | (_JUDGED_SET if proxy._judged is not None else 0) | (_JUDGED if proxy._judged else 0)
+            | (_REDIRECTS if proxy.redirects else 0))
+
+
+def is_snapshot(path: str) -> bool:
+    """
+    :param path: Path and file name
+    :return: True if file is binary snapshot (else - probably json)
+    """
+    with open(path, "rb") as f:
+        return f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+
+def _pack(proxies: Iterable[Proxy]) -> Tuple[bytes, bytearray, int]:
+    """
+    :param proxies: Proxies to pack
+    :return: Header with string table, records and count of records
+    """
+    strings: List[str] = []
+    string_indexes = {}
+
+    def string_index(value: str) -> int:
+        index = string_indexes.get(value)
+        if index is None:
+            index = string_indexes[value] = len(strings)
+            strings.append(value)
+        return index
+
+    records = bytearray()
+    count = 0
+    for proxy in proxies:
+        records += RECORD.pack(proxy._address, proxy._protocols, proxy._preferred, _flags(proxy),
+                               string_index(proxy.anonymity), string_index(proxy.country), proxy.total_checks,
+                               proxy.success_checks, proxy.judge_invalid_count, proxy.judge_valid_count, proxy.flaps,
+                               proxy.fail_streak, proxy.validation_time,
+                               nan if proxy.latency is None else proxy.latency,
+                               nan if proxy.connect_latency is None else proxy.connect_latency,
+                               nan if proxy.tcp_latency is None else proxy.tcp_latency,
+                               bytes(proxy._latency_sketch or b""), proxy._protocol_verdicts)
+        count += 1
+    string_table = json.dumps(strings).encode()
+    return HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, RECORD.size, count, len(string_table)) + string_table, \
+        records, count
+
+
+def dump_proxies(proxies: Iterable[Proxy]) -> bytes:
+    """
+    :param proxies: Proxies to pack
+    :return: Proxies with all their counters in snapshot format, to pass them to another process
+    """
+    head, records, _ = _pack(proxies)
+    return head + records
+
+
+def load_proxies(data: bytes) -> Iterator[Tuple[int, Proxy]]:
+    """
+    :param data: Proxies, packed via dump_proxies()
+    :return: Iterator of (Proxy.key, proxy)
+    """
+    return _unpack_items(data, "dumped proxies")
+
+
+def write_snapshot(path: str, proxies: Iterable[Proxy]) -> int:
+    """
+    Save proxies with all their counters to binary snapshot (via temporary file, so snapshot is not broken
+    if process killed while saving)
+    :param path: Path and file name of snapshot
+    :param proxies: Proxies to save
+    :return: Count of saved proxies
+    """
+    head, records, count = _pack(proxies)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(head)
+        f.write(records)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved {count} proxies to snapshot {path}")
+    return count
+
+
+def read_snapshot(path: str) -> Iterator[Proxy]:
+    """
+    Load proxies from binary snapshot, file is memory-mapped and records are unpacked lazily
+    :param path: Path and file name of snapshot, generated via write_snapshot()
+    :return: Iterator of proxies
+    """
+    for _, proxy in read_snapshot_items(path):
+        yield proxy
+
+
+def read_snapshot_items(path: str) -> Iterator[Tuple[int, Proxy]]:
+    """
+    Same as read_snapshot(), but with collection key of each proxy (computed without Proxy.key call)
+    :param path: Path and file name of snapshot, generated via write_snapshot()
+    :return: Iterator of (Proxy.key, proxy)
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield from _unpack_items(mapped, path)
+
+
+def _unpack_items(data, name: str) -> Iterator[Tuple[int, Proxy]]:
+    """
+    :param data: Buffer with proxies in snapshot format
+    :param name: Name of data source for errors
+    :return: Iterator of (Proxy.key, proxy)
+    """
+    if len(data) < HEADER.size:
+        raise ValueError(f"{name} is not a proxy snapshot (too short)")
+    magic, version, record_size, count, strings_size = HEADER.unpack_from(data, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{name} is not a proxy snapshot")
+    if (version != SNAPSHOT_VERSION) or (record_size != RECORD.size):
+        raise ValueError(f"Unsupported snapshot version {version} (record size {record_size}) of {name}")
+    offset = HEADER.size + strings_size
+    if len(data) < offset + count * record_size:
+        raise ValueError(f"Snapshot {name} is truncated")
+    strings = json.loads(bytes(data[HEADER.size:offset]).decode())
+    # Indexes of snapshot strings in tables of current process
+    anonymity_indexes = [_anonymity_table.index(value) for value in strings]
+    country_indexes = [_country_table.index(value) for value in strings]
+
+    records = memoryview(data)[offset:offset + count * record_size]
+    unpacked = None
+    try:
+        new = Proxy.__new__
+        states = _STATES
+        empty_sketch = _EMPTY_SKETCH
+        unpacked = RECORD.iter_unpack(records)
+        for (address, protocols, preferred, flags, anonymity, country, total_checks, success_checks,
+             judge_invalid_count, judge_valid_count, flaps, fail_streak, validation_time, latency, connect_latency,
+             tcp_latency, sketch, protocol_verdicts) in unpacked:
+            proxy = new(Proxy)
+            proxy._address = address
+            proxy._protocols = protocols
+            proxy._preferred = preferred
+            proxy._protocol_verdicts = protocol_verdicts
+            proxy._anonymity = anonymity_indexes[anonymity]
+            proxy._country = country_indexes[country]
+            proxy.total_checks = total_checks
+            proxy.success_checks = success_checks
+            proxy.judge_invalid_count = judge_invalid_count
+            proxy.judge_valid_count = judge_valid_count
+            proxy.flaps = flaps
+            proxy.fail_streak = fail_streak
+            proxy.validation_time = validation_time
+            proxy.redirects, proxy._valid, proxy._judged = states[flags]
+            proxy.latency = latency if latency == latency else None
+            proxy.connect_latency = connect_latency if connect_latency == connect_latency else None
+            proxy.tcp_latency = tcp_latency if tcp_latency == tcp_latency else None
+            proxy._latency_sketch = bytearray(sketch) if sketch != empty_sketch else None
+            proxy._collection = None
+            yield address, proxy
+    finally:
+        # Iterator over records must be freed before records released
+        unpacked = None
+        records.release()
@@ -0,0 +1,34 @@
+import logging
+import traceback
+from typing import List
+from src.proxy import Proxy
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+
+class MultiStore(object):
+    def __init__(self, stores: List):
+        """
+        Store of validation results, which saves each result to several stores, like src.journal.ProxyJournal and
+        src.mongo_sync.MongoSync. Error of one store doesn't stop others
+        :param stores: Stores with add(proxy) and flush() methods
+        """
+        self.stores = stores
+
+    def add(self, proxy: Proxy) -> None:
+        """
+        :param proxy: Checked proxy
+        """
+        for store in self.stores:
+            try:
+                store.add(proxy)
+            except Exception as e:
+                logger.error(f"ERROR WHEN SAVE PROXY TO {type(store).__name__} {traceback.format_exc()}")
+
+    def flush(self) -> None:
+        for store in self.stores:
+            try:
+                store.flush()
+            except Exception as e:
+                logger.error(f"ERROR WHEN FLUSH {type(store).__name__} {traceback.format_exc()}")
@@ -0,0 +1,178 @@
+import logging
+import threading
+from time import monotonic
+from typing import Dict, Final, List, Optional
+from src.logger import logger_name
+
+logger = logging.getLogger(logger_name)
+
+# Minimum count of checks, after which concurrency is adjusted
+MIN_WINDOW: Final = 20
+
+# Weight of latency of healthy window in baseline latency
+BASELINE_ALPHA: Final = 0.2
+
+
+def is_throttled(status: int) -> bool:
+    """
+    :param status: HTTP status of answer of check or judge url
+    :return: True if server throttles us or is overloaded (429 or 5xx)
+    """
+    return (status == 429) or (status >= 500)
+
+
+def _seconds(value: Optional[float]) -> str:
+    return "unknown" if value is None else f"{value:.3f}s"
+
+
+class AdaptiveConcurrency(object):
+    def __init__(self, maximum: int, minimum: int = 1, initial: int = None, increase: int = None,
+                 decrease: float = 0.5, tolerance: float = 0.05, latency_factor: float = 1.5):
+        """
+        AIMD controller of parallel checks, driven by load signals of our side: answers of check and judge urls
+        with 429 or 5xx status (server throttles us) and inflation of their latency (our network, NAT table or
+        servers are saturated). Validity of proxies is not a signal: most free proxies are dead at any load, and
+        their timeouts and connection errors are not counted either. Limit is raised additively after healthy window
+        and cut multiplicatively after congested one. Window is one round of checks (limit, but at least MIN_WINDOW)
+        :param maximum: Maximum of parallel checks
+        :param minimum: Minimum of parallel checks
+        :param initial: Limit on start (tenth of maximum by default)
+        :param increase: Limit increase after healthy window (twentieth of maximum by default)
+        :param decrease: Limit is multiplied by it after congested window
+        :param tolerance: Share of throttled answers in window, above which window is congested
+        :param latency_factor: Window is congested, if its median latency is above baseline latency multiplied by it
+        """
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.limit = min(maximum, max(self.minimum, initial or maximum // 10))
+        self.increase = increase or max(1, maximum // 20)
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.latency_factor = latency_factor
+        self.baseline: Optional[float] = None
+        self._checks = 0
+        self._throttled = 0
+        self._latencies: List[float] = []
+        self._active = 0
+        self._condition = threading.Condition()
+
+    def record(self, latency: float = None, throttled: bool = False) -> bool:
+        """
+        Count result of finished check, adjust limit at the end of window
+        :param latency: Seconds to answer of check or judge url (first request of check), None if no answer
+        :param throttled: True if any answer of check or judge url was throttled (see is_throttled)
+        :return: True if limit changed
+        """
+        with self._condition:
+            self._checks += 1
+            self._throttled += throttled
+            if (latency is not None) and (not throttled):
+                self._latencies.append(latency)
+            if self._checks < max(self.limit, MIN_WINDOW):
+                return False
+            throttled_rate = self._throttled / self._checks
+            median = sorted(self._latencies)[len(self._latencies) // 2] if self._latencies else None
+            checks = self._checks
+            self._checks = self._throttled = 0
+            self._latencies = []
+            limit = self.limit
+            inflated = (median is not None) and (self.baseline is not None) and \
+                (median > self.baseline * self.latency_factor)
+            if (throttled_rate > self.tolerance) or inflated:
+                if limit == self.minimum:
+                    # Latency is not caused by our load, it is new normal
+                    if inflated:
+                        self.baseline = median
+                    decision = "keep minimum"
+                else:
+                    self.limit = max(self.minimum, int(limit * self.decrease))
+                    decision = "cut"
+            else:
+                if median is not None:
+                    # Baseline follows faster latency at once, and slower one slowly (so load can't raise it quickly)
+                    self.baseline = median if (self.baseline is None) or (median < self.baseline) \
+                        else BASELINE_ALPHA * median + (1 - BASELINE_ALPHA) * self.baseline
+                self.limit = min(self.maximum, limit + self.increase)
+                decision = "raise"
+            logger.info(f"Adaptive concurrency {limit} -> {self.limit} ({decision}): throttled {throttled_rate:.2f} "
+                        f"of {checks} checks, median latency {_seconds(median)}, baseline {_seconds(self.baseline)}")
+            if self.limit > limit:
+                self._condition.notify(self.limit - limit)
+            return self.limit != limit
+
+    def acquire(self) -> None:
+        """
+        Wait, until count of running checks is less than limit (for threads)
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    def release(self, latency: float = None, throttled: bool = False) -> None:
+        """
+        Finish check, started after self.acquire()
+        :param latency: Seconds to answer of check or judge url, None if no answer
+        :param throttled: True if any answer of check or judge url was throttled
+        """
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+        self.record(latency, throttled)
+
+
+class TokenBucket(object):
+    def __init__(self, rate: float, burst: float = None):
+        """
+        :param rate: Tokens per second
+        :param burst: Maximum of saved tokens (one second of tokens by default)
+        """
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._time = monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take one token, tokens taken in advance are paid by waiting
+        :return: Seconds to wait before using the token
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._time) * self.rate) - 1
+            self._time = now
+            return 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class RateLimits(object):
+    def __init__(self, rate: float, burst: float = None):
+        """
+        Separate token bucket for each url, like check url and judge url
+        :param rate: Maximum requests per second to each url
+        :param burst: Maximum of requests at once to each url (one second of requests by default)
+        """
+        self.rate = rate
+        self.burst = burst
+        self.waited = 0.0
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, url: str) -> float:
+        """
+        :param url: Url to request
+        :return: Seconds to wait before request
+        """
+        bucket = self._buckets.get(url)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(url, TokenBucket(self.rate, self.burst))
+        delay = bucket.reserve()
+        if delay:
+            with self._lock:
+                self.waited += delay
+        return delay
+
+    def log_summary(self) -> None:
+        if self._buckets:
+            logger.info(f"Rate limit {self.rate}/s per url for {len(self._buckets)} urls, "
+                        f"requests waited {self.waited:.1f}s in total")
@@ -104,6 +104,15 @@ class DriverWrapper(object):
             raise IndexError(f"Current list of proxies contains {len(self.proxies)} elements, but called {proxy_index}")
         return True
 
+    def set_proxy(self, proxy: dict) -> bool:
+        """
+        Change proxy of running driver to any proxy, not only from self.proxies
+        :param proxy: Dict with "http" and "https" keys, like Proxy.proxy_dict
+        :return: True, if proxy successfully changed
+        """
+        self.driver.proxy = proxy
+        return True
+
     def new_proxy_list(self, proxy: PROXY_LIST) -> Self:
         """
         Recreate driver with new proxy list
@@ -0,0 +1,11 @@
+from ipaddress import IPv4Address
+from src.async_checker import AsyncChecker
+from src.proxy import Proxy
+
+
+def test_async_checker_dead_proxy():
+    proxy = Proxy(IPv4Address("127.0.0.1"), 1, "UNKNOWN", ["socks5"], "UNKNOWN")
+    AsyncChecker("127.0.0.2", concurrency=10, timeout=2).validate([proxy])
+    assert proxy.valid is False
+    assert proxy.total_checks == 1
+    assert proxy.success_checks == 0
@@ -0,0 +1,44 @@
+from ipaddress import IPv4Address
+from time import sleep
+from proxy_wrappers.collector import collect
+from src.proxy import Proxy, ProxyCollection
+
+
+def slow_source():
+    sleep(2)
+    return [Proxy(IPv4Address("2.2.2.2"), 80, "RU", ["http"], "UNKNOWN")]
+
+
+def broken_source():
+    raise ValueError("broken")
+
+
+def test_collect():
+    proxy_collection = ProxyCollection()
+    stats = collect({"fast": lambda: [Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN")],
+                     "slow": slow_source, "broken": broken_source}, proxy_collection, {"slow": 0.5})
+    assert {name: stat["status"] for name, stat in stats.items()} == {"fast": "ok", "slow": "timeout",
+                                                                      "broken": "error"}
+    assert stats["slow"]["time"] < 2
+    assert len(proxy_collection) == 1
+
+
+def test_collect_commit():
+    proxy_collection = ProxyCollection()
+    commits = []
+
+    def committed_source():
+        return [Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN")], lambda: commits.append("fast")
+
+    def hanging_source():
+        sleep(1.5)
+        return [Proxy(IPv4Address("2.2.2.2"), 80, "RU", ["http"], "UNKNOWN")], lambda: commits.append("hanging")
+
+    sources = {"fast": committed_source, "hanging": hanging_source}
+    stats = collect(sources, proxy_collection, {"hanging": 0.3})
+    assert stats["hanging"]["status"] == "timeout" and commits == ["fast"]
+    # Abandoned run is not started again, until it finished, and its result is never committed
+    assert collect(sources, proxy_collection, {"hanging": 0.3})["hanging"]["status"] == "busy"
+    sleep(1.5)
+    assert collect(sources, proxy_collection, 5)["hanging"]["status"] == "ok"
+    assert commits == ["fast", "fast", "fast", "hanging"] and len(proxy_collection) == 2
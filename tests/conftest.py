@@ -0,0 +1,35 @@
+import pytest
+from pymongo import DeleteOne
+from pymongo.results import BulkWriteResult
+
+
+class MockCollection(object):
+    def __init__(self, collection):
+        # bulk_write of mongomock doesn't support operations of current pymongo
+        self.collection = collection
+        self.batches = []
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def bulk_write(self, operations, ordered=True):
+        self.batches.append(operations)
+        matched = deleted = upserted = 0
+        for operation in operations:
+            if isinstance(operation, DeleteOne):
+                deleted += self.collection.delete_one(operation._filter).deleted_count
+            else:
+                result = self.collection.update_one(operation._filter, operation._doc, upsert=bool(operation._upsert))
+                matched += result.matched_count
+                upserted += result.upserted_id is not None
+        return BulkWriteResult({"nMatched": matched, "nModified": matched, "nRemoved": deleted,
+                                "nUpserted": upserted}, acknowledged=True)
+
+
+@pytest.fixture
+def mongo_collection() -> MockCollection:
+    """
+    :return: Empty mongomock collection of proxies, which records batches of bulk_write
+    """
+    mongomock = pytest.importorskip("mongomock")
+    return MockCollection(mongomock.MongoClient().db.proxy)
@@ -0,0 +1,85 @@
+import os
+from ipaddress import IPv4Address
+from src.journal import ProxyJournal
+from src.proxy import Proxy, ProxyCollection
+
+
+class ListStore(object):
+    def __init__(self):
+        self.proxies = []
+
+    def add(self, proxy: Proxy) -> None:
+        self.proxies.append(proxy)
+
+    def flush(self) -> None:
+        pass
+
+
+def test_journal_replay_and_compact(tmp_path):
+    path = str(tmp_path / "proxies")
+    good = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "elite")
+    dead = Proxy(IPv4Address("2.2.2.2"), 80, "RU", ["http"], "elite")
+    with ProxyJournal(path, compact_every=3) as journal:
+        good.valid = True
+        journal.add(good)
+        dead.valid = False
+        journal.add(dead)
+        assert len(journal) == 2
+        good.valid = True
+        journal.add(good)
+        journal.wait_compaction()
+        assert len(journal) == 0
+        good.valid = True
+        journal.add(good)
+
+    # Unfinished record of killed process
+    with open(f"{path}.jsonl", "a") as f:
+        f.write('{"ip": "3.3.3.3", "po')
+
+    journal = ProxyJournal(path)
+    assert len(journal) == 1
+    collection = ProxyCollection()
+    journal.load(collection)
+    assert [(proxy.ip, proxy.total_checks, proxy.success_checks) for proxy in collection.proxies] == \
+           [(IPv4Address("1.1.1.1"), 3, 3)]
+    # Loaded twice (or over snapshot with same history), checks are not counted twice
+    journal.load(collection)
+    assert collection.proxies[0].total_checks == 3
+
+    # Next loads use state in memory, updated by added records
+    os.remove(f"{path}.snapshot")
+    new = Proxy(IPv4Address("4.4.4.4"), 80, "RU", ["http"], "elite")
+    new.valid = True
+    journal.add(new)
+    rebuilt = ProxyCollection()
+    journal.load(rebuilt)
+    assert sorted(proxy.ip for proxy in rebuilt.proxies) == [IPv4Address("1.1.1.1"), IPv4Address("4.4.4.4")]
+    journal.close()
+
+
+def test_journal_validate_store(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.proxy.get_self_ip", lambda **kwargs: "127.0.0.2")
+    collection = ProxyCollection([Proxy(IPv4Address("127.0.0.1"), 1, "UNKNOWN", ["http"], "UNKNOWN")])
+    with ProxyJournal(str(tmp_path / "proxies")) as journal:
+        collection.validate_all(store=journal)
+        assert len(journal) == 1
+
+        # With sync_mongo results are saved to both stores
+        mongo = ListStore()
+        monkeypatch.setattr("src.mongo_sync.MongoSync", lambda: mongo)
+        collection.validate_all(force=True, store=journal, sync_mongo=True)
+        assert (len(journal), mongo.proxies) == (2, collection.proxies)
+
+
+def test_journal_interrupted_compaction(tmp_path):
+    path = str(tmp_path / "proxies")
+    proxy = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "elite")
+    with ProxyJournal(path) as journal:
+        proxy.valid = True
+        journal.add(proxy)
+    # Process was killed after journal renamed, but before snapshot written
+    os.replace(f"{path}.jsonl", f"{path}.jsonl.compacting")
+    journal = ProxyJournal(path)
+    assert list(journal.replay()) == [proxy.key]
+    journal.compact()
+    assert not os.path.exists(f"{path}.jsonl.compacting") and list(journal.replay()) == [proxy.key]
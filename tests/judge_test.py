@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from ipaddress import IPv4Address
+import pytest
+import requests
+from src.journal import ProxyJournal
+from src.judge import JudgeServer, JUDGE_MARKER
+from src.proxy import CHECK_URL, Proxy, ProxyCollection
+from src.throttle import AdaptiveConcurrency
+
+
+def run_judge() -> JudgeServer:
+    judge = JudgeServer("127.0.0.1", 0)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(judge.start())
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    started.wait(5)
+    return judge
+
+
+def test_judge_answer():
+    judge = run_judge()
+    with requests.Session() as session:
+        for _ in range(2):
+            answer = session.get(f"http://127.0.0.1:{judge.port}/", headers={"Via": "1.1 proxy"}, timeout=5).json()
+            assert answer["origin"] == "127.0.0.1"
+            assert answer["headers"]["VIA"] == "1.1 proxy" and answer["judge"] == JUDGE_MARKER
+
+    proxy = Proxy(IPv4Address("127.0.0.1"), 80, "UNKNOWN", ["http"], "UNKNOWN")
+    proxy.apply_judge('{"origin": "1.1.1.1", "headers": {"HOST": "judge"}, "judge": "' + JUDGE_MARKER + '"}',
+                      "2.2.2.2")
+    assert proxy.anonymity == "elite"
+
+
+def test_judge_validate_offline(monkeypatch):
+    # Judge answers to proxy requests itself, so it is "proxy" and judge at once
+    judge = run_judge()
+    self_ip_urls = []
+    monkeypatch.setattr("src.proxy.get_self_ip", lambda url: self_ip_urls.append(url) or "127.0.0.2")
+    url = f"http://127.0.0.1:{judge.port}/"
+    collection = ProxyCollection([Proxy(IPv4Address("127.0.0.1"), judge.port, "UNKNOWN", ["http"], "UNKNOWN")])
+    collection.validate_all(check_url=url, judge_url=url)
+    # Local judge server sees local ip, so ip of current machine is requested from public url
+    assert self_ip_urls == [CHECK_URL]
+    proxy = collection.proxies[0]
+    assert proxy.valid and proxy.judged and (proxy.anonymity == "elite")
+    assert proxy.latency is not None
+
+
+def test_judge_validate_one_shot(monkeypatch):
+    judge = run_judge()
+    monkeypatch.setattr("src.proxy.get_self_ip", lambda **kwargs: "127.0.0.2")
+    url = f"http://127.0.0.1:{judge.port}/"
+    collection = ProxyCollection([Proxy(IPv4Address("127.0.0.1"), judge.port, "UNKNOWN", ["http"], "UNKNOWN")])
+    collection.validate_all(check_url=url, judge_url=url, one_shot=True)
+    proxy = collection.proxies[0]
+    assert proxy.valid and proxy.judged and (proxy.anonymity == "elite") and not proxy.redirects
+    assert (proxy.total_checks, judge.requests_count) == (1, 1)
+
+
+def test_proxy_apply_check():
+    proxy = Proxy(IPv4Address("1.1.1.1"), 80, "UNKNOWN", ["http"], "UNKNOWN")
+    proxy.apply_check('{"origin": "3.3.3.3", "headers": {"VIA": "1.1 x"}, "judge": "' + JUDGE_MARKER + '"}',
+                      "2.2.2.2", total_time=0.5)
+    assert (proxy.valid, proxy.judged, proxy.redirects, proxy.anonymity) == (True, True, True, "anonymous")
+    assert proxy.latency == 0.5
+    proxy.apply_check("PHP Proxy Judge\nREMOTE_ADDR = 1.1.1.1\nHTTP_X_FORWARDED_FOR = 2.2.2.2", "2.2.2.2")
+    assert (proxy.valid, proxy.redirects, proxy.anonymity) == (True, False, "transparent")
+    proxy.apply_check('{"origin": "2.2.2.2"}', "2.2.2.2")
+    assert not proxy.valid
+    assert (proxy.total_checks, proxy.judge_valid_count) == (3, 2)
+
+
+def test_judge_validate_sharded(monkeypatch, tmp_path):
+    judge = run_judge()
+    monkeypatch.setattr("src.proxy.get_self_ip", lambda **kwargs: "127.0.0.2")
+    url = f"http://127.0.0.1:{judge.port}/"
+    alive = Proxy(IPv4Address("127.0.0.1"), judge.port, "UNKNOWN", ["http"], "UNKNOWN")
+    dead = Proxy(IPv4Address("127.0.0.1"), 1, "UNKNOWN", ["http"], "UNKNOWN")
+    collection = ProxyCollection([alive, dead])
+    assert collection.get_proxies(valid_only=True) == []
+    with ProxyJournal(str(tmp_path / "proxies")) as journal:
+        collection.validate_all(check_url=url, judge_url=url, engine="async", processes=2, store=journal)
+        assert list(journal.replay()) == [alive.key]
+    assert (alive.valid, alive.judged, alive.anonymity, alive.latency is not None) == (True, True, "elite", True)
+    assert (dead.valid, dead.total_checks, dead.fail_streak) == (False, 1, 1)
+    assert collection.get_proxies(valid_only=True) == [alive]
+
+
+def test_judge_validate_throttled(monkeypatch):
+    judge = run_judge()
+    monkeypatch.setattr("src.proxy.get_self_ip", lambda **kwargs: "127.0.0.2")
+    url = f"http://127.0.0.1:{judge.port}/"
+    for engine in ["async", "thread"]:
+        proxy = Proxy(IPv4Address("127.0.0.1"), judge.port, "UNKNOWN", ["http"], "UNKNOWN")
+        ProxyCollection([proxy]).validate_all(check_url=url, judge_url=url, engine=engine, multiprocess=True,
+                                              adaptive=True, rate_limit=100)
+        assert proxy.valid and proxy.judged
+
+
+def test_validate_adaptive_single_process(monkeypatch):
+    judge = run_judge()
+    monkeypatch.setattr("src.proxy.get_self_ip", lambda **kwargs: "127.0.0.2")
+    records = []
+    monkeypatch.setattr(AdaptiveConcurrency, "record",
+                        lambda controller, latency=None, throttled=False: records.append(latency) or False)
+    url = f"http://127.0.0.1:{judge.port}/"
+    collection = ProxyCollection([Proxy(IPv4Address("127.0.0.1"), judge.port, "UNKNOWN", ["http"], "UNKNOWN")])
+    collection.validate_all(check_url=url, judge_url=url, engine="async", adaptive=True)
+    assert len(records) == 1 and records[0] is not None
+    # Sequential checks can't be adjusted
+    with pytest.raises(ValueError):
+        collection.validate_all(check_url=url, judge_url=url, adaptive=True)
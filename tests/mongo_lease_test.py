@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+from ipaddress import IPv4Address
+from src.mongo_lease import MongoLeases
+from src.mongo_sync import MongoSync
+from src.proxy import Proxy
+
+
+def insert_proxies(collection, count: int):
+    collection.insert_many([Proxy(IPv4Address(i + 1), 80, "RU", ["http"], "elite", total_checks=1, success_checks=1,
+                                  validation_time=1000 + i).to_mongo_dict() for i in range(count)])
+    return collection
+
+
+def test_mongo_leases_claim(mongo_collection):
+    collection = insert_proxies(mongo_collection, 3)
+    first, second = MongoLeases(owner="first", batch_size=1, collection=collection), \
+        MongoLeases(owner="second", collection=collection)
+    assert [proxy.ip for proxy in first.claim(2)] == [IPv4Address(1), IPv4Address(2)]
+    assert [proxy.ip for proxy in second.claim(2)] == [IPv4Address(3)]
+    assert second.claim(1) == [] and (len(first), len(second)) == (2, 1)
+    assert first.renew() == 2
+
+    valid, dead = [Proxy.from_mongo_dict(collection.find_one({"ip": ip})) for ip in ["0.0.0.1", "0.0.0.2"]]
+    valid.valid = True
+    for _ in range(3):
+        dead.valid = False
+    with first:
+        first.add(valid)
+        first.add(dead)
+    document = collection.find_one({"ip": "0.0.0.1"})
+    assert (document["total_checks"], "lease_owner" in document, "lease_until" in document) == (2, False, False)
+    assert collection.find_one({"ip": "0.0.0.2"}) is None and len(first) == 0
+
+    second.release()
+    assert collection.count_documents({"lease_owner": {"$exists": True}}) == 0
+
+
+def test_mongo_leases_broken_document(mongo_collection):
+    collection = insert_proxies(mongo_collection, 2)
+    collection.insert_one({"ip": "broken", "port": 80, "protocols": ["http"], "validation_date": datetime(2000, 1, 1)})
+    leases = MongoLeases(owner="first", batch_size=1, collection=collection)
+    assert [proxy.ip for proxy in leases.claim(5)] == [IPv4Address(1), IPv4Address(2)]
+    assert "lease_owner" not in collection.find_one({"ip": "broken"}) and len(leases) == 2
+
+
+def test_mongo_leases_expire(mongo_collection):
+    collection = insert_proxies(mongo_collection, 1)
+    crashed, alive = MongoLeases(ttl=-1, owner="crashed", collection=collection), MongoLeases(collection=collection)
+    proxy, = crashed.claim(1)
+    assert [leased.ip for leased in alive.claim(5)] == [proxy.ip]
+    # Result of expired lease is not written over lease of another daemon
+    assert crashed.renew() == 0
+    proxy.valid = False
+    crashed.add(proxy)
+    crashed.flush()
+    document = collection.find_one()
+    assert (document["lease_owner"], document["total_checks"]) == (alive.owner, 1)
+    assert document["lease_until"] > datetime.now(timezone.utc).replace(tzinfo=None)
+
+    # MongoSync doesn't write over leased proxy
+    with MongoSync(collection=collection) as mongo_sync:
+        mongo_sync.add(proxy)
+    assert (collection.count_documents({}), collection.find_one()["total_checks"]) == (1, 1)
@@ -0,0 +1,73 @@
+from datetime import datetime
+from ipaddress import IPv4Address
+import pytest
+from pymongo import UpdateOne, DeleteOne
+from src.mongo_sync import MongoSync, dedupe_proxies, iter_mongo_proxies
+from src.proxy import Proxy
+
+
+def test_mongo_sync(mongo_collection):
+    valid_proxy = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "elite", total_checks=1, success_checks=1)
+    invalid_proxy = Proxy(IPv4Address("2.2.2.2"), 80, "RU", ["http"], "elite", total_checks=1)
+    with MongoSync(batch_size=10, collection=mongo_collection) as mongo_sync:
+        mongo_sync.add(valid_proxy)
+        mongo_sync.add(valid_proxy)
+        mongo_sync.add(invalid_proxy)
+        assert mongo_collection.batches == []
+    assert len(mongo_collection.batches) == 1
+    assert [type(operation) for operation in mongo_collection.batches[0]] == [UpdateOne, DeleteOne]
+    assert [document["ip"] for document in mongo_collection.find()] == ["1.1.1.1"]
+
+
+def test_mongo_sync_batch_size(mongo_collection):
+    mongo_sync = MongoSync(batch_size=2, collection=mongo_collection)
+    for i in range(3):
+        mongo_sync.add(Proxy(IPv4Address(i + 1), 80, "RU", ["http"], "elite", total_checks=1, success_checks=1))
+    assert [len(batch) for batch in mongo_collection.batches] == [2]
+    mongo_sync.flush()
+    assert [len(batch) for batch in mongo_collection.batches] == [2, 1]
+    assert mongo_collection.count_documents({}) == 3
+
+
+class FindCollection(object):
+    def __init__(self, documents):
+        self.documents = documents
+        self.query = None
+
+    def find(self, query, projection, batch_size=0):
+        self.query = query
+        return FindCursor(self.documents)
+
+
+class FindCursor(list):
+    def close(self):
+        pass
+
+
+def test_iter_mongo_proxies():
+    collection = FindCollection([
+        {"ip": "1.1.1.1", "port": 80, "protocols": ["http"], "valid": True,
+         "validation_date": datetime.fromtimestamp(1000)},
+        {"ip": "broken", "port": 80, "protocols": ["http"]}
+    ])
+    proxies = list(iter_mongo_proxies(stale_after=60, valid_only=True, protocols=["http"], collection=collection))
+    assert len(proxies) == 1
+    assert (proxies[0].validation_time, proxies[0].country, proxies[0].total_checks) == (1000, "UNKNOWN", 0)
+    assert set(collection.query.keys()) == {"validation_date", "valid", "protocols"}
+
+
+def test_dedupe_proxies():
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db.proxy
+    collection.insert_many([
+        Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "elite", total_checks=2, validation_time=1).to_mongo_dict(),
+        Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["socks5"], "elite", total_checks=3,
+              validation_time=2).to_mongo_dict(),
+        Proxy(IPv4Address("2.2.2.2"), 80, "RU", ["http"], "elite", total_checks=1).to_mongo_dict()])
+    assert dedupe_proxies(collection) == 1
+    document = collection.find_one({"ip": "1.1.1.1"})
+    assert (collection.count_documents({}), document["total_checks"], sorted(document["protocols"])) == \
+           (2, 5, ["http", "socks5"])
+    collection.create_index([("ip", 1), ("port", 1)], unique=True)
+    collection.insert_one(Proxy(IPv4Address("3.3.3.3"), 80, "RU", ["http"], "elite").to_mongo_dict())
+    assert dedupe_proxies(collection) == 0
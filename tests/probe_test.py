@@ -0,0 +1,58 @@
+import asyncio
+from ipaddress import IPv4Address
+from src.probe import TcpProbe
+from src.proxy import Proxy
+
+
+async def probe_local(answer: bytes, handshake: bool):
+    async def handle(reader, writer):
+        await reader.read(16)
+        writer.write(answer)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    alive = Proxy(IPv4Address("127.0.0.1"), port, "UNKNOWN", ["socks5"], "UNKNOWN")
+    dead = Proxy(IPv4Address("127.0.0.1"), 1, "UNKNOWN", ["socks5"], "UNKNOWN")
+    async with server:
+        result = await TcpProbe(timeout=1, handshake=handshake).run([alive, dead])
+    return result, alive, dead
+
+
+def test_tcp_probe():
+    result, alive, dead = asyncio.run(probe_local(b"\x05\x00", True))
+    assert result == [alive]
+    assert (dead.valid, dead.total_checks) == (False, 1)
+    assert alive.total_checks == 0
+    assert alive.tcp_latency is not None and dead.tcp_latency is None and alive.connect_latency is None
+
+
+def test_tcp_probe_detect_protocols(monkeypatch):
+    tcp_times = []
+    monkeypatch.setattr(Proxy, "record_tcp_time", lambda proxy, tcp_time: tcp_times.append(tcp_time))
+
+    async def detect():
+        async def handle(reader, writer):
+            await reader.read(16)
+            writer.write(b"\x05\x00")
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        proxy = Proxy(IPv4Address("127.0.0.1"), server.sockets[0].getsockname()[1], "UNKNOWN", ["http"], "UNKNOWN")
+        async with server:
+            return await TcpProbe(timeout=1, detect=True).run([proxy]), proxy
+
+    result, proxy = asyncio.run(detect())
+    assert result == [proxy]
+    assert proxy.protocol_verdicts == {"socks4": False, "socks5": True, "http": False, "https": False}
+    # Protocol listed by source stays preferred, but proxy is connected via protocol which answered
+    assert (proxy.protocols, proxy.protocol) == (["http", "socks5"], "socks5")
+    # Four connections of one probe are one sample
+    assert len(tcp_times) == 1
+
+
+def test_tcp_probe_wrong_handshake():
+    result, alive, dead = asyncio.run(probe_local(b"HTTP/1.1 400 Bad Request\r\n\r\n", True))
+    assert result == []
@@ -11,3 +11,204 @@ def test_proxy():
 @pytest.mark.dependency(scope='session')
 def test_proxy_collection():
     assert type(ProxyCollection()) is ProxyCollection
+
+
+def test_proxy_apply_validation():
+    proxy = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN")
+    proxy.apply_validation("1.1.1.1:80", "2.2.2.2")
+    assert proxy.valid and not proxy.redirects
+    proxy.apply_validation("3.3.3.3", "2.2.2.2")
+    assert proxy.valid and proxy.redirects
+    proxy.apply_validation("2.2.2.2", "2.2.2.2")
+    assert not proxy.valid
+    assert (proxy.total_checks, proxy.success_checks) == (3, 2)
+
+
+def test_proxy_apply_judge():
+    proxy = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN")
+    proxy.apply_judge("REMOTE_ADDR = 2.2.2.2", "2.2.2.2")
+    assert proxy.anonymity == "transparent"
+    proxy.apply_judge("HTTP_VIA = 1.1 proxy", "2.2.2.2")
+    assert proxy.anonymity == "anonymous"
+    proxy.apply_judge("PHP Proxy Judge", "2.2.2.2")
+    assert proxy.anonymity == "elite" and proxy.judged
+    proxy.apply_judge("", "2.2.2.2")
+    assert not proxy.judged
+    assert (proxy.judge_valid_count, proxy.judge_invalid_count) == (3, 1)
+
+
+def test_proxy_collection_dedup():
+    proxies = [Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN", total_checks=2, success_checks=1),
+               Proxy(IPv4Address("1.1.1.1"), 80, "UNKNOWN", ["http"], "elite", total_checks=3, success_checks=3),
+               Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["socks5"], "UNKNOWN")]
+    collection = ProxyCollection(proxies)
+    assert len(collection) == 1
+    merged = collection.proxies[0]
+    assert (merged.total_checks, merged.success_checks, merged.protocols) == (5, 4, ["http", "socks5"])
+    assert merged.anonymity == "elite" and merged.country == "RU"
+    collection.add_proxy(Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN", total_checks=1))
+    assert merged.total_checks == 5
+
+
+def test_proxy_priority():
+    good = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN", total_checks=10, success_checks=9)
+    new = Proxy(IPv4Address("2.2.2.2"), 80, "RU", ["http"], "UNKNOWN")
+    dead = Proxy(IPv4Address("3.3.3.3"), 80, "RU", ["http"], "UNKNOWN", total_checks=10)
+    assert sorted([dead, new, good], key=lambda proxy: proxy.priority, reverse=True) == [good, new, dead]
+
+
+def test_proxy_collection_validate_queue(monkeypatch):
+    monkeypatch.setattr("src.proxy.get_self_ip", lambda **kwargs: "127.0.0.2")
+    collection = ProxyCollection([Proxy(IPv4Address("127.0.0.1"), port, "UNKNOWN", ["http"], "UNKNOWN")
+                                  for port in range(1, 6)])
+    collection.validate_all(multiprocess=True, max_workers=2, priority=True)
+    assert all((proxy.total_checks, proxy.valid) == (1, False) for proxy in collection.proxies)
+
+
+def test_proxy_collection_persistent_merge():
+    collection = ProxyCollection()
+    collection.add_proxies([Proxy(IPv4Address("1.1.1.1"), 80, "UNKNOWN", ["http"], "UNKNOWN")])
+    proxy = collection.proxies[0]
+    proxy.valid = True
+    collection.add_proxies([Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "elite")])
+    assert collection.proxies == [proxy]
+    assert (proxy.total_checks, proxy.valid, proxy.country) == (1, True, "RU")
+    for _ in range(3):
+        proxy.valid = False
+    assert collection.evict(3) == [proxy]
+    assert len(collection) == 0
+
+
+def test_proxy_compact():
+    proxy = Proxy(IPv4Address("1.2.3.4"), 8080, "DE", ["https", "http"], "elite")
+    assert not hasattr(proxy, "__dict__")
+    # Unprobed proxy is connected via protocol listed first by source
+    assert (proxy.ip, proxy.port, proxy.protocols) == (IPv4Address("1.2.3.4"), 8080, ["https", "http"])
+    assert proxy.protocol == "https" and Proxy.from_dict(proxy.to_dict()).protocol == "https"
+    assert (proxy.country, proxy.anonymity) == ("DE", "elite")
+    proxy.anonymity = "transparent"
+    proxy.port = 3128
+    assert (proxy.anonymity, proxy.port, proxy.ip) == ("transparent", 3128, IPv4Address("1.2.3.4"))
+    assert proxy.key == Proxy(IPv4Address("1.2.3.4"), 3128, "RU", ["http", "https"], "UNKNOWN").key
+    with pytest.raises(ValueError):
+        Proxy(IPv4Address("1.2.3.4"), 80, "DE", ["ftp"], "elite")
+    with pytest.raises(ValueError):
+        Proxy(IPv4Address("1.2.3.4"), 70000, "DE", ["http"], "elite")
+
+
+def test_proxy_collection_get_proxies():
+    fast = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http", "https"], "anonymous", total_checks=4, success_checks=4)
+    slow = Proxy(IPv4Address("2.2.2.2"), 80, "DE", ["http"], "elite", total_checks=4, success_checks=1)
+    socks = Proxy(IPv4Address("3.3.3.3"), 1080, "RU", ["socks5"], "transparent")
+    collection = ProxyCollection([fast, slow, socks])
+    fast.latency, slow.latency = 0.2, 1.5
+    assert collection.get_proxies(anonymity=["anonymous"]) == [fast]
+    assert collection.get_proxies(protocols=["http"], order_by="latency") == [fast, slow]
+    assert collection.get_proxies(countries=["RU"], protocols=["socks5"]) == [socks]
+    assert collection.get_proxies(max_latency=1) == [fast]
+    assert collection.get_proxies(min_success_ratio=0.5) == [fast]
+    assert collection.get_proxies(order_by="priority", limit=1) == [fast]
+    assert collection.get_proxies(valid_only=True) == []
+    assert len(collection.get_proxies(protocols=["http", "https"], limit=1)) == 1
+    assert collection.get_proxies(protocols=["http", "https"], max_latency=1, limit=5) == [fast]
+    assert collection.get_proxies(min_success_ratio=0.5, limit=5) == [fast]
+    assert collection.get_proxies(anonymity=["elite", "anonymous"], protocols=["http", "socks5"],
+                                  countries=["DE"], limit=5) == [slow]
+
+    # Indexes follow proxy state
+    slow.valid = True
+    slow.apply_judge("HTTP_VIA = 1.1 proxy", "127.0.0.1")
+    assert collection.get_proxies(valid_only=True, anonymity=["anonymous"], order_by="latency") == [slow]
+    slow.redirects = True
+    assert collection.get_proxies(valid_only=True, no_redirects=True) == []
+    collection.remove_proxy(slow)
+    slow.country = "RU"
+    assert collection.get_proxies(countries=["RU"], order_by="success_ratio") == [fast, socks]
+
+
+def test_proxy_collection_detach():
+    first = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "elite")
+    second = Proxy(IPv4Address("2.2.2.2"), 80, "RU", ["http"], "elite")
+    collection = ProxyCollection([first, second])
+    assert collection.get_proxies(countries=["RU"]) == [first, second]
+    collection.remove_proxy(first)
+    first.country = "DE"
+    assert first._collection is None and collection.get_proxies(countries=["DE"]) == []
+
+    collection.cleanup()
+    second.valid = True
+    assert (second._collection, len(collection), collection.get_proxies(valid_only=True)) == (None, 0, [])
+
+
+def test_proxy_protocols_merge():
+    http = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN", validation_time=1)
+    socks = Proxy(IPv4Address("1.1.1.1"), 80, "UNKNOWN", ["socks5", "socks4"], "elite", validation_time=2,
+                  protocol_verdicts={"socks4": False, "socks5": True})
+    collection = ProxyCollection([http])
+    assert collection.get_proxies(protocols=["socks5"]) == []
+    collection.add_proxy(socks, merge=True)
+    assert (len(collection), http.protocols, http.country, http.anonymity) == \
+           (1, ["http", "socks4", "socks5"], "RU", "elite")
+    assert http.protocol_verdicts == {"socks4": False, "socks5": True}
+    assert (http.protocol, http.proxy_str) == ("socks5", "socks5://1.1.1.1:80")
+    assert collection.get_proxies(protocols=["socks5"]) == [http]
+
+    http.set_protocol_verdicts({"socks5": False, "https": True})
+    assert http.protocol_verdicts == {"socks4": False, "socks5": False, "https": True}
+    assert (http.protocol, "https" in http.protocols) == ("https", True)
+    assert collection.get_proxies(protocols=["https"]) == [http]
+    assert Proxy.from_dict(http.to_dict()).to_dict() == http.to_dict()
+
+
+def test_proxy_collection_add_newest():
+    # Same history from snapshot and MongoDB is not counted twice
+    from_snapshot = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "elite", total_checks=5, validation_time=2)
+    older = Proxy(IPv4Address("2.2.2.2"), 80, "RU", ["http"], "elite", total_checks=5, validation_time=1)
+    collection = ProxyCollection([from_snapshot, older])
+    collection.add_newest([Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["socks5"], "elite", total_checks=5,
+                                 validation_time=2),
+                           Proxy(IPv4Address("2.2.2.2"), 80, "RU", ["http"], "elite", total_checks=6,
+                                 validation_time=3),
+                           Proxy(IPv4Address("3.3.3.3"), 80, "RU", ["http"], "elite", total_checks=1)])
+    assert [(proxy.total_checks, proxy.protocols) for proxy in collection.proxies] == \
+           [(5, ["http", "socks5"]), (6, ["http"]), (1, ["http"])]
+    assert collection.get_proxies(protocols=["socks5"]) == [from_snapshot]
+
+
+def test_proxy_latency():
+    proxy = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN")
+    assert proxy.latency is None and proxy.latency_percentile(50) is None
+    proxy.apply_validation("2.2.2.2", "2.2.2.2", total_time=5)
+    assert proxy.latency is None
+    proxy.apply_validation("1.1.1.1", "2.2.2.2", total_time=1, connect_time=0.5)
+    proxy.record_latency(2)
+    assert proxy.latency == pytest.approx(1.3) and proxy.connect_latency == 0.5
+    for _ in range(9):
+        proxy.record_latency(0.05)
+    assert proxy.latency_percentile(50) == 0.1 and proxy.latency_percentile(100) == 2.684
+    assert Proxy.from_dict(proxy.to_dict()).to_dict() == proxy.to_dict()
+    # Old samples fade out, when sketch overflows
+    for _ in range(300):
+        proxy.record_latency(0.05)
+    assert proxy.latency_percentile(100) == 0.1
+
+    other = Proxy(IPv4Address("2.2.2.2"), 80, "RU", ["http"], "UNKNOWN", valid=True, latency=0.5)
+    other.validation_time = proxy.validation_time
+    collection = ProxyCollection([proxy, other])
+    assert collection.get_fastest(5) == [proxy, other]
+    assert collection.get_fastest(5, max_latency=0.3) == [proxy]
+
+
+def test_proxy_latency_samples():
+    # Judge page of check is not one more latency sample
+    proxy = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN")
+    proxy.apply_validation("1.1.1.1", "2.2.2.2", total_time=1)
+    proxy.apply_judge("PHP Proxy Judge", "2.2.2.2")
+    assert sum(proxy._latency_sketch) == 1
+
+    # Sketches of copies of same history are not summed on merge
+    copy = Proxy.from_dict(proxy.to_dict())
+    copy.record_latency(0.05)
+    copy.validation_time = proxy.validation_time + 1
+    proxy.merge(copy)
+    assert sum(proxy._latency_sketch) == 2
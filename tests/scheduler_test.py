@@ -0,0 +1,76 @@
+from ipaddress import IPv4Address
+from time import time
+from src.proxy import Proxy, ProxyCollection
+from src.scheduler import RevalidationScheduler
+
+
+def test_scheduler_intervals():
+    scheduler = RevalidationScheduler(fresh_interval=100, retry_interval=300, max_interval=86400)
+    good = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN", total_checks=10, success_checks=10,
+                 valid=True, validation_time=1000)
+    dead = Proxy(IPv4Address("2.2.2.2"), 80, "RU", ["http"], "UNKNOWN", total_checks=10, valid=False,
+                 validation_time=1000, fail_streak=5)
+    assert scheduler.interval(good) == 100
+    assert scheduler.interval(dead) == 300 * 2 ** 4
+    dead.fail_streak = 30
+    assert scheduler.interval(dead) == 86400
+
+
+def test_scheduler_due():
+    scheduler = RevalidationScheduler()
+    now = time()
+    new = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN")
+    fresh = Proxy(IPv4Address("2.2.2.2"), 80, "RU", ["http"], "UNKNOWN", total_checks=1, success_checks=1,
+                  valid=True, validation_time=now)
+    assert scheduler.add_proxies([new, fresh, new]) == 2
+    assert scheduler.due(now) == [new]
+    assert scheduler.due(now) == []
+    new.valid = False
+    scheduler.reschedule([new])
+    assert scheduler.due(now + 200) == [fresh]
+    assert scheduler.next_due_time() > now + 200
+
+
+def test_scheduler_sync():
+    scheduler = RevalidationScheduler()
+    now = time()
+    first = [Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN"),
+             Proxy(IPv4Address("2.2.2.2"), 80, "RU", ["http"], "UNKNOWN")]
+    assert scheduler.sync(first) == 2
+    # Next cycle collection has new objects, with history loaded from store, and one proxy is gone
+    checked = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN", total_checks=1, success_checks=1,
+                    valid=True, validation_time=now)
+    assert scheduler.sync([checked]) == 0
+    assert (len(scheduler), first[1] in scheduler) == (1, False)
+    assert scheduler.due(now) == [] and scheduler.due(now + 200) == [checked]
+
+
+def test_scheduler_sync_rebuilt_collection():
+    # Without persistent collection each cycle has new proxies from sources, without history
+    scheduler = RevalidationScheduler()
+    now = time()
+    proxy = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN")
+    scheduler.sync(ProxyCollection([proxy]).proxies)
+    assert scheduler.due(now) == [proxy]
+    proxy.valid = True
+    proxy.validation_time = now
+    scheduler.reschedule([proxy])
+
+    collection = ProxyCollection([Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN")])
+    assert scheduler.sync(collection.proxies) == 0
+    assert scheduler.due(now) == []
+    rebuilt, = collection.proxies
+    assert (rebuilt.total_checks, rebuilt.validation_time) == (1, now)
+    assert collection.get_proxies(valid_only=True) == [rebuilt]
+    assert scheduler.due(now + 200) == [rebuilt]
+
+
+def test_proxy_flaps():
+    proxy = Proxy(IPv4Address("1.1.1.1"), 80, "RU", ["http"], "UNKNOWN")
+    proxy.valid = True
+    proxy.valid = False
+    proxy.valid = False
+    proxy.valid = True
+    assert (proxy.flaps, proxy.fail_streak) == (2, 0)
+    proxy.valid = False
+    assert proxy.fail_streak == 1
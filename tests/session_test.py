@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+from src.session import SessionPool, close_shared_session_pool, shared_session_pool
+
+
+def test_session_pool():
+    with SessionPool() as session_pool:
+        assert session_pool.session is session_pool.session
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(lambda: session_pool.session).result() is not session_pool.session
+        adapter = session_pool.session.get_adapter("http://")
+        adapter.proxy_manager_for("http://127.0.0.1:1")
+        session_pool.release_proxy("http://127.0.0.1:1")
+        assert "http://127.0.0.1:1" not in adapter.proxy_manager
+
+
+def test_session_pool_reuse():
+    # Session of finished worker thread is reused by worker of next validation
+    with SessionPool() as session_pool:
+        def work():
+            session = session_pool.session
+            session_pool.release_session()
+            return session
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            first = executor.submit(work).result()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(work).result() is first
+
+    assert shared_session_pool() is shared_session_pool()
+    pool = shared_session_pool()
+    close_shared_session_pool()
+    assert shared_session_pool() is not pool
+    close_shared_session_pool()
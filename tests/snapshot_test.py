@@ -0,0 +1,58 @@
+from ipaddress import IPv4Address
+from src.proxy import Proxy, ProxyCollection
+from src.snapshot import read_snapshot, write_snapshot
+import pytest
+
+
+def test_snapshot_round_trip(tmp_path):
+    proxy = Proxy(IPv4Address("1.2.3.4"), 8080, "DE", ["https", "http"], "strange level", total_checks=7,
+                  success_checks=5, judge_invalid_count=1, judge_valid_count=3, valid=True, judged=None,
+                  validation_time=1700000000.5, redirects=True, flaps=2, fail_streak=0,
+                  protocol_verdicts={"http": False, "https": True})
+    dead = Proxy(IPv4Address("5.6.7.8"), 1080, "UNKNOWN", ["socks5"], "UNKNOWN", total_checks=3, valid=False,
+                 fail_streak=3)
+    collection = ProxyCollection([proxy, dead])
+    path = str(tmp_path / "proxies.snapshot")
+    collection.save_snapshot(path)
+
+    loaded = ProxyCollection()
+    loaded.load(path)
+    # Index is built by load, first query doesn't rebuild it
+    assert len(loaded) == 2 and not loaded._index_stale
+    assert [loaded_proxy.to_dict() for loaded_proxy in loaded.proxies] == [proxy.to_dict(), dead.to_dict()]
+    assert [(loaded_proxy._valid, loaded_proxy._judged) for loaded_proxy in loaded.proxies] == \
+           [(True, None), (False, None)]
+
+    # Same history loaded twice is not counted twice, newer state wins
+    loaded.proxies[1].total_checks = 1
+    loaded.proxies[1].validation_time = -1
+    loaded.add_proxy(Proxy(IPv4Address("9.9.9.9"), 80, "DE", ["http"], "elite"))
+    loaded.load_snapshot(path)
+    assert len(loaded) == 3 and [loaded_proxy.total_checks for loaded_proxy in loaded.proxies] == [7, 3, 0]
+
+
+def test_snapshot_errors(tmp_path):
+    path = str(tmp_path / "proxies.snapshot")
+    write_snapshot(path, [Proxy(IPv4Address("1.2.3.4"), 80, "DE", ["http"], "elite")])
+    reader = read_snapshot(path)
+    assert next(reader).port == 80
+    reader.close()
+
+    with open(path, "r+b") as f:
+        f.write(b"JUNK")
+    with pytest.raises(ValueError):
+        list(read_snapshot(path))
+
+
+def test_snapshot_latency(tmp_path):
+    path = str(tmp_path / "proxies.snapshot")
+    proxy = Proxy(IPv4Address("1.2.3.4"), 80, "DE", ["http"], "elite", valid=True, validation_time=1700000000)
+    proxy.record_latency(0.5, 0.25)
+    proxy.record_tcp_time(0.125)
+    write_snapshot(path, [proxy, Proxy(IPv4Address("1.2.3.5"), 80, "DE", ["http"], "elite")])
+    loaded, unmeasured = read_snapshot(path)
+    assert (loaded.latency, loaded.connect_latency, loaded.tcp_latency, loaded.latency_percentile(100)) == \
+           (0.5, 0.25, 0.125, 0.655)
+    assert (unmeasured.latency, unmeasured.connect_latency, unmeasured.tcp_latency,
+            unmeasured.latency_percentile(100)) == (None, None, None, None)
+
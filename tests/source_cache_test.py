@@ -0,0 +1,47 @@
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from proxy_wrappers.source_cache import SourceCache
+from proxy_wrappers.thespeedx import parse_thespeedx
+
+
+class ListHandler(BaseHTTPRequestHandler):
+    statuses = []
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.statuses.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = b"1.1.1.1:80\n2.2.2.2:8080\n"
+        self.statuses.append(200)
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_source_cache(tmp_path):
+    server = HTTPServer(("127.0.0.1", 0), ListHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/http.txt"
+    parsed = []
+
+    def parse(text):
+        parsed.append(text)
+        return parse_thespeedx(text, "http")
+
+    try:
+        path = str(tmp_path / "cache")
+        assert len(SourceCache(path).fetch_proxies(url, parse)) == 2
+        proxies = SourceCache(path).fetch_proxies(url, parse)
+        assert [proxy.proxy_str for proxy in proxies] == ["http://1.1.1.1:80", "http://2.2.2.2:8080"]
+        # Not modified page is not downloaded, but parsed again (parsers filter proxies by freshness)
+        assert ListHandler.statuses == [200, 304] and len(parsed) == 2 and parsed[0] == parsed[1]
+        assert len(list(tmp_path.joinpath("cache").iterdir())) == 1
+    finally:
+        server.shutdown()
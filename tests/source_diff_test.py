@@ -0,0 +1,24 @@
+from ipaddress import IPv4Address
+from proxy_wrappers.source_diff import SourceDiff
+from src.proxy import Proxy
+
+
+def proxies(*ports):
+    return [Proxy(IPv4Address("1.1.1.1"), port, "UNKNOWN", ["socks5"], "UNKNOWN") for port in ports]
+
+
+def test_source_diff(tmp_path):
+    path = str(tmp_path / "diff.json")
+    source_diff = SourceDiff(path)
+    added, removed = source_diff.diff("socks5", proxies(1, 2, 3))
+    assert (len(added), len(removed)) == (3, 0)
+    # Not committed lists are not saved, so proxies are returned as added again
+    assert len(SourceDiff(path).diff("socks5", proxies(1, 2, 3))[0]) == 3
+    source_diff.commit("socks5", proxies(1, 2, 3))
+    # Committed lists are written by save
+    assert len(SourceDiff(path).diff("socks5", proxies(1, 2, 3))[0]) == 3
+    source_diff.save()
+    added, removed = SourceDiff(path).diff("socks5", proxies(2, 3, 4))
+    assert [proxy.port for proxy in added] == [4]
+    assert [proxy.port for proxy in removed] == [1]
+    assert SourceDiff(path).keys(["socks5", "http"]) == {proxy.key for proxy in proxies(1, 2, 3)}
@@ -0,0 +1,54 @@
+import threading
+import pytest
+from src.throttle import AdaptiveConcurrency, RateLimits, TokenBucket, is_throttled
+
+
+def test_adaptive_concurrency():
+    controller = AdaptiveConcurrency(100, minimum=5)
+    assert (controller.limit, controller.increase) == (10, 5)
+    # Dead proxies (no answer) are not a load signal
+    for limit in [15, 20, 25]:
+        for i in range(20):
+            controller.record(0.5 if i % 2 == 0 else None)
+        assert controller.limit == limit
+    assert controller.baseline == pytest.approx(0.5)
+    # Check url throttles us - limit is cut
+    for i in range(25):
+        controller.record(0.5, throttled=i % 5 == 0)
+    assert controller.limit == 12
+    # Latency inflation - limit is cut down to minimum
+    for limit in [6, 5, 5]:
+        for _ in range(20):
+            controller.record(1.0)
+        assert controller.limit == limit
+    # At minimum inflated latency becomes new baseline, and limit grows again
+    assert controller.baseline == 1
+    for _ in range(20):
+        controller.record(1.0)
+    assert controller.limit == 10
+
+
+def test_adaptive_concurrency_slots():
+    controller = AdaptiveConcurrency(2, initial=1)
+    controller.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (controller.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.1)
+    controller.release(0.1)
+    assert acquired.wait(1)
+    thread.join()
+
+
+def test_is_throttled():
+    assert [is_throttled(status) for status in [200, 404, 429, 502]] == [False, False, True, True]
+
+
+def test_token_bucket():
+    bucket = TokenBucket(10, burst=2)
+    assert [bucket.reserve() for _ in range(2)] == [0, 0]
+    assert [round(bucket.reserve(), 1) for _ in range(2)] == [0.1, 0.2]
+    rate_limits = RateLimits(10, burst=1)
+    assert (rate_limits.reserve("http://check/"), rate_limits.reserve("http://judge/")) == (0, 0)
+    assert rate_limits.reserve("http://check/") == pytest.approx(0.1, abs=0.01)
+    assert rate_limits.waited == pytest.approx(0.1, abs=0.01)
@@ -1,5 +1,6 @@
 import pytest
 from src.wire_web_driver import Driver, DriverWrapper
+from src.driver_pool import DriverPool
 
 
 @pytest.mark.dependency(scope='session')
@@ -10,3 +11,8 @@ def test_driver():
 @pytest.mark.dependency(scope='session')
 def test_driver_wrapper():
     assert type(DriverWrapper()) is DriverWrapper
+
+
+@pytest.mark.dependency(scope='session')
+def test_driver_pool():
+    assert type(DriverPool()) is DriverPool